@@ -0,0 +1,145 @@
+"""
+Командная строка склада:
+
+    python -m my_hm demo
+    python -m my_hm init-db --database sqlite:///warehouse.db
+    python -m my_hm report
+    python -m my_hm drain-outbox --consumer billing --output events.jsonl
+    python -m my_hm orders --customer 1
+    python -m my_hm rebuild-summaries
+    python -m my_hm rebuild-aggregates
+
+Модули SQLAlchemy и инфраструктуры импортируются только внутри команд,
+поэтому разбор аргументов и --help не платят за их загрузку.
+"""
+
+import argparse
+import sys
+from typing import List, Optional
+from my_hm.bootstrap import Application
+
+
+def _application(args: argparse.Namespace) -> Application:
+    if args.database is None:
+        return Application()
+    from my_hm.infrastructure.database import EngineConfig
+
+    return Application(EngineConfig(url=args.database))
+
+
+def _demo(app: Application, _args: argparse.Namespace) -> int:
+    from my_hm.main import main
+
+    main(app)
+    return 0
+
+
+def _init_db(app: Application, _args: argparse.Namespace) -> int:
+    from my_hm.bootstrap import ensure_schema
+    from my_hm.infrastructure.database import Database
+
+    database = Database(app.config)
+    try:
+        updated = ensure_schema(database.engine)
+    finally:
+        database.dispose()
+    print("Schema updated" if updated else "Schema is up to date")
+    return 0
+
+
+def _report(app: Application, _args: argparse.Namespace) -> int:
+    with app.unit_of_work() as uow:
+        for status, totals in uow.aggregates.status_totals().items():
+            print(f"{status.value}: {totals.count} orders, {totals.amount:.2f}")
+        inventory = uow.aggregates.inventory()
+        print(f"inventory: {inventory.count} units, {inventory.amount:.2f}")
+    return 0
+
+
+def _drain_outbox(app: Application, args: argparse.Namespace) -> int:
+    from my_hm.infrastructure.outbox import JsonlFileSink, OutboxConsumer
+
+    consumer = OutboxConsumer(
+        app.database.session_factory, args.consumer, batch_size=args.batch_size
+    )
+    count = consumer.drain(JsonlFileSink(args.output, fsync=True))
+    print(f"Delivered {count} events, position {consumer.position()}")
+    return 0
+
+
+def _orders(app: Application, args: argparse.Namespace) -> int:
+    with app.unit_of_work() as uow:
+        page = uow.summaries.customer_history(
+            args.customer, limit=args.limit, after=args.after
+        )
+    for summary in page.items:
+        print(
+            f"#{summary.order_id} {summary.status.value}: "
+            f"{summary.item_count} items, {summary.total_price:.2f}"
+        )
+    if page.next_cursor is not None:
+        print(f"next: --after {page.next_cursor}")
+    return 0
+
+
+def _rebuild_summaries(app: Application, _args: argparse.Namespace) -> int:
+    with app.unit_of_work() as uow:
+        uow.summaries.rebuild()
+        uow.commit()
+    print("Order summaries rebuilt")
+    return 0
+
+
+def _rebuild_aggregates(app: Application, _args: argparse.Namespace) -> int:
+    with app.unit_of_work() as uow:
+        uow.aggregates.rebuild()
+        uow.commit()
+    print("Aggregates rebuilt")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m my_hm")
+    parser.add_argument(
+        "--database", help="URL базы данных (по умолчанию sqlite:///warehouse.db)"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("demo", help="демонстрационный сценарий заказа").set_defaults(
+        handler=_demo
+    )
+    commands.add_parser("init-db", help="создать или проверить схему").set_defaults(
+        handler=_init_db
+    )
+    commands.add_parser("report", help="итоги по заказам и складу").set_defaults(
+        handler=_report
+    )
+    drain = commands.add_parser("drain-outbox", help="выгрузить события outbox")
+    drain.add_argument("--consumer", required=True)
+    drain.add_argument("--output", required=True)
+    drain.add_argument("--batch-size", type=int, default=500)
+    drain.set_defaults(handler=_drain_outbox)
+    orders = commands.add_parser("orders", help="история заказов клиента")
+    orders.add_argument("--customer", type=int, required=True)
+    orders.add_argument("--limit", type=int, default=20)
+    orders.add_argument("--after", type=int)
+    orders.set_defaults(handler=_orders)
+    commands.add_parser(
+        "rebuild-summaries", help="пересчитать сводки заказов"
+    ).set_defaults(handler=_rebuild_summaries)
+    commands.add_parser(
+        "rebuild-aggregates", help="пересчитать итоги по заказам и складу"
+    ).set_defaults(handler=_rebuild_aggregates)
+    return parser
+
+
+def run(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    app = _application(args)
+    try:
+        return args.handler(app, args)
+    finally:
+        app.close()
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,303 @@
+"""
+Нагрузочный тест жизненного цикла заказа на SQLite.
+
+Заполняет базу клиентами и продуктами, затем параллельно выполняет
+create_order, confirm_order, ship_order и cancel_order и печатает
+пропускную способность, p50/p99 задержки и число SQL-запросов на операцию.
+
+Пример:
+    python -m my_hm.benchmarks.lifecycle --storage file --orders 2000 --concurrency 4
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field
+from typing import Callable, List, Optional, Tuple
+from my_hm.bootstrap import Application
+from my_hm.domain.exceptions import ConcurrencyConflictError
+from my_hm.domain.models import Order
+from my_hm.domain.services import WarehouseService
+from my_hm.infrastructure.bulk_io import BulkImporter
+from my_hm.infrastructure.database import EngineConfig
+from my_hm.infrastructure.memory import InMemoryUnitOfWork, MemoryStore
+from my_hm.infrastructure.unit_of_work import SqlAlchemyUnitOfWork
+
+
+@dataclass
+class BenchmarkConfig:
+    customers: int = 100
+    products: int = 1000
+    orders: int = 1000
+    order_size: int = 3
+    concurrency: int = 4
+    storage: str = "memory"  # "memory", "file" или "store" (MemoryStore без SQL)
+    path: Optional[str] = None
+    seed: int = 42
+
+
+@dataclass
+class OperationReport:
+    operation: str
+    count: int
+    errors: int
+    throughput: float
+    p50_ms: float
+    p99_ms: float
+    statements_per_op: float
+
+
+@dataclass
+class BenchmarkReport:
+    config: BenchmarkConfig
+    operations: List[OperationReport] = field(default_factory=list)
+
+    def format(self) -> str:
+        header = (
+            f"{'operation':<10} {'count':>7} {'errors':>6} {'ops/s':>10} "
+            f"{'p50 ms':>8} {'p99 ms':>8} {'stmts/op':>9}"
+        )
+        rows = [
+            f"{r.operation:<10} {r.count:>7} {r.errors:>6} {r.throughput:>10.1f} "
+            f"{r.p50_ms:>8.2f} {r.p99_ms:>8.2f} {r.statements_per_op:>9.1f}"
+            for r in self.operations
+        ]
+        return "\n".join([header, *rows])
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(percent) - 1]
+
+
+class LifecycleBenchmark:
+    """
+    Каждая операция выполняется в собственной единице работы (одна транзакция),
+    число SQL-запросов берется из статистики SqlAlchemyUnitOfWork. База,
+    единицы работы и сервис собираются через Application, поэтому операции
+    обновляют итоги, outbox и сводки заказов и читают через кэши, как
+    в приложении.
+
+    In-memory база живет в одном соединении, поэтому операции над ней
+    выполняются по очереди: этот режим измеряет накладные расходы кода и ORM,
+    а файловый режим — реальную конкуренцию писателей SQLite. Режим store
+    выполняет те же операции над MemoryStore и показывает стоимость
+    доменного кода без базы данных.
+    """
+
+    def __init__(self, config: BenchmarkConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.store: Optional[MemoryStore] = None
+        self.app: Optional[Application] = None
+        self._lock = None
+        if config.storage == "store":
+            self.store = MemoryStore()
+            return
+        if config.storage == "memory":
+            engine_config = EngineConfig(url="sqlite://")
+            self._lock = threading.Lock()
+        else:
+            path = config.path or os.path.join(tempfile.mkdtemp(), "bench.db")
+            engine_config = EngineConfig(url=f"sqlite:///{path}", busy_timeout=30.0)
+        self.app = Application(engine_config)
+
+    def run(self) -> BenchmarkReport:
+        customer_ids, product_ids = self.seed()
+        report = BenchmarkReport(self.config)
+
+        batches = [
+            (
+                self.random.choice(customer_ids),
+                self.random.sample(product_ids, self.config.order_size),
+            )
+            for _ in range(self.config.orders)
+        ]
+        created, create_report = self._phase(
+            "create",
+            [lambda s, c=c, p=p: s.create_order(c, p) for c, p in batches],
+        )
+        report.operations.append(create_report)
+
+        confirmed, confirm_report = self._phase(
+            "confirm", [lambda s, o=o: s.confirm_order(o) for o in created]
+        )
+        report.operations.append(confirm_report)
+
+        half = len(confirmed) // 2
+        _, ship_report = self._phase(
+            "ship", [lambda s, o=o: s.ship_order(o) for o in confirmed[:half]]
+        )
+        _, cancel_report = self._phase(
+            "cancel", [lambda s, o=o: s.cancel_order(o) for o in confirmed[half:]]
+        )
+        report.operations.extend([ship_report, cancel_report])
+        if self.app is not None:
+            self.app.close()
+        return report
+
+    def seed(self) -> Tuple[List[int], List[int]]:
+        """
+        Заполняет базу и возвращает id клиентов и продуктов. С --path база
+        может уже содержать данные, поэтому id не считаются равными 1..N.
+        """
+        if self.store is not None:
+            return self._seed_store()
+        emails = [f"customer{i}@example.com" for i in range(self.config.customers)]
+        with self.app.unit_of_work() as uow:
+            importer = BulkImporter(uow.session)
+            importer.import_customers(
+                {"name": f"Customer {i}", "email": email}
+                for i, email in enumerate(emails)
+            )
+            products = importer.import_products(
+                {
+                    "name": f"Product {i}",
+                    "quantity": self.config.orders * self.config.order_size,
+                    "price": round(self.random.uniform(1, 1000), 2),
+                }
+                for i in range(self.config.products)
+            )
+            customers = uow.customers.get_many_by_email(emails)
+            # Импорт идет в обход сервиса: итоги пересчитываются по таблицам.
+            uow.aggregates.rebuild()
+            uow.commit()
+        return [customers[email].id for email in emails], products.ids
+
+    def _seed_store(self) -> Tuple[List[int], List[int]]:
+        with InMemoryUnitOfWork(self.store) as uow:
+            service = WarehouseService(uow.products, uow.orders, uow.customers)
+            customers = [
+                service.create_customer(f"Customer {i}", f"customer{i}@example.com")
+                for i in range(self.config.customers)
+            ]
+            products = [
+                service.create_product(
+                    f"Product {i}",
+                    self.config.orders * self.config.order_size,
+                    round(self.random.uniform(1, 1000), 2),
+                )
+                for i in range(self.config.products)
+            ]
+            uow.commit()
+        return [c.id for c in customers], [p.id for p in products]
+
+    def _unit_of_work(self):
+        if self.store is not None:
+            return InMemoryUnitOfWork(self.store)
+        return self.app.unit_of_work()
+
+    def _service(self, uow) -> WarehouseService:
+        if self.store is not None:
+            return WarehouseService(uow.products, uow.orders, uow.customers)
+        return self.app.service(uow)
+
+    def _phase(
+        self,
+        name: str,
+        operations: List[Callable[[WarehouseService], Order]],
+    ):
+        """
+        Выполняет операции фазы в пуле потоков. Возвращает id заказов
+        успешных операций (id новых заказов известны после commit) и отчет.
+        """
+        results: List[Optional[int]] = []
+        latencies: List[float] = []
+        statements: List[int] = []
+        lock = threading.Lock()
+
+        def execute(operation):
+            with self._lock or nullcontext():
+                started = time.perf_counter()
+                try:
+                    with self._unit_of_work() as uow:
+                        order = operation(self._service(uow))
+                        uow.commit()
+                    result = order.id
+                except (ValueError, ConcurrencyConflictError):
+                    # Отказы домена (нет остатков, запрещенный переход)
+                    # и исчерпанные повторы конфликта версий; прочие
+                    # ошибки прерывают тест.
+                    result = None
+                elapsed = time.perf_counter() - started
+            with lock:
+                results.append(result)
+                if result is not None:
+                    latencies.append(elapsed)
+                    statements.append(_statement_count(uow))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.config.concurrency) as pool:
+            list(pool.map(execute, operations))
+        wall_time = time.perf_counter() - started
+
+        succeeded = [r for r in results if r is not None]
+        return succeeded, OperationReport(
+            operation=name,
+            count=len(succeeded),
+            errors=len(results) - len(succeeded),
+            throughput=len(succeeded) / wall_time if wall_time else 0.0,
+            p50_ms=_percentile(latencies, 50) * 1000,
+            p99_ms=_percentile(latencies, 99) * 1000,
+            statements_per_op=statistics.mean(statements) if statements else 0.0,
+        )
+
+
+def _statement_count(uow) -> int:
+    """
+    Число SQL-запросов последней транзакции; у MemoryStore запросов нет.
+    """
+    if isinstance(uow, SqlAlchemyUnitOfWork):
+        return uow.history[-1].statements
+    return 0
+
+
+def run_benchmark(config: BenchmarkConfig) -> BenchmarkReport:
+    return LifecycleBenchmark(config).run()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    defaults = BenchmarkConfig()
+    parser.add_argument("--customers", type=int, default=defaults.customers)
+    parser.add_argument("--products", type=int, default=defaults.products)
+    parser.add_argument("--orders", type=int, default=defaults.orders)
+    parser.add_argument("--order-size", type=int, default=defaults.order_size)
+    parser.add_argument("--concurrency", type=int, default=defaults.concurrency)
+    parser.add_argument(
+        "--storage", choices=["memory", "file", "store"], default="memory"
+    )
+    parser.add_argument("--path", help="файл базы для --storage file")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--json", action="store_true", help="вывести отчет в JSON")
+    args = parser.parse_args(argv)
+
+    config = BenchmarkConfig(
+        customers=args.customers,
+        products=args.products,
+        orders=args.orders,
+        order_size=args.order_size,
+        concurrency=args.concurrency,
+        storage=args.storage,
+        path=args.path,
+        seed=args.seed,
+    )
+    report = run_benchmark(config)
+    if args.json:
+        print(json.dumps(asdict(report), indent=2))
+    else:
+        print(report.format())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Явная сборка приложения: движок, схема базы данных, единица работы и
+сервис создаются при первом обращении, а не при импорте. Модули SQLAlchemy
+и инфраструктуры импортируются внутри методов, поэтому импорт этого модуля
+(и CLI, который на нем построен) почти ничего не стоит для процессов,
+которым база данных не нужна.
+"""
+
+import zlib
+from datetime import timedelta
+from typing import TYPE_CHECKING, Dict, Optional, Sequence
+
+if TYPE_CHECKING:
+    from sqlalchemy import MetaData
+    from sqlalchemy.engine import Engine
+    from my_hm.domain.events import WarehouseListener
+    from my_hm.domain.services import WarehouseService
+    from my_hm.infrastructure.cache import IdentityMapCache
+    from my_hm.infrastructure.database import Database, EngineConfig
+    from my_hm.infrastructure.expiry import ReservationExpiryScheduler
+    from my_hm.infrastructure.unit_of_work import SqlAlchemyUnitOfWork
+
+
+def schema_fingerprint(metadata: "MetaData", dialect) -> int:
+    """
+    Возвращает отпечаток схемы: CRC32 текста DDL всех таблиц и индексов,
+    приведенный к положительному 31-битному числу (для PRAGMA user_version).
+    """
+    from sqlalchemy.schema import CreateIndex, CreateTable
+
+    ddl = []
+    for table in sorted(metadata.tables.values(), key=lambda t: t.name):
+        ddl.append(str(CreateTable(table).compile(dialect=dialect)))
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            ddl.append(str(CreateIndex(index).compile(dialect=dialect)))
+    return zlib.crc32("\n".join(ddl).encode("utf-8")) & 0x7FFFFFFF or 1
+
+
+def ensure_schema(engine: "Engine", metadata: Optional["MetaData"] = None) -> bool:
+    """
+    Создает недостающие таблицы, только если отпечаток схемы не совпадает
+    с сохраненным в PRAGMA user_version. Обычный запуск делает один PRAGMA
+    вместо проверки каждой таблицы в create_all. Возвращает True, если
+    схема обновлялась.
+    """
+    from sqlalchemy import inspect
+
+    if metadata is None:
+        from my_hm.infrastructure.orm import Base
+
+        metadata = Base.metadata
+    fingerprint = schema_fingerprint(metadata, engine.dialect)
+    with engine.connect() as connection:
+        if connection.exec_driver_sql("PRAGMA user_version").scalar() == fingerprint:
+            return False
+    with engine.begin() as connection:
+        # Драйвер sqlite3 не открывает транзакцию перед DDL: без явного BEGIN
+        # прерванное обновление оставило бы схему измененной наполовину.
+        if not connection.connection.dbapi_connection.in_transaction:
+            connection.exec_driver_sql("BEGIN")
+        existing = set(inspect(connection).get_table_names())
+        _migrate_order_lines(connection)
+        metadata.create_all(connection)
+        _add_missing_columns(connection, metadata)
+        _fill_projections(connection, set(metadata.tables) - existing)
+        connection.exec_driver_sql(f"PRAGMA user_version = {fingerprint}")
+    return True
+
+
+def _fill_projections(connection, created: set):
+    """
+    Итоги и сводки заказов ведутся приращениями от WarehouseService,
+    поэтому таблицы, созданные над уже существующими заказами и продуктами,
+    заполняются rebuild() в той же транзакции, до записи отпечатка схемы.
+    Иначе первые приращения легли бы на пустые строки и дали неверные итоги.
+    """
+    from sqlalchemy.orm import Session
+    from my_hm.infrastructure.aggregates import SqlAlchemyAggregates
+    from my_hm.infrastructure.summaries import SqlAlchemyOrderSummaries
+
+    with Session(bind=connection) as session:
+        for projection in (
+            SqlAlchemyAggregates(session),
+            SqlAlchemyOrderSummaries(session),
+        ):
+            if created & set(projection.tables):
+                projection.rebuild()
+
+
+def _migrate_order_lines(connection):
+    """
+    В ранней схеме у order_product_associations не было первичного ключа
+    и количества: повторный продукт в заказе хранился повторной строкой.
+    Такая таблица пересоздается с ключом (order_id, product_id): повторы
+    сворачиваются в quantity, unit_price — текущая цена продукта.
+    """
+    from sqlalchemy import inspect
+    from my_hm.infrastructure.orm import order_product_associations
+
+    name = order_product_associations.name
+    inspector = inspect(connection)
+    if not inspector.has_table(name):
+        return
+    if inspector.get_pk_constraint(name)["constrained_columns"]:
+        return
+    connection.exec_driver_sql(f"ALTER TABLE {name} RENAME TO {name}_old")
+    order_product_associations.create(connection)
+    connection.exec_driver_sql(
+        f"INSERT INTO {name} (order_id, product_id, quantity, unit_price) "
+        "SELECT line.order_id, line.product_id, COUNT(*), "
+        "COALESCE(MAX(products.price), 0) "
+        f"FROM {name}_old AS line "
+        "LEFT JOIN products ON products.id = line.product_id "
+        "WHERE line.order_id IS NOT NULL AND line.product_id IS NOT NULL "
+        "GROUP BY line.order_id, line.product_id"
+    )
+    connection.exec_driver_sql(f"DROP TABLE {name}_old")
+
+
+def _add_missing_columns(connection, metadata: "MetaData"):
+    """
+    create_all не трогает существующие таблицы: новые столбцы и индексы
+    добавляются в них отдельно. Столбцы NOT NULL должны иметь
+    server_default, которым заполняются уже существующие строки.
+    Уникальный индекс не создается, если в таблице есть повторы:
+    их нужно устранить вручную.
+    """
+    from sqlalchemy import inspect
+    from sqlalchemy.schema import CreateColumn
+
+    inspector = inspect(connection)
+    for table in metadata.tables.values():
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+        existing_indexes = {
+            index["name"] for index in inspector.get_indexes(table.name)
+        }
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            if index.unique:
+                _check_unique(connection, table.name, index)
+            index.create(connection)
+
+
+def _check_unique(connection, table_name: str, index):
+    columns = [column.name for column in index.columns]
+    listed = ", ".join(columns)
+    not_null = " AND ".join(f"{column} IS NOT NULL" for column in columns)
+    duplicate = connection.exec_driver_sql(
+        f"SELECT {listed} FROM {table_name} WHERE {not_null} "
+        f"GROUP BY {listed} HAVING COUNT(*) > 1 LIMIT 1"
+    ).first()
+    if duplicate is not None:
+        raise ValueError(
+            f"Нельзя создать уникальный индекс {index.name}: в таблице "
+            f"{table_name} повторяется значение {tuple(duplicate)}"
+        )
+
+
+class Application:
+    """
+    Корень композиции приложения. База данных открывается и схема
+    проверяется один раз при первом обращении к database. Продукты и
+    клиенты читаются через кэши на cache_size записей со сроком жизни
+    cache_ttl секунд, ответы команд по ключам идемпотентности — через LRU
+    на idempotency_cache_size записей; кэши общие для всех единиц работы
+    приложения.
+    """
+
+    def __init__(
+        self,
+        config: Optional["EngineConfig"] = None,
+        idempotency_cache_size: int = 10_000,
+        cache_size: int = 10_000,
+        cache_ttl: Optional[float] = 300.0,
+    ):
+        self.config = config
+        self.idempotency_cache_size = idempotency_cache_size
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._database: Optional["Database"] = None
+        self._caches: Optional[Dict[str, "IdentityMapCache"]] = None
+
+    @property
+    def database(self) -> "Database":
+        if self._database is None:
+            from my_hm.infrastructure.database import Database
+
+            database = Database(self.config)
+            ensure_schema(database.engine)
+            self._database = database
+        return self._database
+
+    @property
+    def caches(self) -> Dict[str, "IdentityMapCache"]:
+        """
+        Кэши приложения по именам: product, customer, idempotency.
+        """
+        if self._caches is None:
+            from my_hm.infrastructure.cache import IdentityMapCache
+
+            self._caches = {
+                "product": IdentityMapCache(self.cache_size, self.cache_ttl),
+                "customer": IdentityMapCache(self.cache_size, self.cache_ttl),
+                "idempotency": IdentityMapCache(
+                    max_size=self.idempotency_cache_size, ttl=None
+                ),
+            }
+        return self._caches
+
+    def unit_of_work(self) -> "SqlAlchemyUnitOfWork":
+        from my_hm.infrastructure.unit_of_work import SqlAlchemyUnitOfWork
+
+        database = self.database
+        caches = self.caches
+        return SqlAlchemyUnitOfWork(
+            database.session_factory,
+            product_cache=caches["product"],
+            customer_cache=caches["customer"],
+            read_session_factory=database.read_session_factory,
+            idempotency_cache=caches["idempotency"],
+        )
+
+    def service(
+        self,
+        uow: "SqlAlchemyUnitOfWork",
+        listeners: Optional[Sequence["WarehouseListener"]] = None,
+    ) -> "WarehouseService":
+        """
+        Создает сервис поверх открытой единицы работы. По умолчанию
+        подключены итоги для отчетов, outbox и сводки заказов.
+        """
+        from my_hm.domain.services import WarehouseService
+
+        if listeners is None:
+            listeners = uow.listeners
+        return WarehouseService(
+            uow.products,
+            uow.orders,
+            uow.customers,
+            listeners=listeners,
+            idempotency_repo=uow.idempotency,
+        )
+
+    def expiry_scheduler(
+        self, ttl: timedelta, **options
+    ) -> "ReservationExpiryScheduler":
+        """
+        Создает планировщик отмены просроченных резервов поверх единиц
+        работы и сервиса приложения (итоги и outbox учитывают отмены).
+        """
+        from my_hm.infrastructure.expiry import ReservationExpiryScheduler
+
+        return ReservationExpiryScheduler(
+            self.unit_of_work, ttl, service_factory=self.service, **options
+        )
+
+    def close(self):
+        if self._database is not None:
+            self._database.dispose()
+            self._database = None
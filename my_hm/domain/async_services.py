@@ -0,0 +1,290 @@
+from datetime import datetime
+from typing import Awaitable, Callable, Iterable, List, Optional, Sequence, Tuple
+from .events import AsyncWarehouseListener
+from .models import (
+    Product,
+    Order,
+    Customer,
+    CatalogQuery,
+    ProductPage,
+    OrderStatus,
+    BulkTransitionReport,
+)
+from .repositories import (
+    AsyncProductRepository,
+    AsyncOrderRepository,
+    AsyncCustomerRepository,
+    AsyncIdempotencyRepository,
+)
+from .clock import utc_now
+from .commands import (
+    BulkTransition,
+    OrderItems,
+    apply_transition,
+    build_orders,
+    check_replay,
+    check_reserved,
+    consumed_stock,
+    create_order_arguments,
+    idempotency_fingerprint,
+    line_products,
+    normalize_batch,
+    replay_product_ids,
+)
+from .services import RetryPolicy
+
+
+class AsyncWarehouseService:
+    """
+    Асинхронный вариант WarehouseService для asyncio-приложений.
+    Правила те же, но методы репозиториев и listeners являются корутинами.
+    """
+
+    retry_policy = RetryPolicy()
+    clock: Callable[[], datetime] = staticmethod(utc_now)
+
+    def __init__(
+        self,
+        product_repo: AsyncProductRepository,
+        order_repo: AsyncOrderRepository,
+        customer_repo: AsyncCustomerRepository,
+        listeners: Sequence[AsyncWarehouseListener] = (),
+        idempotency_repo: Optional[AsyncIdempotencyRepository] = None,
+    ):
+        self.product_repo = product_repo
+        self.order_repo = order_repo
+        self.customer_repo = customer_repo
+        self.listeners = list(listeners)
+        self.idempotency_repo = idempotency_repo
+
+    async def create_customer(self, name: str, email: str) -> Customer:
+        """
+        Создает нового клиента и добавляет его в репозиторий.
+        """
+        if await self.customer_repo.get_by_email(email) is not None:
+            raise ValueError(f"Клиент с email {email} уже существует")
+        customer = Customer(name=name, email=email)
+        return await self.customer_repo.add(customer)
+
+    async def upsert_customers(
+        self, customers: Iterable[Tuple[str, str]]
+    ) -> List[Customer]:
+        """
+        Синхронизирует пакет клиентов (имя, email): новые email добавляются,
+        у существующих обновляется имя. Возвращает клиентов с id.
+        """
+        return await self.customer_repo.upsert_many(
+            [Customer(name=name, email=email) for name, email in customers]
+        )
+
+    async def create_product(self, name: str, quantity: int, price: float) -> Product:
+        """
+        Создает новый продукт и добавляет его в репозиторий.
+        """
+        product = Product(name=name, quantity=quantity, price=price)
+        product = await self.product_repo.add(product)
+        for listener in self.listeners:
+            await listener.product_created(product)
+        return product
+
+    async def create_order(
+        self,
+        customer_id: int,
+        product_ids: OrderItems,
+        idempotency_key: Optional[str] = None,
+    ) -> Order:
+        """
+        Создает новый заказ для указанного клиента с выбранными продуктами.
+        """
+
+        async def execute() -> Order:
+            return (await self.create_orders([(customer_id, product_ids)]))[0]
+
+        return await self._idempotent(
+            idempotency_key,
+            "create_order",
+            create_order_arguments(customer_id, product_ids),
+            execute,
+        )
+
+    async def create_orders(self, batch: List[Tuple[int, OrderItems]]) -> List[Order]:
+        """
+        Создает пакет заказов, как WarehouseService.create_orders.
+        """
+        customer_ids, batch, product_ids = normalize_batch(batch)
+        customers = await self.customer_repo.get_many(customer_ids)
+        products = await self.product_repo.get_many(product_ids)
+
+        orders, reserved = build_orders(batch, customers, products, self.clock())
+        check_reserved(await self.product_repo.reserve_stock(reserved))
+        orders = await self.order_repo.add_many(orders)
+        consumed = consumed_stock(reserved)
+        for listener in self.listeners:
+            await listener.stock_changed(consumed)
+            await listener.orders_created(orders)
+        return orders
+
+    async def confirm_order(
+        self, order_id: int, idempotency_key: Optional[str] = None
+    ) -> Order:
+        """
+        Подтверждает заказ, изменяя его статус.
+        """
+        return await self._idempotent(
+            idempotency_key,
+            "confirm_order",
+            order_id,
+            lambda: self._change_status(order_id, Order.confirm),
+        )
+
+    async def ship_order(
+        self, order_id: int, idempotency_key: Optional[str] = None
+    ) -> Order:
+        """
+        Отправляет заказ, изменяя его статус и обновляя запись.
+        """
+        return await self._idempotent(
+            idempotency_key,
+            "ship_order",
+            order_id,
+            lambda: self._change_status(order_id, Order.ship),
+        )
+
+    async def cancel_order(
+        self, order_id: int, idempotency_key: Optional[str] = None
+    ) -> Order:
+        """
+        Отменяет заказ и возвращает на склад количество каждой строки заказа.
+        """
+        return await self._idempotent(
+            idempotency_key, "cancel_order", order_id, lambda: self._cancel(order_id)
+        )
+
+    async def _cancel(self, order_id: int) -> Order:
+        order, previous = await self.retry_policy.run_async(
+            lambda: self._apply_transition(order_id, Order.cancel)
+        )
+        released = order.quantities()
+        await self.product_repo.release_stock(released)
+        for listener in self.listeners:
+            await listener.stock_changed(released)
+        await self._status_changed(order, previous)
+        return order
+
+    async def confirm_orders(self, order_ids: Iterable[int]) -> BulkTransitionReport:
+        """
+        Подтверждает пакет заказов, как WarehouseService.confirm_orders.
+        """
+        return await self._transition_many(order_ids, OrderStatus.CONFIRMED)
+
+    async def ship_orders(self, order_ids: Iterable[int]) -> BulkTransitionReport:
+        """
+        Отправляет пакет подтвержденных заказов.
+        """
+        return await self._transition_many(order_ids, OrderStatus.SHIPPED)
+
+    async def cancel_orders(self, order_ids: Iterable[int]) -> BulkTransitionReport:
+        """
+        Отменяет пакет заказов и возвращает их строки на склад.
+        """
+        return await self._cancel_many(order_ids)
+
+    async def expire_pending_orders(
+        self, created_before: datetime, limit: int = 500
+    ) -> BulkTransitionReport:
+        """
+        Отменяет просроченные заказы в статусе PENDING, как
+        WarehouseService.expire_pending_orders.
+        """
+        order_ids = await self.order_repo.find_pending_before(created_before, limit)
+        return await self._cancel_many(order_ids, sources=[OrderStatus.PENDING])
+
+    async def get_available_products(self) -> List[Product]:
+        """
+        Возвращает список доступных продуктов на складе.
+        """
+        page = await self.product_repo.find(CatalogQuery(in_stock=True, limit=None))
+        return page.items
+
+    async def search_products(self, query: CatalogQuery) -> ProductPage:
+        """
+        Возвращает страницу каталога по фильтрам и курсору из query.
+        """
+        return await self.product_repo.find(query)
+
+    async def _idempotent(
+        self,
+        key: Optional[str],
+        command: str,
+        arguments,
+        execute: Callable[[], Awaitable[Order]],
+    ) -> Order:
+        """
+        Как WarehouseService._idempotent. AsyncSession не умеет ленивую
+        загрузку, поэтому продукты повторного ответа загружаются сразу
+        (одним запросом, без чтения заказов).
+        """
+        if key is None:
+            return await execute()
+        fingerprint = idempotency_fingerprint(self.idempotency_repo, command, arguments)
+        record = await self.idempotency_repo.get(key)
+        if record is not None:
+            check_replay(record, command, fingerprint)
+            products = await self.product_repo.get_many(replay_product_ids(record))
+            return record.replay_order(lambda lines: line_products(lines, products))
+        order = await execute()
+        await self.idempotency_repo.save(key, command, fingerprint, order)
+        return order
+
+    async def _change_status(
+        self, order_id: int, transition: Callable[[Order], None]
+    ) -> Order:
+        order, previous = await self.retry_policy.run_async(
+            lambda: self._apply_transition(order_id, transition)
+        )
+        await self._status_changed(order, previous)
+        return order
+
+    async def _apply_transition(
+        self, order_id: int, transition: Callable[[Order], None]
+    ) -> Tuple[Order, OrderStatus]:
+        order = await self.order_repo.get(order_id)
+        previous = apply_transition(order, transition)
+        await self.order_repo.update(order)
+        return order, previous
+
+    async def _cancel_many(
+        self,
+        order_ids: Iterable[int],
+        sources: Optional[Sequence[OrderStatus]] = None,
+    ) -> BulkTransitionReport:
+        report = await self._transition_many(order_ids, OrderStatus.CANCELLED, sources)
+        released = await self.order_repo.line_quantities(report.applied)
+        await self.product_repo.release_stock(released)
+        for listener in self.listeners:
+            await listener.stock_changed(released)
+        return report
+
+    async def _transition_many(
+        self,
+        order_ids: Iterable[int],
+        status: OrderStatus,
+        sources: Optional[Sequence[OrderStatus]] = None,
+    ) -> BulkTransitionReport:
+        plan = BulkTransition(order_ids, status, sources)
+        for previous in plan.steps():
+            updated = await self.order_repo.transition_many(
+                plan.remaining, previous, status
+            )
+            plan.applied(updated)
+            if updated:
+                for listener in self.listeners:
+                    await listener.orders_transitioned(updated, previous, status)
+        remaining = plan.remaining
+        return plan.finish(
+            await self.order_repo.get_statuses(remaining) if remaining else {}
+        )
+
+    async def _status_changed(self, order: Order, previous: OrderStatus):
+        for listener in self.listeners:
+            await listener.order_status_changed(order, previous)
@@ -0,0 +1,8 @@
+from datetime import datetime, timezone
+
+
+def utc_now() -> datetime:
+    """
+    Текущее время в UTC без часового пояса, как его хранит SQLite.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,208 @@
+"""
+Правила команд над заказами, общие для WarehouseService и
+AsyncWarehouseService: разбор состава заказа, сборка пакета заказов по уже
+загруженным клиентам и продуктам, проверка перехода статуса, ход и отчет
+пакетного перехода, проверка повторов по ключу идемпотентности.
+Функции не обращаются к репозиториям, поэтому сервисам остаются только
+вызовы репозиториев и listeners.
+"""
+
+import hashlib
+import json
+from collections import Counter
+from datetime import datetime
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+from .models import (
+    BulkTransitionReport,
+    Customer,
+    IdempotencyRecord,
+    Order,
+    OrderLine,
+    OrderStatus,
+    Product,
+    TransitionOutcome,
+    STATUS_TRANSITIONS,
+)
+
+# Состав заказа: {product_id: количество} или список id (по единице на элемент).
+OrderItems = Union[Dict[int, int], List[int]]
+
+
+def as_quantities(items: OrderItems) -> Dict[int, int]:
+    if isinstance(items, dict):
+        return dict(items)
+    return dict(Counter(items))
+
+
+def command_fingerprint(command: str, arguments) -> str:
+    """
+    Хэш команды и ее аргументов для проверки повторов по ключу идемпотентности.
+    """
+    payload = json.dumps([command, arguments], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def create_order_arguments(customer_id: int, product_ids: OrderItems) -> list:
+    return [customer_id, sorted(as_quantities(product_ids).items())]
+
+
+def idempotency_fingerprint(repo, command: str, arguments) -> str:
+    """
+    Хэш команды для ключа идемпотентности; без хранилища ключей команду
+    с ключом выполнить нельзя.
+    """
+    if repo is None:
+        raise ValueError("Хранилище ключей идемпотентности не подключено")
+    return command_fingerprint(command, arguments)
+
+
+def check_replay(record: IdempotencyRecord, command: str, fingerprint: str):
+    if (record.command, record.fingerprint) != (command, fingerprint):
+        raise ValueError(
+            f"Ключ идемпотентности {record.key} уже использован с другими параметрами"
+        )
+
+
+def replay_product_ids(record: IdempotencyRecord) -> List[int]:
+    return [product_id for product_id, _, _ in record.response["lines"]]
+
+
+def line_products(
+    lines: List[OrderLine], products: Dict[int, Product]
+) -> List[Product]:
+    """
+    Продукты строк заказа в порядке строк; удаленные продукты пропускаются.
+    """
+    return [products[line.product_id] for line in lines if line.product_id in products]
+
+
+def normalize_batch(
+    batch: List[Tuple[int, OrderItems]],
+) -> Tuple[Set[int], List[Tuple[int, Dict[int, int]]], Set[int]]:
+    """
+    Приводит состав каждого заказа пакета к {product_id: количество}.
+    Возвращает id клиентов, пакет и id продуктов для загрузки.
+    """
+    normalized = [(customer_id, as_quantities(items)) for customer_id, items in batch]
+    customer_ids = {customer_id for customer_id, _ in normalized}
+    product_ids = {pid for _, quantities in normalized for pid in quantities}
+    return customer_ids, normalized, product_ids
+
+
+def check_reserved(failed: List[int]):
+    if failed:
+        raise ValueError(f"Продукт {failed[0]} недоступен")
+
+
+def consumed_stock(reserved: Dict[int, int]) -> Dict[int, int]:
+    return {pid: -quantity for pid, quantity in reserved.items()}
+
+
+def apply_transition(
+    order: Optional[Order], transition: Callable[[Order], None]
+) -> OrderStatus:
+    """
+    Проверяет и применяет переход к загруженному заказу.
+    Возвращает статус до перехода.
+    """
+    if not order:
+        raise ValueError("Заказ не найден")
+    previous = order.status
+    transition(order)
+    return previous
+
+
+def build_orders(
+    batch: List[Tuple[int, Dict[int, int]]],
+    customers: Dict[int, Customer],
+    products: Dict[int, Product],
+    created_at: Optional[datetime] = None,
+) -> Tuple[List[Order], Dict[int, int]]:
+    """
+    Собирает заказы пакета по уже загруженным клиентам и продуктам.
+    Возвращает заказы и суммарное количество каждого продукта для списания.
+    """
+    orders = []
+    reserved = Counter()
+    for customer_id, quantities in batch:
+        if customer_id not in customers:
+            raise ValueError("Клиент не найден")
+        order = Order(customer_id=customer_id, created_at=created_at)
+        for pid, quantity in quantities.items():
+            product = products.get(pid)
+            if not product or product.quantity <= 0:
+                raise ValueError(f"Продукт {pid} недоступен")
+            order.add_product(product, quantity)
+            reserved[pid] += quantity
+        orders.append(order)
+    return orders, dict(reserved)
+
+
+class BulkTransition:
+    """
+    Ход пакетного перехода в статус status. Отдельный UPDATE выполняется
+    на каждый исходный статус, чтобы знать, из какого статуса перешел
+    каждый заказ; remaining — id, которые еще не перешли.
+    """
+
+    def __init__(
+        self,
+        order_ids: Iterable[int],
+        status: OrderStatus,
+        sources: Optional[Sequence[OrderStatus]] = None,
+    ):
+        self.order_ids = list(dict.fromkeys(order_ids))
+        self.status = status
+        self.sources = list(sources or STATUS_TRANSITIONS[status])
+        self.report = BulkTransitionReport(status)
+        self.remaining = self.order_ids
+
+    def steps(self) -> Iterator[OrderStatus]:
+        """
+        Исходные статусы, пока остаются не перешедшие заказы.
+        """
+        for previous in self.sources:
+            if not self.remaining:
+                return
+            yield previous
+
+    def applied(self, updated: List[int]):
+        for order_id in updated:
+            self.report.outcomes[order_id] = TransitionOutcome.APPLIED
+        self.remaining = [i for i in self.remaining if i not in self.report.outcomes]
+
+    def finish(self, current_statuses: Dict[int, OrderStatus]) -> BulkTransitionReport:
+        return finish_report(self.report, self.order_ids, current_statuses)
+
+
+def finish_report(
+    report: BulkTransitionReport,
+    order_ids: List[int],
+    current_statuses: Dict[int, OrderStatus],
+) -> BulkTransitionReport:
+    """
+    Заполняет исходы для id, переход которых не выполнен: заказ не найден
+    или находится в статусе, из которого переход запрещен.
+    """
+    for order_id in order_ids:
+        if order_id in report.outcomes:
+            continue
+        if order_id in current_statuses:
+            report.outcomes[order_id] = TransitionOutcome.INVALID_STATUS
+            report.current_statuses[order_id] = current_statuses[order_id]
+        else:
+            report.outcomes[order_id] = TransitionOutcome.NOT_FOUND
+    # Исходы в порядке входных id.
+    report.outcomes = {order_id: report.outcomes[order_id] for order_id in order_ids}
+    return report
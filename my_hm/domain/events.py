@@ -0,0 +1,90 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional
+from .models import Product, Order, OrderStatus
+
+
+class EventType(Enum):
+    PRODUCT_CREATED = "product_created"
+    ORDER_CREATED = "order_created"
+    ORDER_STATUS_CHANGED = "order_status_changed"
+    STOCK_CHANGED = "stock_changed"
+
+
+@dataclass
+class DomainEvent:
+    """
+    Событие изменения данных склада в порядке фиксации. id монотонно
+    возрастает и служит курсором потребителя; aggregate_type и aggregate_id
+    указывают измененную сущность ("order", "product").
+    """
+
+    id: int
+    event_type: EventType
+    aggregate_type: str
+    aggregate_id: int
+    payload: Dict[str, Any] = field(default_factory=dict)
+    created_at: Optional[datetime] = None
+
+
+class WarehouseListener:
+    """
+    Получатель изменений, которые выполняет WarehouseService. Методы
+    вызываются синхронно внутри той же транзакции, что и сама операция,
+    поэтому их записи фиксируются или откатываются вместе с ней.
+    Реализации переопределяют только нужные методы.
+    """
+
+    def product_created(self, product: Product):
+        """
+        Вызывается после добавления продукта в репозиторий.
+        """
+
+    def orders_created(self, orders: List[Order]):
+        """
+        Вызывается после сохранения пакета новых заказов.
+        """
+
+    def order_status_changed(self, order: Order, previous: OrderStatus):
+        """
+        Вызывается после сохранения нового статуса заказа.
+        """
+
+    def orders_transitioned(
+        self, order_ids: List[int], previous: OrderStatus, status: OrderStatus
+    ):
+        """
+        Вызывается после пакетного перехода заказов order_ids из previous
+        в status (confirm_orders, ship_orders, cancel_orders).
+        """
+
+    def stock_changed(self, deltas: Dict[int, int]):
+        """
+        Вызывается после изменения остатков: {product_id: изменение количества}.
+        """
+
+
+class AsyncWarehouseListener:
+    """
+    Получатель изменений AsyncWarehouseService: те же методы, что
+    у WarehouseListener, но корутинами. Вызываются внутри транзакции
+    операции.
+    """
+
+    async def product_created(self, product: Product):
+        pass
+
+    async def orders_created(self, orders: List[Order]):
+        pass
+
+    async def order_status_changed(self, order: Order, previous: OrderStatus):
+        pass
+
+    async def orders_transitioned(
+        self, order_ids: List[int], previous: OrderStatus, status: OrderStatus
+    ):
+        pass
+
+    async def stock_changed(self, deltas: Dict[int, int]):
+        pass
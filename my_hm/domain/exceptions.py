@@ -0,0 +1,14 @@
+class ConcurrencyConflictError(Exception):
+    """
+    Запись изменена другой транзакцией после чтения: версия в базе
+    не совпадает с версией доменного объекта.
+    """
+
+    def __init__(self, entity: str, entity_id: int, version: int):
+        super().__init__(
+            f"{entity} {entity_id} изменен другой транзакцией "
+            f"(ожидалась версия {version})"
+        )
+        self.entity = entity
+        self.entity_id = entity_id
+        self.version = version
@@ -1,5 +1,6 @@
-from dataclasses import dataclass, field
-from typing import List, Optional
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from enum import Enum
 
 
@@ -10,19 +11,63 @@ class OrderStatus(Enum):
     CANCELLED = "cancelled"
 
 
+# Допустимые переходы: новый статус -> статусы, из которых в него можно перейти.
+STATUS_TRANSITIONS = {
+    OrderStatus.CONFIRMED: (OrderStatus.PENDING,),
+    OrderStatus.SHIPPED: (OrderStatus.CONFIRMED,),
+    OrderStatus.CANCELLED: (OrderStatus.PENDING, OrderStatus.CONFIRMED),
+}
+
+
+class TransitionOutcome(Enum):
+    APPLIED = "applied"
+    NOT_FOUND = "not_found"
+    INVALID_STATUS = "invalid_status"
+
+
 @dataclass
+class BulkTransitionReport:
+    """
+    Результат пакетного перехода в status: исход по каждому id и текущий
+    статус заказов, переход которых отклонен.
+    """
+
+    status: OrderStatus
+    outcomes: Dict[int, TransitionOutcome] = field(default_factory=dict)
+    current_statuses: Dict[int, OrderStatus] = field(default_factory=dict)
+
+    @property
+    def applied(self) -> List[int]:
+        return [
+            order_id
+            for order_id, outcome in self.outcomes.items()
+            if outcome == TransitionOutcome.APPLIED
+        ]
+
+    @property
+    def rejected(self) -> List[int]:
+        return [
+            order_id
+            for order_id, outcome in self.outcomes.items()
+            if outcome != TransitionOutcome.APPLIED
+        ]
+
+
+@dataclass(slots=True)
 class Customer:
     id: Optional[int] = None
     name: str = ""
     email: str = ""
+    version: int = 1
 
 
-@dataclass
+@dataclass(slots=True)
 class Product:
     id: Optional[int] = None
     name: str = ""
     quantity: int = 0
     price: float = 0.0
+    version: int = 1
 
     def __post_init__(self):
         if self.quantity < 0:
@@ -31,24 +76,155 @@ class Product:
             raise ValueError("Цена должна быть положительным числом")
 
 
+class ProductSort(Enum):
+    ID = "id"
+    NAME = "name"
+    PRICE = "price"
+
+
+@dataclass
+class CatalogQuery:
+    """
+    Параметры выборки каталога. Пагинация по ключу: after — курсор
+    (значение поля сортировки, id) последнего товара предыдущей страницы.
+    limit=None возвращает все подходящие товары одной страницей.
+    """
+
+    in_stock: bool = True
+    name_prefix: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    sort: ProductSort = ProductSort.ID
+    descending: bool = False
+    after: Optional[Tuple[Any, int]] = None
+    limit: Optional[int] = 50
+
+
+@dataclass
+class ProductPage:
+    items: List[Product] = field(default_factory=list)
+    next_cursor: Optional[Tuple[Any, int]] = None
+
+
+@dataclass(slots=True)
+class OrderSummary:
+    """
+    Плоская сводка заказа для списков: без строк и продуктов, только то,
+    что показывается в истории заказов клиента.
+    """
+
+    order_id: int
+    customer_id: int
+    status: OrderStatus
+    line_count: int = 0
+    item_count: int = 0
+    total_price: float = 0.0
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+@dataclass
+class OrderSummaryQuery:
+    """
+    Параметры выборки сводок заказов. Сортировка по id заказа (по умолчанию
+    новые первыми), after — id последнего заказа предыдущей страницы.
+    """
+
+    customer_id: Optional[int] = None
+    status: Optional[OrderStatus] = None
+    created_from: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    descending: bool = True
+    after: Optional[int] = None
+    limit: Optional[int] = 50
+
+
+@dataclass
+class OrderSummaryPage:
+    items: List[OrderSummary] = field(default_factory=list)
+    next_cursor: Optional[int] = None
+
+
 @dataclass
+class Totals:
+    """
+    Накопленный итог: count — число заказов (или единиц товара),
+    amount — сумма в деньгах.
+    """
+
+    count: int = 0
+    amount: float = 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class OrderLine:
+    """
+    Строка заказа: продукт, количество и цена за единицу на момент заказа.
+    """
+
+    product_id: int
+    quantity: int = 1
+    unit_price: float = 0.0
+
+    @property
+    def total_price(self) -> float:
+        return self.quantity * self.unit_price
+
+
+@dataclass(slots=True)
 class Order:
     id: Optional[int] = None
     customer_id: Optional[int] = None
     products: List[Product] = field(default_factory=list)
     status: OrderStatus = OrderStatus.PENDING
     total_price: float = 0.0
+    lines: List[OrderLine] = field(default_factory=list)
+    version: int = 1
+    # Время создания в UTC без часового пояса (так его хранит SQLite).
+    created_at: Optional[datetime] = None
+
+    def __post_init__(self):
+        # Заказ, собранный из одних продуктов, считается заказом по одной
+        # единице каждого: без строк отмена не вернула бы остатки.
+        if not self.lines and self.products:
+            quantities: Dict[int, int] = {}
+            prices: Dict[int, float] = {}
+            for product in self.products:
+                quantities[product.id] = quantities.get(product.id, 0) + 1
+                prices[product.id] = product.price
+            self.lines = [
+                OrderLine(product_id, quantity, prices[product_id])
+                for product_id, quantity in quantities.items()
+            ]
 
     def add_product(self, product: Product, quantity: int = 1):
         """
         Добавляет продукт в заказ, уменьшая его количество в наличии.
+        Повторное добавление того же продукта увеличивает количество
+        в существующей строке заказа.
         """
+        if quantity <= 0:
+            raise ValueError("Количество должно быть положительным числом")
         if product.quantity < quantity:
             raise ValueError(f"Недостаточно {product.name} на складе")
         product.quantity -= quantity
-        self.products.append(product)
+        for index, line in enumerate(self.lines):
+            if line.product_id == product.id:
+                self.lines[index] = OrderLine(
+                    product.id, line.quantity + quantity, line.unit_price
+                )
+                break
+        else:
+            self.lines.append(OrderLine(product.id, quantity, product.price))
+            self.products.append(product)
         self.total_price += product.price * quantity
 
+    def quantities(self) -> Dict[int, int]:
+        """
+        Возвращает количество каждого продукта в заказе: {product_id: количество}.
+        """
+        return {line.product_id: line.quantity for line in self.lines}
+
     def confirm(self):
         """
         Подтверждает заказ, изменяя его статус на CONFIRMED.
@@ -74,5 +250,114 @@ class Order:
         if self.status in [OrderStatus.SHIPPED, OrderStatus.CANCELLED]:
             raise ValueError("Заказ не может быть отменен")
         self.status = OrderStatus.CANCELLED
+        self._restore_stock()
+
+    def _restore_stock(self):
+        quantities = self.quantities()
         for product in self.products:
-            product.quantity += 1
+            product.quantity += quantities.get(product.id, 0)
+
+
+class LazyOrder(Order):
+    """
+    Заказ, список продуктов которого загружается функцией load_products
+    при первом обращении к products. Репозитории возвращают такие заказы,
+    чтобы чтение статусов и сумм не создавало копии продуктов каждой строки.
+    """
+
+    __slots__ = ("_load_products", "_loaded_products")
+
+    def __init__(
+        self,
+        *args,
+        load_products: Optional[Callable[[], List[Product]]] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        if load_products is not None:
+            self._load_products = load_products
+            self._loaded_products = None
+
+    @property
+    def products(self) -> List[Product]:
+        if self._loaded_products is None:
+            self._loaded_products = self._load_products()
+        return self._loaded_products
+
+    @products.setter
+    def products(self, products: List[Product]):
+        self._loaded_products = products
+
+    @property
+    def products_loaded(self) -> bool:
+        return self._loaded_products is not None
+
+    def __reduce__(self):
+        # Функция загрузки не сериализуется: копия и pickle дают обычный Order.
+        return (Order, tuple(getattr(self, f.name) for f in fields(Order)))
+
+    def _restore_stock(self):
+        # Незагруженные продукты при загрузке прочитаются уже с возвращенными
+        # остатками, поэтому загружать их ради отмены не нужно.
+        if self.products_loaded:
+            super()._restore_stock()
+
+
+@dataclass(frozen=True)
+class IdempotencyRecord:
+    """
+    Сохраненный ответ команды с ключом идемпотентности. command и fingerprint
+    (хэш аргументов) отличают повтор той же команды от повторного
+    использования ключа с другими аргументами; response — снимок заказа,
+    который вернула команда, в виде, пригодном для JSON.
+    """
+
+    key: str
+    command: str
+    fingerprint: str
+    response: Dict[str, Any]
+    created_at: Optional[datetime] = None
+
+    @classmethod
+    def for_order(
+        cls, key: str, command: str, fingerprint: str, order: Order
+    ) -> "IdempotencyRecord":
+        created_at = order.created_at.isoformat() if order.created_at else None
+        return cls(
+            key,
+            command,
+            fingerprint,
+            {
+                "id": order.id,
+                "customer_id": order.customer_id,
+                "status": order.status.value,
+                "total_price": order.total_price,
+                "version": order.version,
+                "created_at": created_at,
+                "lines": [
+                    [line.product_id, line.quantity, line.unit_price]
+                    for line in order.lines
+                ],
+            },
+        )
+
+    def replay_order(
+        self, load_products: Callable[[List[OrderLine]], List[Product]]
+    ) -> LazyOrder:
+        """
+        Восстанавливает заказ из сохраненного ответа. Продукты загружаются
+        load_products только при обращении к products.
+        """
+        response = self.response
+        lines = [OrderLine(*line) for line in response["lines"]]
+        created_at = response["created_at"]
+        return LazyOrder(
+            id=response["id"],
+            customer_id=response["customer_id"],
+            status=OrderStatus(response["status"]),
+            total_price=response["total_price"],
+            lines=lines,
+            version=response["version"],
+            created_at=datetime.fromisoformat(created_at) if created_at else None,
+            load_products=lambda: load_products(lines),
+        )
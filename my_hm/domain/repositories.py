@@ -1,6 +1,15 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
-from .models import Product, Order, Customer
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional
+from .models import (
+    Product,
+    Order,
+    Customer,
+    OrderStatus,
+    CatalogQuery,
+    ProductPage,
+    IdempotencyRecord,
+)
 
 
 class CustomerRepository(ABC):
@@ -8,6 +17,14 @@ class CustomerRepository(ABC):
     def add(self, customer: Customer) -> Customer:
         pass
 
+    @abstractmethod
+    def get(self, customer_id: int) -> Optional[Customer]:
+        pass
+
+    @abstractmethod
+    def get_many(self, customer_ids: Iterable[int]) -> Dict[int, Customer]:
+        pass
+
     @abstractmethod
     def list(self) -> List[Customer]:
         pass
@@ -16,6 +33,22 @@ class CustomerRepository(ABC):
     def update(self, customer: Customer):
         pass
 
+    @abstractmethod
+    def get_by_email(self, email: str) -> Optional[Customer]:
+        pass
+
+    @abstractmethod
+    def get_many_by_email(self, emails: Iterable[str]) -> Dict[str, Customer]:
+        pass
+
+    @abstractmethod
+    def upsert_many(self, customers: Iterable[Customer]) -> List[Customer]:
+        """
+        Добавляет клиентов, а у существующих (по email) обновляет имя.
+        Возвращает сохраненных клиентов с id и версиями, по одному на email
+        (при повторах email побеждает последняя запись).
+        """
+
 
 class ProductRepository(ABC):
     @abstractmethod
@@ -26,6 +59,10 @@ class ProductRepository(ABC):
     def get(self, product_id: int) -> Optional[Product]:
         pass
 
+    @abstractmethod
+    def get_many(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        pass
+
     @abstractmethod
     def list(self) -> List[Product]:
         pass
@@ -34,12 +71,33 @@ class ProductRepository(ABC):
     def update(self, product: Product):
         pass
 
+    @abstractmethod
+    def find(self, query: CatalogQuery) -> ProductPage:
+        pass
+
+    @abstractmethod
+    def reserve_stock(self, quantities: Dict[int, int]) -> List[int]:
+        """
+        Атомарно списывает {product_id: количество}. Возвращает id продуктов,
+        которых не хватило; в этом случае ничего не списывается.
+        """
+
+    @abstractmethod
+    def release_stock(self, quantities: Dict[int, int]):
+        """
+        Возвращает {product_id: количество} на склад.
+        """
+
 
 class OrderRepository(ABC):
     @abstractmethod
     def add(self, order: Order) -> Order:
         pass
 
+    @abstractmethod
+    def add_many(self, orders: List[Order]) -> List[Order]:
+        pass
+
     @abstractmethod
     def get(self, order_id: int) -> Optional[Order]:
         pass
@@ -48,6 +106,206 @@ class OrderRepository(ABC):
     def list(self) -> List[Order]:
         pass
 
+    @abstractmethod
+    def iter_orders(
+        self,
+        batch_size: int = 1000,
+        status: Optional[OrderStatus] = None,
+        customer_id: Optional[int] = None,
+    ) -> Iterator[Order]:
+        pass
+
     @abstractmethod
     def update(self, order: Order):
         pass
+
+    @abstractmethod
+    def transition_many(
+        self, order_ids: Iterable[int], previous: OrderStatus, status: OrderStatus
+    ) -> List[int]:
+        """
+        Переводит в status те заказы из order_ids, которые находятся
+        в статусе previous. Возвращает id измененных заказов.
+        """
+
+    @abstractmethod
+    def get_statuses(self, order_ids: Iterable[int]) -> Dict[int, OrderStatus]:
+        pass
+
+    @abstractmethod
+    def find_pending_before(self, created_before: datetime, limit: int) -> List[int]:
+        """
+        Возвращает id заказов в статусе PENDING, созданных раньше
+        created_before, начиная с самых старых, не больше limit.
+        """
+
+    @abstractmethod
+    def line_quantities(self, order_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Возвращает суммарное количество каждого продукта в строках заказов:
+        {product_id: количество}.
+        """
+
+
+class IdempotencyRepository(ABC):
+    """
+    Ответы команд WarehouseService по ключам идемпотентности. Запись
+    сохраняется в той же транзакции, что и результат команды.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[IdempotencyRecord]:
+        pass
+
+    @abstractmethod
+    def save(
+        self, key: str, command: str, fingerprint: str, order: Order
+    ) -> IdempotencyRecord:
+        """
+        Сохраняет снимок заказа order как ответ команды.
+        """
+
+
+# Асинхронные варианты репозиториев для AsyncWarehouseService: те же операции,
+# что и у синхронных, но корутинами.
+
+
+class AsyncCustomerRepository(ABC):
+    @abstractmethod
+    async def add(self, customer: Customer) -> Customer:
+        pass
+
+    @abstractmethod
+    async def get(self, customer_id: int) -> Optional[Customer]:
+        pass
+
+    @abstractmethod
+    async def get_many(self, customer_ids: Iterable[int]) -> Dict[int, Customer]:
+        pass
+
+    @abstractmethod
+    async def list(self) -> List[Customer]:
+        pass
+
+    @abstractmethod
+    async def update(self, customer: Customer):
+        pass
+
+    @abstractmethod
+    async def get_by_email(self, email: str) -> Optional[Customer]:
+        pass
+
+    @abstractmethod
+    async def get_many_by_email(self, emails: Iterable[str]) -> Dict[str, Customer]:
+        pass
+
+    @abstractmethod
+    async def upsert_many(self, customers: Iterable[Customer]) -> List[Customer]:
+        """
+        См. CustomerRepository.upsert_many.
+        """
+
+
+class AsyncProductRepository(ABC):
+    @abstractmethod
+    async def add(self, product: Product) -> Product:
+        pass
+
+    @abstractmethod
+    async def get(self, product_id: int) -> Optional[Product]:
+        pass
+
+    @abstractmethod
+    async def get_many(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        pass
+
+    @abstractmethod
+    async def list(self) -> List[Product]:
+        pass
+
+    @abstractmethod
+    async def update(self, product: Product):
+        pass
+
+    @abstractmethod
+    async def find(self, query: CatalogQuery) -> ProductPage:
+        pass
+
+    @abstractmethod
+    async def reserve_stock(self, quantities: Dict[int, int]) -> List[int]:
+        """
+        См. ProductRepository.reserve_stock.
+        """
+
+    @abstractmethod
+    async def release_stock(self, quantities: Dict[int, int]):
+        pass
+
+
+class AsyncOrderRepository(ABC):
+    @abstractmethod
+    async def add(self, order: Order) -> Order:
+        pass
+
+    @abstractmethod
+    async def add_many(self, orders: List[Order]) -> List[Order]:
+        pass
+
+    @abstractmethod
+    async def get(self, order_id: int) -> Optional[Order]:
+        pass
+
+    @abstractmethod
+    async def list(self) -> List[Order]:
+        pass
+
+    @abstractmethod
+    async def iter_orders(
+        self,
+        batch_size: int = 1000,
+        status: Optional[OrderStatus] = None,
+        customer_id: Optional[int] = None,
+    ) -> AsyncIterator[Order]:
+        """
+        Асинхронный генератор заказов порциями по batch_size.
+        """
+
+    @abstractmethod
+    async def update(self, order: Order):
+        pass
+
+    @abstractmethod
+    async def transition_many(
+        self, order_ids: Iterable[int], previous: OrderStatus, status: OrderStatus
+    ) -> List[int]:
+        """
+        См. OrderRepository.transition_many.
+        """
+
+    @abstractmethod
+    async def get_statuses(self, order_ids: Iterable[int]) -> Dict[int, OrderStatus]:
+        pass
+
+    @abstractmethod
+    async def find_pending_before(
+        self, created_before: datetime, limit: int
+    ) -> List[int]:
+        """
+        См. OrderRepository.find_pending_before.
+        """
+
+    @abstractmethod
+    async def line_quantities(self, order_ids: Iterable[int]) -> Dict[int, int]:
+        pass
+
+
+class AsyncIdempotencyRepository(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> Optional[IdempotencyRecord]:
+        pass
+
+    @abstractmethod
+    async def save(
+        self, key: str, command: str, fingerprint: str, order: Order
+    ) -> IdempotencyRecord:
+        pass
@@ -1,93 +1,357 @@
-from typing import List
-from .models import Product, Order, Customer
-from .repositories import ProductRepository, OrderRepository, CustomerRepository
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import (
+    Awaitable,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+from .clock import utc_now
+from .commands import (
+    BulkTransition,
+    OrderItems,
+    apply_transition,
+    build_orders,
+    check_replay,
+    check_reserved,
+    consumed_stock,
+    create_order_arguments,
+    idempotency_fingerprint,
+    line_products,
+    normalize_batch,
+)
+from .events import WarehouseListener
+from .exceptions import ConcurrencyConflictError
+from .models import (
+    Product,
+    Order,
+    Customer,
+    CatalogQuery,
+    ProductPage,
+    OrderStatus,
+    BulkTransitionReport,
+    OrderLine,
+)
+from .repositories import (
+    ProductRepository,
+    OrderRepository,
+    CustomerRepository,
+    IdempotencyRepository,
+)
+
+
+T = TypeVar("T")
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Повтор операции при ConcurrencyConflictError. Каждая попытка заново
+    читает данные и заново проверяет переход статуса, поэтому повтор
+    безопасен. Между попытками выдерживается экспоненциальная пауза
+    со случайным разбросом, чтобы конкурирующие процессы разошлись.
+    """
+
+    attempts: int = 3
+    backoff: float = 0.005
+    max_backoff: float = 0.1
+
+    def delay(self, attempt: int) -> float:
+        """
+        Возвращает паузу перед повтором после попытки с номером attempt (с 1).
+        """
+        ceiling = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+    def run(self, operation: Callable[[], T]) -> T:
+        for attempt in range(1, self.attempts + 1):
+            try:
+                return operation()
+            except ConcurrencyConflictError:
+                if attempt == self.attempts:
+                    raise
+                time.sleep(self.delay(attempt))
+        raise ValueError("Число попыток должно быть положительным")
+
+    async def run_async(self, operation: Callable[[], Awaitable[T]]) -> T:
+        for attempt in range(1, self.attempts + 1):
+            try:
+                return await operation()
+            except ConcurrencyConflictError:
+                if attempt == self.attempts:
+                    raise
+                await asyncio.sleep(self.delay(attempt))
+        raise ValueError("Число попыток должно быть положительным")
 
 
 class WarehouseService:
+    """
+    Сервис склада. Изменения статуса заказа записываются с проверкой версии;
+    при конфликте операция повторяется по retry_policy (можно заменить
+    у экземпляра). Время создания заказов берется из clock.
+
+    Команды над одним заказом принимают idempotency_key: повтор с тем же
+    ключом (например, после таймаута у клиента) возвращает сохраненный ответ
+    из idempotency_repo и не меняет ни заказы, ни остатки.
+    """
+
+    retry_policy = RetryPolicy()
+    clock: Callable[[], datetime] = staticmethod(utc_now)
+
     def __init__(
         self,
         product_repo: ProductRepository,
         order_repo: OrderRepository,
         customer_repo: CustomerRepository,
+        listeners: Sequence[WarehouseListener] = (),
+        idempotency_repo: Optional[IdempotencyRepository] = None,
     ):
         self.product_repo = product_repo
         self.order_repo = order_repo
         self.customer_repo = customer_repo
+        self.listeners = list(listeners)
+        self.idempotency_repo = idempotency_repo
 
     def create_customer(self, name: str, email: str) -> Customer:
         """
         Создает нового клиента и добавляет его в репозиторий.
         """
+        if self.customer_repo.get_by_email(email) is not None:
+            raise ValueError(f"Клиент с email {email} уже существует")
         customer = Customer(name=name, email=email)
         return self.customer_repo.add(customer)
 
+    def upsert_customers(self, customers: Iterable[Tuple[str, str]]) -> List[Customer]:
+        """
+        Синхронизирует пакет клиентов (имя, email): новые email добавляются,
+        у существующих обновляется имя. Возвращает клиентов с id.
+        """
+        return self.customer_repo.upsert_many(
+            [Customer(name=name, email=email) for name, email in customers]
+        )
+
     def create_product(self, name: str, quantity: int, price: float) -> Product:
         """
         Создает новый продукт и добавляет его в репозиторий.
         """
         product = Product(name=name, quantity=quantity, price=price)
-        return self.product_repo.add(product)
+        product = self.product_repo.add(product)
+        for listener in self.listeners:
+            listener.product_created(product)
+        return product
 
-    def create_order(self, customer_id: int, product_ids: List[int]) -> Order:
+    def create_order(
+        self,
+        customer_id: int,
+        product_ids: OrderItems,
+        idempotency_key: Optional[str] = None,
+    ) -> Order:
         """
         Создает новый заказ для указанного клиента с выбранными продуктами.
+        Продукты передаются словарем {product_id: количество} или списком id.
         """
-        customer = self.customer_repo.get(customer_id)
-        if not customer:
-            raise ValueError("Клиент не найден")
-
-        products = []
-        for pid in product_ids:
-            product = self.product_repo.get(pid)
-            if not product or product.quantity <= 0:
-                raise ValueError(f"Продукт {pid} недоступен")
-            products.append(product)
+        return self._idempotent(
+            idempotency_key,
+            "create_order",
+            create_order_arguments(customer_id, product_ids),
+            lambda: self.create_orders([(customer_id, product_ids)])[0],
+        )
 
-        order = Order(customer_id=customer_id)
-        for product in products:
-            order.add_product(product)
+    def create_orders(self, batch: List[Tuple[int, OrderItems]]) -> List[Order]:
+        """
+        Создает пакет заказов. Клиенты и продукты всего пакета загружаются
+        одним запросом на сущность, а заказы сохраняются одной операцией.
+        Остатки продуктов общие для всего пакета, поэтому заказы
+        не могут суммарно превысить наличие на складе. Списание выполняется
+        в базе атомарно одним вызовом reserve_stock для всего пакета.
+        """
+        customer_ids, batch, product_ids = normalize_batch(batch)
+        customers = self.customer_repo.get_many(customer_ids)
+        products = self.product_repo.get_many(product_ids)
 
-        return self.order_repo.add(order)
+        orders, reserved = build_orders(batch, customers, products, self.clock())
+        check_reserved(self.product_repo.reserve_stock(reserved))
+        orders = self.order_repo.add_many(orders)
+        consumed = consumed_stock(reserved)
+        for listener in self.listeners:
+            listener.stock_changed(consumed)
+            listener.orders_created(orders)
+        return orders
 
-    def confirm_order(self, order_id: int) -> Order:
+    def confirm_order(
+        self, order_id: int, idempotency_key: Optional[str] = None
+    ) -> Order:
         """
-        Подтверждает заказ, изменяя его статус и обновляя количество продуктов.
+        Подтверждает заказ, изменяя его статус. Остатки уже списаны
+        при создании заказа.
         """
-        order = self.order_repo.get(order_id)
-        if not order:
-            raise ValueError("Заказ не найден")
-        order.confirm()
-        for product in order.products:
-            self.product_repo.update(product)
-        self.order_repo.update(order)
-        return order
+        return self._idempotent(
+            idempotency_key,
+            "confirm_order",
+            order_id,
+            lambda: self._change_status(order_id, Order.confirm),
+        )
 
-    def ship_order(self, order_id: int) -> Order:
+    def ship_order(self, order_id: int, idempotency_key: Optional[str] = None) -> Order:
         """
         Отправляет заказ, изменяя его статус и обновляя запись.
         """
-        order = self.order_repo.get(order_id)
-        if not order:
-            raise ValueError("Заказ не найден")
-        order.ship()
-        self.order_repo.update(order)
-        return order
+        return self._idempotent(
+            idempotency_key,
+            "ship_order",
+            order_id,
+            lambda: self._change_status(order_id, Order.ship),
+        )
 
-    def cancel_order(self, order_id: int) -> Order:
+    def cancel_order(
+        self, order_id: int, idempotency_key: Optional[str] = None
+    ) -> Order:
         """
-        Отменяет заказ, изменяя его статус и обновляя количество продуктов.
+        Отменяет заказ, изменяя его статус и возвращая на склад
+        количество каждой строки заказа. Остатки возвращаются только после
+        успешной записи статуса, поэтому повтор не вернет их дважды.
         """
-        order = self.order_repo.get(order_id)
-        if not order:
-            raise ValueError("Заказ не найден")
-        order.cancel()
-        for product in order.products:
-            self.product_repo.update(product)
-        self.order_repo.update(order)
+        return self._idempotent(
+            idempotency_key, "cancel_order", order_id, lambda: self._cancel(order_id)
+        )
+
+    def _cancel(self, order_id: int) -> Order:
+        order, previous = self.retry_policy.run(
+            lambda: self._apply_transition(order_id, Order.cancel)
+        )
+        released = order.quantities()
+        self.product_repo.release_stock(released)
+        for listener in self.listeners:
+            listener.stock_changed(released)
+        self._status_changed(order, previous)
         return order
 
+    def confirm_orders(self, order_ids: Iterable[int]) -> BulkTransitionReport:
+        """
+        Подтверждает пакет заказов. Правило перехода проверяется в SQL
+        (UPDATE ... WHERE id IN (...) AND status = 'pending'), заказы
+        в Python не загружаются. Возвращает исход по каждому id.
+        """
+        return self._transition_many(order_ids, OrderStatus.CONFIRMED)
+
+    def ship_orders(self, order_ids: Iterable[int]) -> BulkTransitionReport:
+        """
+        Отправляет пакет подтвержденных заказов, как confirm_orders.
+        """
+        return self._transition_many(order_ids, OrderStatus.SHIPPED)
+
+    def cancel_orders(self, order_ids: Iterable[int]) -> BulkTransitionReport:
+        """
+        Отменяет пакет заказов и возвращает на склад строки отмененных
+        заказов: количества суммируются одним запросом и возвращаются
+        одним UPDATE.
+        """
+        return self._cancel_many(order_ids)
+
+    def expire_pending_orders(
+        self, created_before: datetime, limit: int = 500
+    ) -> BulkTransitionReport:
+        """
+        Отменяет до limit самых старых заказов, которые остаются в статусе
+        PENDING с момента раньше created_before, и возвращает их резерв на
+        склад одним UPDATE. Заказы, подтвержденные после выборки,
+        не отменяются.
+        """
+        order_ids = self.order_repo.find_pending_before(created_before, limit)
+        return self._cancel_many(order_ids, sources=[OrderStatus.PENDING])
+
     def get_available_products(self) -> List[Product]:
         """
         Возвращает список доступных продуктов на складе.
         """
-        return [p for p in self.product_repo.list() if p.quantity > 0]
+        return self.product_repo.find(CatalogQuery(in_stock=True, limit=None)).items
+
+    def search_products(self, query: CatalogQuery) -> ProductPage:
+        """
+        Возвращает страницу каталога по фильтрам и курсору из query.
+        """
+        return self.product_repo.find(query)
+
+    def _idempotent(
+        self, key: Optional[str], command: str, arguments, execute: Callable[[], Order]
+    ) -> Order:
+        """
+        Выполняет команду один раз на ключ. Повтор возвращает заказ из
+        сохраненного ответа: заказы не читаются, а продукты загружаются,
+        только если к ним обратятся. Ответ сохраняется в той же транзакции,
+        что и результат команды; неудачные команды не сохраняются.
+        """
+        if key is None:
+            return execute()
+        fingerprint = idempotency_fingerprint(self.idempotency_repo, command, arguments)
+        record = self.idempotency_repo.get(key)
+        if record is not None:
+            check_replay(record, command, fingerprint)
+            return record.replay_order(self._line_products)
+        order = execute()
+        self.idempotency_repo.save(key, command, fingerprint, order)
+        return order
+
+    def _line_products(self, lines: List[OrderLine]) -> List[Product]:
+        products = self.product_repo.get_many([line.product_id for line in lines])
+        return line_products(lines, products)
+
+    def _change_status(
+        self, order_id: int, transition: Callable[[Order], None]
+    ) -> Order:
+        order, previous = self.retry_policy.run(
+            lambda: self._apply_transition(order_id, transition)
+        )
+        self._status_changed(order, previous)
+        return order
+
+    def _apply_transition(
+        self, order_id: int, transition: Callable[[Order], None]
+    ) -> Tuple[Order, OrderStatus]:
+        """
+        Одна попытка: читает заказ, проверяет и применяет переход,
+        записывает его с проверкой версии.
+        """
+        order = self.order_repo.get(order_id)
+        previous = apply_transition(order, transition)
+        self.order_repo.update(order)
+        return order, previous
+
+    def _cancel_many(
+        self,
+        order_ids: Iterable[int],
+        sources: Optional[Sequence[OrderStatus]] = None,
+    ) -> BulkTransitionReport:
+        report = self._transition_many(order_ids, OrderStatus.CANCELLED, sources)
+        released = self.order_repo.line_quantities(report.applied)
+        self.product_repo.release_stock(released)
+        for listener in self.listeners:
+            listener.stock_changed(released)
+        return report
+
+    def _transition_many(
+        self,
+        order_ids: Iterable[int],
+        status: OrderStatus,
+        sources: Optional[Sequence[OrderStatus]] = None,
+    ) -> BulkTransitionReport:
+        plan = BulkTransition(order_ids, status, sources)
+        for previous in plan.steps():
+            updated = self.order_repo.transition_many(plan.remaining, previous, status)
+            plan.applied(updated)
+            if updated:
+                for listener in self.listeners:
+                    listener.orders_transitioned(updated, previous, status)
+        remaining = plan.remaining
+        return plan.finish(self.order_repo.get_statuses(remaining) if remaining else {})
+
+    def _status_changed(self, order: Order, previous: OrderStatus):
+        for listener in self.listeners:
+            listener.order_status_changed(order, previous)
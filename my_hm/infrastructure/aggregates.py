@@ -0,0 +1,328 @@
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import Insert, case, delete, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from my_hm.domain.events import WarehouseListener
+from my_hm.domain.models import Order, OrderStatus, Product, Totals
+from .sql_helpers import CASE_CHUNK_SIZE, chunked
+from .orm import (
+    CustomerTotalsORM,
+    InventoryTotalsORM,
+    OrderLineORM,
+    OrderORM,
+    OrderStatusTotalsORM,
+    ProductORM,
+    ProductTotalsORM,
+)
+
+_INVENTORY_ROW_ID = 1
+
+
+def _upsert_increments(
+    model, key, count, amount, rows: Dict[object, Totals]
+) -> Iterator[Insert]:
+    """
+    INSERT ... ON CONFLICT DO UPDATE, прибавляющие count/amount к строкам
+    итогов с ключами из rows (отсутствующие строки создаются), по одному
+    многострочному INSERT на порцию ключей.
+    """
+    table = model.__table__
+    for chunk in chunked(rows, CASE_CHUNK_SIZE):
+        statement = sqlite_insert(table).values(
+            [
+                {key: row_key, count: rows[row_key].count, amount: rows[row_key].amount}
+                for row_key in chunk
+            ]
+        )
+        yield statement.on_conflict_do_update(
+            index_elements=[key],
+            set_={
+                count: table.c[count] + statement.excluded[count],
+                amount: table.c[amount] + statement.excluded[amount],
+            },
+        )
+
+
+class SqlAlchemyAggregates(WarehouseListener):
+    """
+    Денормализованные итоги для отчетов: по статусам заказов, по клиентам,
+    по продуктам и общая стоимость склада. Подключается к WarehouseService
+    как listener и обновляет итоги приращениями в той же сессии, поэтому
+    чтение отчета — одна строка по ключу вместо обхода заказов и их строк.
+
+    Итоги клиентов и продуктов учитывают только неотмененные заказы.
+    Изменения в обход сервиса (bulk-импорт, ProductRepository.update с новой
+    ценой) итоги не видят; для сверки есть rebuild(). Таблицы из tables
+    ensure_schema заполняет rebuild() при их создании.
+    """
+
+    tables = (
+        OrderStatusTotalsORM.__tablename__,
+        CustomerTotalsORM.__tablename__,
+        ProductTotalsORM.__tablename__,
+        InventoryTotalsORM.__tablename__,
+    )
+
+    def __init__(self, session: Session, read_session: Optional[Session] = None):
+        self.session = session
+        self.read_session = read_session or session
+
+    def product_created(self, product: Product):
+        self._add_inventory(product.quantity, product.quantity * product.price)
+
+    def orders_created(self, orders: List[Order]):
+        by_status: Dict[OrderStatus, Totals] = defaultdict(Totals)
+        for order in orders:
+            _accumulate(by_status[order.status], 1, order.total_price)
+        self._execute(
+            _upsert_increments(
+                OrderStatusTotalsORM,
+                "status",
+                "order_count",
+                "revenue",
+                {status.value: totals for status, totals in by_status.items()},
+            )
+        )
+        self._apply_sales(orders, sign=1)
+
+    def order_status_changed(self, order: Order, previous: OrderStatus):
+        self._execute(
+            _upsert_increments(
+                OrderStatusTotalsORM,
+                "status",
+                "order_count",
+                "revenue",
+                {
+                    previous.value: Totals(-1, -order.total_price),
+                    order.status.value: Totals(1, order.total_price),
+                },
+            )
+        )
+        if order.status == OrderStatus.CANCELLED:
+            self._apply_sales([order], sign=-1)
+
+    def orders_transitioned(
+        self, order_ids: List[int], previous: OrderStatus, status: OrderStatus
+    ):
+        """
+        Пакетный переход: суммы переходящих заказов считаются в SQL
+        (GROUP BY по порциям id), заказы в Python не загружаются.
+        """
+        for chunk in chunked(order_ids):
+            count, revenue = self.session.execute(
+                select(
+                    func.count(),  # pylint: disable=not-callable
+                    func.coalesce(func.sum(OrderORM.total_price), 0.0),
+                ).where(OrderORM.id.in_(chunk))
+            ).one()
+            self._execute(
+                _upsert_increments(
+                    OrderStatusTotalsORM,
+                    "status",
+                    "order_count",
+                    "revenue",
+                    {
+                        previous.value: Totals(-count, -revenue),
+                        status.value: Totals(count, revenue),
+                    },
+                )
+            )
+            if status == OrderStatus.CANCELLED:
+                self._retract_sales(chunk)
+
+    def stock_changed(self, deltas: Dict[int, int]):
+        deltas = {pid: delta for pid, delta in deltas.items() if delta}
+        for chunk in chunked(sorted(deltas), CASE_CHUNK_SIZE):
+            part = {pid: deltas[pid] for pid in chunk}
+            # Стоимость изменения считается в SQL по текущим ценам продуктов.
+            value = (
+                select(
+                    func.coalesce(
+                        func.sum(
+                            ProductORM.price * case(part, value=ProductORM.id, else_=0)
+                        ),
+                        0.0,
+                    )
+                )
+                .where(ProductORM.id.in_(chunk))
+                .scalar_subquery()
+            )
+            self._add_inventory(sum(part.values()), value)
+
+    def status_totals(self) -> Dict[OrderStatus, Totals]:
+        """
+        Возвращает число заказов и их сумму по каждому статусу.
+        """
+        rows = self.read_session.execute(
+            select(
+                OrderStatusTotalsORM.status,
+                OrderStatusTotalsORM.order_count,
+                OrderStatusTotalsORM.revenue,
+            )
+        )
+        totals = {status: Totals() for status in OrderStatus}
+        for status, count, revenue in rows:
+            totals[OrderStatus(status)] = Totals(count, revenue)
+        return totals
+
+    def customer_totals(self, customer_id: int) -> Totals:
+        """
+        Возвращает число неотмененных заказов клиента и их сумму.
+        """
+        row = self.read_session.get(CustomerTotalsORM, customer_id)
+        return Totals(row.order_count, row.revenue) if row else Totals()
+
+    def product_totals(self, product_id: int) -> Totals:
+        """
+        Возвращает число проданных единиц продукта и выручку по нему.
+        """
+        row = self.read_session.get(ProductTotalsORM, product_id)
+        return Totals(row.units_sold, row.revenue) if row else Totals()
+
+    def inventory(self) -> Totals:
+        """
+        Возвращает общее количество единиц на складе и их стоимость.
+        """
+        row = self.read_session.get(InventoryTotalsORM, _INVENTORY_ROW_ID)
+        return Totals(row.units, row.value) if row else Totals()
+
+    def rebuild(self):
+        """
+        Пересчитывает все итоги по исходным таблицам. Выполняет полный
+        обход, поэтому нужен только для первоначального заполнения и сверки.
+        """
+        for model in (
+            OrderStatusTotalsORM,
+            CustomerTotalsORM,
+            ProductTotalsORM,
+            InventoryTotalsORM,
+        ):
+            self.session.execute(delete(model))
+        active = OrderORM.status != OrderStatus.CANCELLED.value
+
+        self.session.execute(
+            insert(OrderStatusTotalsORM).from_select(
+                ["status", "order_count", "revenue"],
+                select(
+                    OrderORM.status,
+                    func.count(),  # pylint: disable=not-callable
+                    func.sum(OrderORM.total_price),
+                ).group_by(OrderORM.status),
+            )
+        )
+        self.session.execute(
+            insert(CustomerTotalsORM).from_select(
+                ["customer_id", "order_count", "revenue"],
+                select(
+                    OrderORM.customer_id,
+                    func.count(),  # pylint: disable=not-callable
+                    func.sum(OrderORM.total_price),
+                )
+                .where(active)
+                .group_by(OrderORM.customer_id),
+            )
+        )
+        self.session.execute(
+            insert(ProductTotalsORM).from_select(
+                ["product_id", "units_sold", "revenue"],
+                select(
+                    OrderLineORM.product_id,
+                    func.sum(OrderLineORM.quantity),
+                    func.sum(OrderLineORM.quantity * OrderLineORM.unit_price),
+                )
+                .join(OrderORM, OrderORM.id == OrderLineORM.order_id)
+                .where(active)
+                .group_by(OrderLineORM.product_id),
+            )
+        )
+        self.session.execute(
+            insert(InventoryTotalsORM).from_select(
+                ["id", "units", "value"],
+                select(
+                    _INVENTORY_ROW_ID,
+                    func.coalesce(func.sum(ProductORM.quantity), 0),
+                    func.coalesce(
+                        func.sum(ProductORM.quantity * ProductORM.price), 0.0
+                    ),
+                ),
+            )
+        )
+
+    def _apply_sales(self, orders: List[Order], sign: int):
+        customers: Dict[int, Totals] = defaultdict(Totals)
+        products: Dict[int, Totals] = defaultdict(Totals)
+        for order in orders:
+            _accumulate(customers[order.customer_id], sign, sign * order.total_price)
+            for line in order.lines:
+                _accumulate(
+                    products[line.product_id],
+                    sign * line.quantity,
+                    sign * line.total_price,
+                )
+        self._execute(
+            _upsert_increments(
+                CustomerTotalsORM, "customer_id", "order_count", "revenue", customers
+            )
+        )
+        self._execute(
+            _upsert_increments(
+                ProductTotalsORM, "product_id", "units_sold", "revenue", products
+            )
+        )
+
+    def _retract_sales(self, order_ids: List[int]):
+        customers = {
+            customer_id: Totals(-count, -revenue)
+            for customer_id, count, revenue in self.session.execute(
+                select(
+                    OrderORM.customer_id,
+                    func.count(),  # pylint: disable=not-callable
+                    func.sum(OrderORM.total_price),
+                )
+                .where(OrderORM.id.in_(order_ids))
+                .group_by(OrderORM.customer_id)
+            )
+        }
+        products = {
+            product_id: Totals(-units, -revenue)
+            for product_id, units, revenue in self.session.execute(
+                select(
+                    OrderLineORM.product_id,
+                    func.sum(OrderLineORM.quantity),
+                    func.sum(OrderLineORM.quantity * OrderLineORM.unit_price),
+                )
+                .where(OrderLineORM.order_id.in_(order_ids))
+                .group_by(OrderLineORM.product_id)
+            )
+        }
+        self._execute(
+            _upsert_increments(
+                CustomerTotalsORM, "customer_id", "order_count", "revenue", customers
+            )
+        )
+        self._execute(
+            _upsert_increments(
+                ProductTotalsORM, "product_id", "units_sold", "revenue", products
+            )
+        )
+
+    def _add_inventory(self, units: int, value):
+        self._execute(
+            _upsert_increments(
+                InventoryTotalsORM,
+                "id",
+                "units",
+                "value",
+                {_INVENTORY_ROW_ID: Totals(units, value)},
+            )
+        )
+
+    def _execute(self, statements: Iterable[Insert]):
+        for statement in statements:
+            self.session.execute(statement)
+
+
+def _accumulate(totals: Totals, count: int, amount: float):
+    totals.count += count
+    totals.amount += amount
@@ -0,0 +1,238 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from sqlalchemy import Select, case, select
+from sqlalchemy.orm import Session
+from my_hm.domain.models import OrderStatus, Totals
+from .orm import OrderLineORM, OrderORM, ProductORM
+
+# Статусы кодируются в SQL малыми целыми, чтобы в массивах не было строк.
+_STATUSES = list(OrderStatus)
+_STATUS_CODE = case(
+    {status.value: code for code, status in enumerate(_STATUSES)},
+    value=OrderORM.status,
+    else_=-1,
+)
+_CANCELLED_CODE = _STATUSES.index(OrderStatus.CANCELLED)
+
+_PRODUCT_DTYPE = np.dtype([("id", "i8"), ("quantity", "i8"), ("price", "f8")])
+_ORDER_DTYPE = np.dtype([("id", "i8"), ("status", "i1"), ("total_price", "f8")])
+_LINE_DTYPE = np.dtype(
+    [
+        ("order_id", "i8"),
+        ("product_id", "i8"),
+        ("quantity", "i8"),
+        ("unit_price", "f8"),
+    ]
+)
+
+
+@dataclass
+class ProductColumns:
+    ids: np.ndarray
+    quantities: np.ndarray
+    prices: np.ndarray
+
+
+@dataclass
+class OrderColumns:
+    ids: np.ndarray
+    statuses: np.ndarray
+    total_prices: np.ndarray
+
+
+@dataclass
+class OrderLineColumns:
+    """
+    Строки заказов; statuses — код статуса заказа строки (индекс в OrderStatus).
+    """
+
+    order_ids: np.ndarray
+    product_ids: np.ndarray
+    quantities: np.ndarray
+    unit_prices: np.ndarray
+    statuses: np.ndarray
+
+
+class WarehouseAnalytics:
+    """
+    Отчеты по складу и заказам над столбцами NumPy. Продукты, заказы и
+    строки заказов читаются по столбцам порциями по chunk_size строк
+    напрямую из курсора драйвера (без построения ORM-объектов и dataclass),
+    после чего каждый отчет — несколько векторных операций.
+
+    Столбцы загружаются при первом отчете и кэшируются; refresh()
+    сбрасывает кэш. Для отчетов, не мешающих записи, передается сессия
+    пула только для чтения.
+    """
+
+    def __init__(self, session: Session, chunk_size: int = 100_000):
+        if chunk_size <= 0:
+            raise ValueError("Размер порции должен быть положительным числом")
+        self.session = session
+        self.chunk_size = chunk_size
+        self._products: Optional[ProductColumns] = None
+        self._orders: Optional[OrderColumns] = None
+        self._lines: Optional[OrderLineColumns] = None
+
+    def refresh(self):
+        self._products = self._orders = self._lines = None
+
+    def products(self) -> ProductColumns:
+        if self._products is None:
+            rows = self._read(
+                select(ProductORM.id, ProductORM.quantity, ProductORM.price),
+                _PRODUCT_DTYPE,
+            )
+            self._products = ProductColumns(rows["id"], rows["quantity"], rows["price"])
+        return self._products
+
+    def orders(self) -> OrderColumns:
+        if self._orders is None:
+            rows = self._read(
+                select(OrderORM.id, _STATUS_CODE, OrderORM.total_price).order_by(
+                    OrderORM.id
+                ),
+                _ORDER_DTYPE,
+            )
+            self._orders = OrderColumns(rows["id"], rows["status"], rows["total_price"])
+        return self._orders
+
+    def order_lines(self) -> OrderLineColumns:
+        if self._lines is None:
+            rows = self._read(
+                select(
+                    OrderLineORM.order_id,
+                    OrderLineORM.product_id,
+                    OrderLineORM.quantity,
+                    OrderLineORM.unit_price,
+                ),
+                _LINE_DTYPE,
+            )
+            # Статус строки берется из столбцов заказов бинарным поиском
+            # по отсортированным id: это дешевле JOIN при чтении из базы.
+            orders = self.orders()
+            positions = np.searchsorted(orders.ids, rows["order_id"])
+            positions = np.minimum(positions, max(len(orders.ids) - 1, 0))
+            statuses = np.full(len(rows), -1, dtype=np.int8)
+            if len(orders.ids):
+                found = orders.ids[positions] == rows["order_id"]
+                statuses[found] = orders.statuses[positions[found]]
+            self._lines = OrderLineColumns(
+                rows["order_id"],
+                rows["product_id"],
+                rows["quantity"],
+                rows["unit_price"],
+                statuses,
+            )
+        return self._lines
+
+    def inventory_value(self) -> Totals:
+        """
+        Возвращает общее количество единиц на складе и их стоимость.
+        """
+        products = self.products()
+        return Totals(
+            int(products.quantities.sum()),
+            float(np.dot(products.quantities, products.prices)),
+        )
+
+    def reorder_candidates(self, threshold: int) -> List[Tuple[int, int]]:
+        """
+        Возвращает продукты с остатком ниже threshold как пары
+        (id, остаток), по возрастанию остатка.
+        """
+        products = self.products()
+        low = np.flatnonzero(products.quantities < threshold)
+        low = low[np.lexsort((products.ids[low], products.quantities[low]))]
+        return list(zip(products.ids[low].tolist(), products.quantities[low].tolist()))
+
+    def revenue_by_product(self) -> Dict[int, float]:
+        """
+        Возвращает выручку неотмененных заказов по продуктам.
+        """
+        product_ids, revenue = self._product_revenue()
+        sold = np.flatnonzero(revenue)
+        return dict(zip(product_ids[sold].tolist(), revenue[sold].tolist()))
+
+    def top_products_by_revenue(self, n: int) -> List[Tuple[int, float]]:
+        """
+        Возвращает n продуктов с наибольшей выручкой неотмененных заказов
+        как пары (id, выручка). Полная сортировка не выполняется:
+        argpartition выбирает n лучших, сортируются только они.
+        """
+        if n <= 0:
+            return []
+        product_ids, revenue = self._product_revenue()
+        sold = np.flatnonzero(revenue)
+        if len(sold) > n:
+            sold = sold[np.argpartition(-revenue[sold], n - 1)[:n]]
+        sold = sold[np.lexsort((product_ids[sold], -revenue[sold]))]
+        return list(zip(product_ids[sold].tolist(), revenue[sold].tolist()))
+
+    def status_histogram(self) -> Dict[OrderStatus, Totals]:
+        """
+        Возвращает число заказов и их сумму по каждому статусу.
+        """
+        orders = self.orders()
+        known = orders.statuses >= 0
+        statuses = orders.statuses[known]
+        counts = np.bincount(statuses, minlength=len(_STATUSES))
+        amounts = np.bincount(
+            statuses, weights=orders.total_prices[known], minlength=len(_STATUSES)
+        )
+        return {
+            status: Totals(int(counts[code]), float(amounts[code]))
+            for code, status in enumerate(_STATUSES)
+        }
+
+    def order_size_histogram(
+        self, bins: Union[int, Sequence[float]] = 10, include_cancelled: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Распределение заказов по числу единиц товара: возвращает
+        (число заказов в интервале, границы интервалов), как np.histogram.
+        """
+        lines = self.order_lines()
+        keep = slice(None) if include_cancelled else lines.statuses != _CANCELLED_CODE
+        order_ids, inverse = np.unique(lines.order_ids[keep], return_inverse=True)
+        sizes = np.bincount(
+            inverse, weights=lines.quantities[keep], minlength=len(order_ids)
+        )
+        return np.histogram(sizes, bins=bins)
+
+    def _product_revenue(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Выручка по продуктам: (id продуктов, выручка) в порядке id.
+        Суммирование — bincount по индексам np.unique, без цикла Python.
+        """
+        lines = self.order_lines()
+        active = lines.statuses != _CANCELLED_CODE
+        product_ids, inverse = np.unique(lines.product_ids[active], return_inverse=True)
+        revenue = np.bincount(
+            inverse,
+            weights=lines.quantities[active] * lines.unit_prices[active],
+            minlength=len(product_ids),
+        )
+        return product_ids, revenue
+
+    def _read(self, statement: Select, dtype: np.dtype) -> np.ndarray:
+        """
+        Выполняет запрос курсором драйвера и собирает результат порциями
+        fetchmany в структурированный массив dtype.
+        """
+        connection = self.session.connection()
+        sql = str(
+            statement.compile(
+                dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+            )
+        )
+        cursor = connection.connection.driver_connection.cursor()
+        try:
+            cursor.execute(sql)
+            chunks = []
+            while rows := cursor.fetchmany(self.chunk_size):
+                chunks.append(np.array(rows, dtype=dtype))
+        finally:
+            cursor.close()
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
@@ -0,0 +1,361 @@
+from collections import Counter
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from my_hm.domain.exceptions import ConcurrencyConflictError
+from my_hm.domain.models import (
+    IdempotencyRecord,
+    Order,
+    Product,
+    Customer,
+    OrderStatus,
+    CatalogQuery,
+    ProductPage,
+)
+from my_hm.domain.repositories import (
+    AsyncProductRepository,
+    AsyncOrderRepository,
+    AsyncCustomerRepository,
+    AsyncIdempotencyRepository,
+)
+from .orm import ProductORM, OrderORM, OrderLineORM, CustomerORM, IdempotencyKeyORM
+from .sql_helpers import (
+    CASE_CHUNK_SIZE,
+    ORDER_LINES_WITH_PRODUCTS_LOADER,
+    catalog_page,
+    catalog_statement,
+    chunked,
+    customer_upsert,
+    idempotency_row,
+    latest_by_email,
+    order_to_domain,
+    to_idempotency_record,
+    to_customer,
+    to_product,
+)
+
+
+async def _add_and_assign_ids(session: AsyncSession, pairs: List[tuple]):
+    """
+    Асинхронный вариант repositories._add_and_assign_ids.
+    """
+    session.add_all([entity_orm for _, entity_orm in pairs])
+    await session.flush()
+    for entity, entity_orm in pairs:
+        entity.id = entity_orm.id
+
+
+async def _compare_and_swap(session: AsyncSession, model, entity, values: dict):
+    """
+    Асинхронный вариант repositories._compare_and_swap.
+    """
+    result = await session.execute(
+        update(model)
+        .where(model.id == entity.id, model.version == entity.version)
+        .values(**values, version=model.version + 1)
+    )
+    if result.rowcount:
+        entity.version += 1
+    elif await session.scalar(select(model.id).where(model.id == entity.id)):
+        raise ConcurrencyConflictError(model.__name__, entity.id, entity.version)
+
+
+class AsyncSqlAlchemyCustomerRepository(AsyncCustomerRepository):
+    """
+    Асинхронная реализация CustomerRepository поверх AsyncSession.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def add(self, customer: Customer) -> Customer:
+        customer_orm = CustomerORM(name=customer.name, email=customer.email)
+        await _add_and_assign_ids(self.session, [(customer, customer_orm)])
+        return customer
+
+    async def get(self, customer_id: int) -> Optional[Customer]:
+        customer_orm = await self.session.get(CustomerORM, customer_id)
+        if customer_orm:
+            return to_customer(customer_orm)
+        return None
+
+    async def get_many(self, customer_ids: Iterable[int]) -> Dict[int, Customer]:
+        customers = {}
+        for chunk in chunked(set(customer_ids)):
+            result = await self.session.scalars(
+                select(CustomerORM).where(CustomerORM.id.in_(chunk))
+            )
+            for c in result:
+                customers[c.id] = to_customer(c)
+        return customers
+
+    async def list(self) -> List[Customer]:
+        result = await self.session.scalars(select(CustomerORM))
+        return [to_customer(c) for c in result]
+
+    async def update(self, customer: Customer):
+        await _compare_and_swap(
+            self.session,
+            CustomerORM,
+            customer,
+            {"name": customer.name, "email": customer.email},
+        )
+
+    async def get_by_email(self, email: str) -> Optional[Customer]:
+        return (await self.get_many_by_email([email])).get(email)
+
+    async def get_many_by_email(self, emails: Iterable[str]) -> Dict[str, Customer]:
+        customers = {}
+        for chunk in chunked(set(emails)):
+            result = await self.session.scalars(
+                select(CustomerORM)
+                .where(CustomerORM.email.in_(chunk))
+                .execution_options(populate_existing=True)
+            )
+            for c in result:
+                customers[c.email] = to_customer(c)
+        return customers
+
+    async def upsert_many(self, customers: Iterable[Customer]) -> List[Customer]:
+        latest = latest_by_email(customers)
+        if not latest:
+            return []
+        await self.session.flush()
+        await self.session.execute(
+            customer_upsert(),
+            [{"name": c.name, "email": c.email} for c in latest.values()],
+        )
+        stored = await self.get_many_by_email(latest)
+        return [stored[email] for email in latest]
+
+
+class AsyncSqlAlchemyProductRepository(AsyncProductRepository):
+    """
+    Асинхронная реализация ProductRepository. Запросы те же, что
+    у SqlAlchemyProductRepository.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def add(self, product: Product) -> Product:
+        product_orm = ProductORM(
+            name=product.name, quantity=product.quantity, price=product.price
+        )
+        await _add_and_assign_ids(self.session, [(product, product_orm)])
+        return product
+
+    async def get(self, product_id: int) -> Optional[Product]:
+        product_orm = await self.session.get(ProductORM, product_id)
+        if product_orm:
+            return to_product(product_orm)
+        return None
+
+    async def get_many(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        products = {}
+        for chunk in chunked(set(product_ids)):
+            result = await self.session.scalars(
+                select(ProductORM).where(ProductORM.id.in_(chunk))
+            )
+            for p in result:
+                products[p.id] = to_product(p)
+        return products
+
+    async def list(self) -> List[Product]:
+        result = await self.session.scalars(select(ProductORM))
+        return [to_product(p) for p in result]
+
+    async def update(self, product: Product):
+        await _compare_and_swap(
+            self.session,
+            ProductORM,
+            product,
+            {
+                "name": product.name,
+                "quantity": product.quantity,
+                "price": product.price,
+            },
+        )
+
+    async def find(self, query: CatalogQuery) -> ProductPage:
+        result = await self.session.scalars(catalog_statement(query))
+        return catalog_page(result.all(), query)
+
+    async def reserve_stock(self, quantities: Dict[int, int]) -> List[int]:
+        reserved = {}
+        failed = []
+        for product_id, quantity in sorted(quantities.items()):
+            result = await self.session.execute(
+                update(ProductORM)
+                .where(ProductORM.id == product_id, ProductORM.quantity >= quantity)
+                .values(
+                    quantity=ProductORM.quantity - quantity,
+                    version=ProductORM.version + 1,
+                )
+            )
+            if result.rowcount:
+                reserved[product_id] = quantity
+            else:
+                failed.append(product_id)
+        if failed and reserved:
+            await self.release_stock(reserved)
+        return failed
+
+    async def release_stock(self, quantities: Dict[int, int]):
+        for chunk in chunked(sorted(quantities), CASE_CHUNK_SIZE):
+            increments = {product_id: quantities[product_id] for product_id in chunk}
+            await self.session.execute(
+                update(ProductORM)
+                .where(ProductORM.id.in_(chunk))
+                .values(
+                    quantity=ProductORM.quantity
+                    + case(increments, value=ProductORM.id, else_=0),
+                    version=ProductORM.version + 1,
+                )
+                .execution_options(synchronize_session="fetch")
+            )
+
+
+class AsyncSqlAlchemyOrderRepository(AsyncOrderRepository):
+    """
+    Асинхронная реализация OrderRepository.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def add(self, order: Order) -> Order:
+        return (await self.add_many([order]))[0]
+
+    async def add_many(self, orders: List[Order]) -> List[Order]:
+        orders_orm = []
+        for order in orders:
+            order_orm = OrderORM(
+                customer_id=order.customer_id,
+                status=order.status.value,
+                total_price=order.total_price,
+                created_at=order.created_at,
+            )
+            order_orm.lines = [
+                OrderLineORM(
+                    product_id=line.product_id,
+                    quantity=line.quantity,
+                    unit_price=line.unit_price,
+                )
+                for line in order.lines
+            ]
+            orders_orm.append(order_orm)
+        await _add_and_assign_ids(self.session, list(zip(orders, orders_orm)))
+        return orders
+
+    async def get(self, order_id: int) -> Optional[Order]:
+        result = await self.session.scalars(
+            select(OrderORM)
+            .options(ORDER_LINES_WITH_PRODUCTS_LOADER)
+            .where(OrderORM.id == order_id)
+            .execution_options(populate_existing=True)
+        )
+        order_orm = result.first()
+        if order_orm:
+            return order_to_domain(order_orm)
+        return None
+
+    async def list(self) -> List[Order]:
+        return [order async for order in self.iter_orders()]
+
+    async def iter_orders(
+        self,
+        batch_size: int = 1000,
+        status: Optional[OrderStatus] = None,
+        customer_id: Optional[int] = None,
+    ) -> AsyncIterator[Order]:
+        """
+        Потоково возвращает заказы порциями по batch_size, как
+        SqlAlchemyOrderRepository.iter_orders.
+        """
+        statement = select(OrderORM).options(ORDER_LINES_WITH_PRODUCTS_LOADER)
+        if status is not None:
+            statement = statement.where(OrderORM.status == status.value)
+        if customer_id is not None:
+            statement = statement.where(OrderORM.customer_id == customer_id)
+        statement = statement.order_by(OrderORM.id).execution_options(
+            yield_per=batch_size
+        )
+        result = await self.session.stream_scalars(statement)
+        async for order_orm in result:
+            yield order_to_domain(order_orm)
+
+    async def update(self, order: Order):
+        await _compare_and_swap(
+            self.session,
+            OrderORM,
+            order,
+            {"status": order.status.value, "total_price": order.total_price},
+        )
+
+    async def transition_many(
+        self, order_ids: Iterable[int], previous: OrderStatus, status: OrderStatus
+    ) -> List[int]:
+        updated = []
+        for chunk in chunked(order_ids):
+            result = await self.session.execute(
+                update(OrderORM)
+                .where(OrderORM.id.in_(chunk), OrderORM.status == previous.value)
+                .values(status=status.value, version=OrderORM.version + 1)
+                .returning(OrderORM.id)
+                .execution_options(synchronize_session=False)
+            )
+            updated.extend(result.scalars())
+        return updated
+
+    async def get_statuses(self, order_ids: Iterable[int]) -> Dict[int, OrderStatus]:
+        statuses = {}
+        for chunk in chunked(order_ids):
+            rows = await self.session.execute(
+                select(OrderORM.id, OrderORM.status).where(OrderORM.id.in_(chunk))
+            )
+            statuses.update((order_id, OrderStatus(value)) for order_id, value in rows)
+        return statuses
+
+    async def find_pending_before(
+        self, created_before: datetime, limit: int
+    ) -> List[int]:
+        result = await self.session.scalars(
+            select(OrderORM.id)
+            .where(
+                OrderORM.status == OrderStatus.PENDING.value,
+                OrderORM.created_at < created_before,
+            )
+            .order_by(OrderORM.created_at, OrderORM.id)
+            .limit(limit)
+        )
+        return list(result)
+
+    async def line_quantities(self, order_ids: Iterable[int]) -> Dict[int, int]:
+        quantities = Counter()
+        for chunk in chunked(order_ids):
+            rows = await self.session.execute(
+                select(OrderLineORM.product_id, func.sum(OrderLineORM.quantity))
+                .where(OrderLineORM.order_id.in_(chunk))
+                .group_by(OrderLineORM.product_id)
+            )
+            for product_id, quantity in rows:
+                quantities[product_id] += quantity
+        return dict(quantities)
+
+
+class AsyncSqlAlchemyIdempotencyRepository(AsyncIdempotencyRepository):
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get(self, key: str) -> Optional[IdempotencyRecord]:
+        row = await self.session.get(IdempotencyKeyORM, key)
+        return to_idempotency_record(row) if row else None
+
+    async def save(
+        self, key: str, command: str, fingerprint: str, order: Order
+    ) -> IdempotencyRecord:
+        row = idempotency_row(key, command, fingerprint, order)
+        self.session.add(row)
+        return to_idempotency_record(row)
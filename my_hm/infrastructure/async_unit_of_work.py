@@ -0,0 +1,99 @@
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from my_hm.domain.events import AsyncWarehouseListener, WarehouseListener
+from .aggregates import SqlAlchemyAggregates
+from .outbox import SqlAlchemyOutbox
+from .summaries import SqlAlchemyOrderSummaries
+from .async_repositories import (
+    AsyncSqlAlchemyProductRepository,
+    AsyncSqlAlchemyOrderRepository,
+    AsyncSqlAlchemyCustomerRepository,
+    AsyncSqlAlchemyIdempotencyRepository,
+)
+
+
+class RunSyncListener(AsyncWarehouseListener):
+    """
+    Подключает синхронный listener поверх AsyncSession.sync_session
+    к AsyncWarehouseService: каждый вызов выполняется через
+    AsyncSession.run_sync, то есть в той же транзакции, что и операция.
+    """
+
+    def __init__(self, session: AsyncSession, listener: WarehouseListener):
+        self.session = session
+        self.listener = listener
+
+    async def product_created(self, product):
+        await self._run(self.listener.product_created, product)
+
+    async def orders_created(self, orders):
+        await self._run(self.listener.orders_created, orders)
+
+    async def order_status_changed(self, order, previous):
+        await self._run(self.listener.order_status_changed, order, previous)
+
+    async def orders_transitioned(self, order_ids, previous, status):
+        await self._run(self.listener.orders_transitioned, order_ids, previous, status)
+
+    async def stock_changed(self, deltas):
+        await self._run(self.listener.stock_changed, deltas)
+
+    async def _run(self, method, *args):
+        await self.session.run_sync(lambda _session: method(*args))
+
+
+# Атрибуты — репозитории и проекции, которые единица работы открывает
+# вызывающему коду, и состояние ее транзакции.
+class AsyncSqlAlchemyUnitOfWork:  # pylint: disable=too-many-instance-attributes
+    """
+    Асинхронная единица работы: используется как async with, владеет
+    AsyncSession и асинхронными репозиториями. Без commit изменения
+    откатываются при выходе из блока.
+
+    listeners — те же итоги для отчетов (aggregates), outbox и сводки
+    заказов (summaries), что и в синхронной единице работы, для
+    подключения к AsyncWarehouseService.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker):
+        self.session_factory = session_factory
+        self.session: Optional[AsyncSession] = None
+        self.products: Optional[AsyncSqlAlchemyProductRepository] = None
+        self.orders: Optional[AsyncSqlAlchemyOrderRepository] = None
+        self.customers: Optional[AsyncSqlAlchemyCustomerRepository] = None
+        self.idempotency: Optional[AsyncSqlAlchemyIdempotencyRepository] = None
+        self.aggregates: Optional[SqlAlchemyAggregates] = None
+        self.outbox: Optional[SqlAlchemyOutbox] = None
+        self.summaries: Optional[SqlAlchemyOrderSummaries] = None
+        self.listeners: List[AsyncWarehouseListener] = []
+
+    async def __aenter__(self):
+        self.session = self.session_factory()
+        self.products = AsyncSqlAlchemyProductRepository(self.session)
+        self.orders = AsyncSqlAlchemyOrderRepository(self.session)
+        self.customers = AsyncSqlAlchemyCustomerRepository(self.session)
+        self.idempotency = AsyncSqlAlchemyIdempotencyRepository(self.session)
+        # Синхронные listeners работают с sync_session и вызываются
+        # только через run_sync (RunSyncListener).
+        self.aggregates = SqlAlchemyAggregates(self.session.sync_session)
+        self.outbox = SqlAlchemyOutbox(self.session.sync_session)
+        self.summaries = SqlAlchemyOrderSummaries(self.session.sync_session)
+        self.listeners = [
+            RunSyncListener(self.session, listener)
+            for listener in (self.aggregates, self.outbox, self.summaries)
+        ]
+        return self
+
+    async def __aexit__(self, exception_type, exception_value, traceback):
+        if self.session.in_transaction():
+            await self.rollback()
+        await self.session.close()
+
+    async def commit(self):
+        await self.session.commit()
+
+    async def rollback(self):
+        await self.session.rollback()
+
+    async def flush(self):
+        await self.session.flush()
@@ -0,0 +1,364 @@
+import csv
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from my_hm.domain.models import (
+    Customer,
+    Order,
+    OrderLine,
+    OrderStatus,
+    Product,
+    CatalogQuery,
+)
+from my_hm.domain.repositories import OrderRepository, ProductRepository
+from .orm import CustomerORM, OrderLineORM, OrderORM, ProductORM
+from .sql_helpers import chunked, customer_upsert
+
+PathLike = Union[str, Path]
+
+PRODUCT_FIELDS = ["id", "name", "quantity", "price"]
+ORDER_LINE_FIELDS = [
+    "order_id",
+    "customer_id",
+    "status",
+    "total_price",
+    "product_id",
+    "quantity",
+    "unit_price",
+]
+
+
+def read_rows(path: PathLike) -> Iterator[dict]:
+    """
+    Построчно читает CSV или JSONL (по расширению файла), не загружая файл
+    в память целиком.
+    """
+    path = Path(path)
+    with path.open(newline="", encoding="utf-8") as file:
+        if path.suffix == ".csv":
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def write_rows(path: PathLike, rows: Iterable[dict], fieldnames: List[str]) -> int:
+    """
+    Потоково записывает строки в CSV или JSONL (по расширению файла).
+    Возвращает число записанных строк.
+    """
+    path = Path(path)
+    count = 0
+    with path.open("w", newline="", encoding="utf-8") as file:
+        if path.suffix == ".csv":
+            writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction="ignore")
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                file.write(json.dumps(row, ensure_ascii=False))
+                file.write("\n")
+                count += 1
+    return count
+
+
+def product_from_row(row: dict) -> Product:
+    """
+    Строит продукт из строки файла. Проверки те же, что в Product.__post_init__.
+    """
+    return Product(
+        name=str(row["name"]), quantity=int(row["quantity"]), price=float(row["price"])
+    )
+
+
+def customer_from_row(row: dict) -> Customer:
+    return Customer(name=str(row["name"]), email=str(row["email"]))
+
+
+def order_from_row(row: dict) -> Order:
+    """
+    Строит заказ из JSONL-записи вида
+    {"customer_id": 1, "status": "pending", "lines": [{"product_id": 2, ...}]}.
+    Необязательное поле created_at — время создания в формате ISO 8601.
+    Продукт может встречаться в заказе только одной строкой.
+    """
+    lines = [
+        OrderLine(
+            int(line["product_id"]), int(line["quantity"]), float(line["unit_price"])
+        )
+        for line in row["lines"]
+    ]
+    if not lines or any(line.quantity <= 0 for line in lines):
+        raise ValueError("Количество должно быть положительным числом")
+    seen = set()
+    for line in lines:
+        if line.product_id in seen:
+            raise ValueError(f"Продукт {line.product_id} повторяется в заказе")
+        seen.add(line.product_id)
+    created_at = row.get("created_at")
+    return Order(
+        customer_id=int(row["customer_id"]),
+        status=OrderStatus(row.get("status", OrderStatus.PENDING.value)),
+        total_price=sum(line.total_price for line in lines),
+        lines=lines,
+        created_at=datetime.fromisoformat(created_at) if created_at else None,
+    )
+
+
+@dataclass
+class RowError:
+    line: int
+    message: str
+
+
+@dataclass
+class ImportReport:
+    """
+    ids — id вставленных продуктов и заказов в порядке строк файла;
+    для клиентов не заполняется (upsert не возвращает id неизмененных строк).
+    """
+
+    imported: int = 0
+    rejected: List[RowError] = field(default_factory=list)
+    ids: List[int] = field(default_factory=list)
+
+
+class BulkImporter:
+    """
+    Загружает большие файлы частями по chunk_size строк: каждая часть
+    проверяется доменными моделями и вставляется одним executemany.
+    Некорректные строки пропускаются и попадают в отчет
+    (или прерывают загрузку при skip_invalid=False).
+    Фиксация транзакции остается за вызывающим кодом.
+    """
+
+    def __init__(
+        self, session: Session, chunk_size: int = 10_000, skip_invalid: bool = True
+    ):
+        self.session = session
+        self.chunk_size = chunk_size
+        self.skip_invalid = skip_invalid
+
+    def import_products(self, rows: Iterable[dict]) -> ImportReport:
+        return self._import(
+            rows,
+            product_from_row,
+            lambda chunk: self.session.scalars(
+                insert(ProductORM).returning(
+                    ProductORM.id, sort_by_parameter_order=True
+                ),
+                [
+                    {"name": p.name, "quantity": p.quantity, "price": p.price}
+                    for p in chunk
+                ],
+            ).all(),
+        )
+
+    def import_customers(self, rows: Iterable[dict]) -> ImportReport:
+        """
+        Загружает клиентов; для уже существующих email обновляется имя,
+        поэтому повторная загрузка той же выгрузки не создает дубликатов.
+        """
+        return self._import(rows, customer_from_row, self._upsert_customers)
+
+    def import_orders(self, rows: Iterable[dict]) -> ImportReport:
+        """
+        Загружает заказы вместе со строками. Остатки на складе не меняются:
+        это перенос уже существующих заказов, а не новые продажи.
+        """
+        return self._import(
+            rows, order_from_row, self._insert_orders, self._order_references
+        )
+
+    def _existing_ids(self, column, ids: Iterable[int]) -> set:
+        found = set()
+        for chunk in chunked(set(ids)):
+            found.update(self.session.scalars(select(column).where(column.in_(chunk))))
+        return found
+
+    def _order_references(self, orders: List[Order]) -> Callable[[Order], Order]:
+        """
+        Одним запросом на часть загружает существующие id клиентов и
+        продуктов и возвращает проверку ссылок отдельного заказа.
+        """
+        customers = self._existing_ids(CustomerORM.id, (o.customer_id for o in orders))
+        products = self._existing_ids(
+            ProductORM.id, (line.product_id for o in orders for line in o.lines)
+        )
+
+        def check(order: Order) -> Order:
+            if order.customer_id not in customers:
+                raise ValueError(f"Клиент {order.customer_id} не найден")
+            for line in order.lines:
+                if line.product_id not in products:
+                    raise ValueError(f"Продукт {line.product_id} не найден")
+            return order
+
+        return check
+
+    def _upsert_customers(self, customers: List[Customer]) -> List[int]:
+        self.session.execute(
+            customer_upsert(), [{"name": c.name, "email": c.email} for c in customers]
+        )
+        return []
+
+    def _insert_orders(self, orders: List[Order]) -> List[int]:
+        order_ids = self.session.scalars(
+            insert(OrderORM).returning(OrderORM.id, sort_by_parameter_order=True),
+            [
+                {
+                    "customer_id": o.customer_id,
+                    "status": o.status.value,
+                    "total_price": o.total_price,
+                    "created_at": o.created_at,
+                }
+                for o in orders
+            ],
+        ).all()
+        self.session.execute(
+            insert(OrderLineORM.__table__),
+            [
+                {
+                    "order_id": order_id,
+                    "product_id": line.product_id,
+                    "quantity": line.quantity,
+                    "unit_price": line.unit_price,
+                }
+                for order_id, order in zip(order_ids, orders)
+                for line in order.lines
+            ],
+        )
+        for order_id, order in zip(order_ids, orders):
+            order.id = order_id
+        return order_ids
+
+    def _import(
+        self,
+        rows: Iterable[dict],
+        from_row: Callable[[dict], object],
+        insert_chunk: Callable[[list], List[int]],
+        checker: Optional[Callable[[list], Callable[[object], object]]] = None,
+    ) -> ImportReport:
+        """
+        checker получает разобранные строки части и возвращает проверку,
+        которой перед вставкой проходит каждая строка (например, ссылки
+        на существующие записи).
+        """
+        report = ImportReport()
+        numbered = enumerate(rows, start=1)
+        while True:
+            batch = list(islice(numbered, self.chunk_size))
+            if not batch:
+                return report
+            parsed = self._accepted(report, batch, from_row)
+            if checker is not None and parsed:
+                check = checker([item for _, item in parsed])
+                parsed = self._accepted(
+                    report, parsed, lambda item: check(item) or item
+                )
+            chunk = [item for _, item in parsed]
+            if chunk:
+                report.ids.extend(insert_chunk(chunk))
+                report.imported += len(chunk)
+
+    def _accepted(
+        self, report: ImportReport, batch: list, convert: Callable[[object], object]
+    ) -> list:
+        accepted = []
+        for line, row in batch:
+            try:
+                accepted.append((line, convert(row)))
+            except (KeyError, TypeError, ValueError) as error:
+                if not self.skip_invalid:
+                    raise ValueError(f"Строка {line}: {error}") from error
+                report.rejected.append(RowError(line, str(error)))
+        return accepted
+
+
+def order_records(orders: Iterable[Order]) -> Iterator[dict]:
+    """
+    Преобразует заказы в JSON-совместимые записи со вложенными строками.
+    """
+    for order in orders:
+        yield {
+            "id": order.id,
+            "customer_id": order.customer_id,
+            "status": order.status.value,
+            "total_price": order.total_price,
+            "created_at": order.created_at.isoformat() if order.created_at else None,
+            "lines": [
+                {
+                    "product_id": line.product_id,
+                    "quantity": line.quantity,
+                    "unit_price": line.unit_price,
+                }
+                for line in order.lines
+            ],
+        }
+
+
+def order_line_records(orders: Iterable[Order]) -> Iterator[dict]:
+    """
+    Разворачивает заказы в плоские записи, по одной на строку заказа (для CSV).
+    """
+    for order in orders:
+        for line in order.lines:
+            yield {
+                "order_id": order.id,
+                "customer_id": order.customer_id,
+                "status": order.status.value,
+                "total_price": order.total_price,
+                "product_id": line.product_id,
+                "quantity": line.quantity,
+                "unit_price": line.unit_price,
+            }
+
+
+def export_orders(
+    order_repo: OrderRepository,
+    path: PathLike,
+    batch_size: int = 1000,
+    status: Optional[OrderStatus] = None,
+) -> int:
+    """
+    Выгружает заказы в CSV (по строке на позицию) или JSONL (по строке на заказ).
+    Заказы читаются потоково через iter_orders.
+    """
+    orders = order_repo.iter_orders(batch_size=batch_size, status=status)
+    if Path(path).suffix == ".csv":
+        return write_rows(path, order_line_records(orders), ORDER_LINE_FIELDS)
+    return write_rows(path, order_records(orders), [])
+
+
+def iter_all_products(product_repo: ProductRepository, batch_size: int = 1000):
+    """
+    Потоково обходит весь каталог страницами по ключу.
+    """
+    query = CatalogQuery(in_stock=False, limit=batch_size)
+    while True:
+        page = product_repo.find(query)
+        yield from page.items
+        if page.next_cursor is None:
+            return
+        query.after = page.next_cursor
+
+
+def export_products(
+    product_repo: ProductRepository, path: PathLike, batch_size: int = 1000
+) -> int:
+    """
+    Выгружает весь каталог в CSV или JSONL.
+    """
+    records: Iterator[Dict] = (
+        {"id": p.id, "name": p.name, "quantity": p.quantity, "price": p.price}
+        for p in iter_all_products(product_repo, batch_size)
+    )
+    return write_rows(path, records, PRODUCT_FIELDS)
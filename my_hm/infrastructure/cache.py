@@ -0,0 +1,281 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+from my_hm.domain.models import (
+    Product,
+    Customer,
+    CatalogQuery,
+    IdempotencyRecord,
+    Order,
+    ProductPage,
+)
+from my_hm.domain.repositories import (
+    ProductRepository,
+    CustomerRepository,
+    IdempotencyRepository,
+)
+
+_MISSING = object()
+
+
+@dataclass
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+
+
+class IdentityMapCache:
+    """
+    Потокобезопасная карта идентичности с вытеснением по LRU и сроком жизни
+    записей (TTL). Разделяется между единицами работы.
+
+    generation увеличивается при каждой инвалидации. Читатель запоминает
+    его до чтения из базы и передает в put: если за это время другая
+    транзакция зафиксировала изменения и вытеснила записи, прочитанное
+    значение могло устареть и в кэш не попадает.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10_000,
+        ttl: Optional[float] = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._generation = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        """
+        Возвращает значение по ключу или default, если записи нет или она устарела.
+        """
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    @property
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def put(self, key: Hashable, value, generation: Optional[int] = None) -> bool:
+        """
+        Сохраняет значение, вытесняя самые давно использованные записи.
+        С generation значение сохраняется, только если после него не было
+        инвалидаций. Возвращает True, если значение сохранено.
+        """
+        expires_at = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def invalidate_many(self, keys: Iterable[Hashable]):
+        keys = list(keys)
+        if not keys:
+            return
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                self.hits, self.misses, self.evictions, len(self._entries)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class _CachedRepository:
+    """
+    Общая логика кэширующих репозиториев. Объекты, измененные в текущей
+    транзакции, читаются мимо кэша и вытесняются из него еще раз после
+    commit или rollback, чтобы в кэш не попали незафиксированные данные.
+
+    Поколение кэша запоминается в начале транзакции: если после этого
+    другая транзакция что-то вытеснила, снимок этой транзакции может быть
+    старше зафиксированных изменений, и прочитанное в кэш не записывается.
+    """
+
+    def __init__(self, inner, cache: IdentityMapCache):
+        self.inner = inner
+        self.cache = cache
+        self._dirty = set()
+        self._generation = cache.generation
+
+    def invalidate_pending(self):
+        """
+        Вызывается единицей работы после завершения транзакции.
+        """
+        self.cache.invalidate_many(self._dirty)
+        self._dirty.clear()
+        self._generation = self.cache.generation
+
+    def _mark_dirty(self, ids: Iterable[int]):
+        ids = set(ids)
+        self._dirty |= ids
+        self.cache.invalidate_many(ids)
+
+    def _get(self, entity_id: int):
+        if entity_id in self._dirty:
+            return self.inner.get(entity_id)
+        entity = self.cache.get(entity_id, _MISSING)
+        if entity is _MISSING:
+            entity = self.inner.get(entity_id)
+            if entity is None:
+                return None
+            self.cache.put(entity_id, copy.copy(entity), self._generation)
+            return entity
+        return copy.copy(entity)
+
+    def _get_many(self, entity_ids: Iterable[int]) -> Dict:
+        found = {}
+        missing = []
+        for entity_id in set(entity_ids):
+            entity = (
+                _MISSING
+                if entity_id in self._dirty
+                else self.cache.get(entity_id, _MISSING)
+            )
+            if entity is _MISSING:
+                missing.append(entity_id)
+            else:
+                found[entity_id] = copy.copy(entity)
+        if missing:
+            loaded = self.inner.get_many(missing)
+            for entity_id, entity in loaded.items():
+                if entity_id not in self._dirty:
+                    self.cache.put(entity_id, copy.copy(entity), self._generation)
+            found.update(loaded)
+        return found
+
+
+class CachedProductRepository(_CachedRepository, ProductRepository):
+    """
+    Репозиторий продуктов с чтением через кэш для get.
+
+    get_many всегда читает из базы: по его результату create_orders
+    проверяет остатки, а кэш процесса не видит изменений, которые
+    зафиксировали другие процессы. Прочитанные продукты обновляют кэш.
+    """
+
+    def add(self, product: Product) -> Product:
+        return self.inner.add(product)
+
+    def get(self, product_id: int) -> Optional[Product]:
+        return self._get(product_id)
+
+    def get_many(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        products = self.inner.get_many(list(set(product_ids)))
+        for product_id, product in products.items():
+            if product_id not in self._dirty:
+                self.cache.put(product_id, copy.copy(product), self._generation)
+        return products
+
+    def list(self) -> List[Product]:
+        return self.inner.list()
+
+    def update(self, product: Product):
+        self._mark_dirty([product.id])
+        self.inner.update(product)
+
+    def find(self, query: CatalogQuery) -> ProductPage:
+        return self.inner.find(query)
+
+    def reserve_stock(self, quantities: Dict[int, int]) -> List[int]:
+        self._mark_dirty(quantities)
+        return self.inner.reserve_stock(quantities)
+
+    def release_stock(self, quantities: Dict[int, int]):
+        self._mark_dirty(quantities)
+        self.inner.release_stock(quantities)
+
+
+class CachedCustomerRepository(_CachedRepository, CustomerRepository):
+    """
+    Репозиторий клиентов с чтением через кэш для get и get_many.
+    """
+
+    def add(self, customer: Customer) -> Customer:
+        return self.inner.add(customer)
+
+    def get(self, customer_id: int) -> Optional[Customer]:
+        return self._get(customer_id)
+
+    def get_many(self, customer_ids: Iterable[int]) -> Dict[int, Customer]:
+        return self._get_many(customer_ids)
+
+    def list(self) -> List[Customer]:
+        return self.inner.list()
+
+    def update(self, customer: Customer):
+        self._mark_dirty([customer.id])
+        self.inner.update(customer)
+
+    def get_by_email(self, email: str) -> Optional[Customer]:
+        return self.inner.get_by_email(email)
+
+    def get_many_by_email(self, emails: Iterable[str]) -> Dict[str, Customer]:
+        return self.inner.get_many_by_email(emails)
+
+    def upsert_many(self, customers: Iterable[Customer]) -> List[Customer]:
+        stored = self.inner.upsert_many(customers)
+        self._mark_dirty(c.id for c in stored)
+        return stored
+
+
+class CachedIdempotencyRepository(_CachedRepository, IdempotencyRepository):
+    """
+    Ограниченный LRU перед таблицей ответов: повтор команды после
+    таймаута клиента читает ответ из памяти процесса без запроса к базе.
+    Записи не меняются после сохранения, поэтому кэшу не нужен TTL;
+    ключ, сохраненный в текущей транзакции, попадает в кэш только после
+    ее фиксации.
+    """
+
+    def get(self, key: str) -> Optional[IdempotencyRecord]:
+        return self._get(key)
+
+    def save(
+        self, key: str, command: str, fingerprint: str, order: Order
+    ) -> IdempotencyRecord:
+        self._mark_dirty([key])
+        return self.inner.save(key, command, fingerprint, order)
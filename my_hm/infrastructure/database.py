@@ -1 +1,162 @@
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
 DATABASE_URL = "sqlite:///warehouse.db"
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///warehouse.db"
+
+
+@dataclass
+class EngineConfig:
+    """
+    Настройки движка SQLite. Значения по умолчанию рассчитаны на много
+    читателей и одного активного писателя: WAL позволяет читать, пока идет
+    запись, synchronous=NORMAL в режиме WAL безопасен и заметно быстрее FULL.
+    """
+
+    url: str = DATABASE_URL
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size: int = -65536  # отрицательное значение — размер в КиБ (64 МиБ)
+    mmap_size: int = 256 * 1024 * 1024
+    busy_timeout: float = 5.0  # секунды ожидания блокировки писателя
+    foreign_keys: bool = False
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    read_pool_size: int = 10
+    # BEGIN IMMEDIATE берет блокировку записи в начале транзакции. Нужен,
+    # когда несколько процессов читают и затем пишут: иначе устаревший
+    # снимок читателя дает SQLITE_BUSY без ожидания busy_timeout.
+    begin_immediate: bool = False
+    echo: bool = False
+
+
+def is_memory_database(url: str) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:" or "mode=memory" in url
+
+
+def _set_pragmas(engine: Engine, config: EngineConfig, query_only: bool = False):
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        if not query_only:
+            cursor.execute(f"PRAGMA journal_mode={config.journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={config.synchronous}")
+        cursor.execute(f"PRAGMA cache_size={int(config.cache_size)}")
+        cursor.execute(f"PRAGMA mmap_size={int(config.mmap_size)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config.busy_timeout * 1000)}")
+        cursor.execute(f"PRAGMA foreign_keys={'ON' if config.foreign_keys else 'OFF'}")
+        if query_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+def _use_begin_immediate(engine: Engine):
+    # Драйвер sqlite3 сам открывает транзакции, поэтому управление
+    # отключается и BEGIN выполняется явно (рецепт из документации SQLAlchemy).
+    @event.listens_for(engine, "connect")
+    def disable_driver_transactions(dbapi_connection, _connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin_immediate(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def create_engine_from_config(config: Optional[EngineConfig] = None) -> Engine:
+    """
+    Создает движок для записи с прагмами и настройками пула из config.
+    """
+    config = config or EngineConfig()
+    options = {"echo": config.echo, "connect_args": {"timeout": config.busy_timeout}}
+    if is_memory_database(config.url):
+        # In-memory база существует, пока открыто ее соединение: все потоки
+        # работают через одно соединение, а не через свое на каждый поток.
+        options["connect_args"]["check_same_thread"] = False
+        options["poolclass"] = StaticPool
+    else:
+        options.update(
+            pool_size=config.pool_size,
+            max_overflow=config.max_overflow,
+            pool_timeout=config.pool_timeout,
+        )
+    engine = create_engine(config.url, **options)
+    _set_pragmas(engine, config)
+    if config.begin_immediate:
+        _use_begin_immediate(engine)
+    return engine
+
+
+def create_read_engine(config: Optional[EngineConfig] = None) -> Engine:
+    """
+    Создает отдельный пул соединений только для чтения (mode=ro и
+    PRAGMA query_only). В режиме WAL такие соединения не блокируются писателем.
+    Для in-memory базы такой пул невозможен: новое соединение открыло бы
+    другую, пустую базу.
+    """
+    config = config or EngineConfig()
+    if is_memory_database(config.url):
+        raise ValueError("Для in-memory базы нет отдельного пула для чтения")
+    url = make_url(config.url)
+    read_url = url.set(
+        database=f"file:{url.database}", query={"mode": "ro", "uri": "true"}
+    )
+    engine = create_engine(
+        read_url,
+        echo=config.echo,
+        connect_args={"timeout": config.busy_timeout},
+        pool_size=config.read_pool_size,
+        max_overflow=config.max_overflow,
+        pool_timeout=config.pool_timeout,
+    )
+    _set_pragmas(engine, config, query_only=True)
+    return engine
+
+
+class Database:
+    """
+    Движки и фабрики сессий приложения: основной пул для записи и
+    отдельный пул для запросов только на чтение. У in-memory базы одно
+    соединение: read_engine совпадает с engine, а read_session_factory
+    равна None, и чтение идет через сессию записи.
+    """
+
+    def __init__(self, config: Optional[EngineConfig] = None):
+        self.config = config or EngineConfig()
+        self.engine = create_engine_from_config(self.config)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self._read_engine: Optional[Engine] = None
+        self._read_session_factory: Optional[sessionmaker] = None
+
+    @property
+    def read_engine(self) -> Engine:
+        # Создается лениво: файл базы должен существовать до открытия в mode=ro.
+        if self._is_memory:
+            return self.engine
+        if self._read_engine is None:
+            self._read_engine = create_read_engine(self.config)
+        return self._read_engine
+
+    @property
+    def read_session_factory(self) -> Optional[sessionmaker]:
+        # Отдельная сессия на общем соединении in-memory базы откатывала бы
+        # транзакцию записи вместе со своим снимком.
+        if self._is_memory:
+            return None
+        if self._read_session_factory is None:
+            self._read_session_factory = sessionmaker(bind=self.read_engine)
+        return self._read_session_factory
+
+    @property
+    def _is_memory(self) -> bool:
+        return is_memory_database(self.config.url)
+
+    def dispose(self):
+        self.engine.dispose()
+        if self._read_engine is not None:
+            self._read_engine.dispose()
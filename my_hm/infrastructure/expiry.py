@@ -0,0 +1,188 @@
+import asyncio
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Tuple
+from my_hm.domain.clock import utc_now
+from my_hm.domain.services import WarehouseService
+from my_hm.domain.unit_of_work import UnitOfWork
+
+
+def _default_service(uow) -> WarehouseService:
+    """
+    Сервис с listeners единицы работы, чтобы итоги, outbox и сводки
+    учитывали отмены так же, как при работе через Application.
+    """
+    return WarehouseService(
+        uow.products, uow.orders, uow.customers, listeners=uow.listeners
+    )
+
+
+@dataclass
+class ExpiryStats:
+    ticks: int = 0
+    batches: int = 0
+    expired: int = 0
+    errors: int = 0
+    last_error: Optional[str] = None
+    # True, если последний проход исчерпал бюджет порций и резервы остались.
+    backlog: bool = False
+
+
+@dataclass
+class ExpiryBudget:
+    """
+    Ограничения нагрузки планировщика: размер порции, число порций
+    за проход и паузы между порциями, проходами и после ошибок (секунды).
+    """
+
+    batch_size: int = 500
+    max_batches: int = 20
+    poll_interval: float = 30.0
+    batch_pause: float = 0.0
+    max_backoff: float = 300.0
+
+    def __post_init__(self):
+        if self.batch_size <= 0 or self.max_batches <= 0:
+            raise ValueError("Размер и число порций должны быть положительными")
+
+
+# Атрибуты — зависимости, статистика и состояние фонового потока или задачи.
+class ReservationExpiryScheduler:  # pylint: disable=too-many-instance-attributes
+    """
+    Фоновая отмена брошенных заказов: заказы, которые остаются в статусе
+    PENDING дольше ttl, отменяются, а их резерв возвращается на склад.
+
+    Каждый проход выбирает самые старые просроченные заказы по индексу
+    (status, created_at) и отменяет их порциями по batch_size, каждая порция —
+    в своей транзакции и с одним агрегированным UPDATE остатков
+    (WarehouseService.expire_pending_orders). Нагрузка ограничена
+    ExpiryBudget:
+    за проход выполняется не больше max_batches порций, между порциями —
+    пауза batch_pause, чтобы основные операции успевали взять блокировку
+    записи. Если бюджет исчерпан, следующий проход начинается после
+    batch_pause, иначе — через poll_interval. После ошибки пауза растет
+    экспоненциально до max_backoff.
+
+    Запускается потоком (start/stop) или задачей asyncio (start_async);
+    в asyncio проходы выполняются в пуле потоков, чтобы не блокировать цикл.
+    """
+
+    def __init__(
+        self,
+        uow_factory: Callable[[], UnitOfWork],
+        ttl: timedelta,
+        *,
+        budget: Optional[ExpiryBudget] = None,
+        service_factory: Callable[[UnitOfWork], WarehouseService] = _default_service,
+        clock: Callable[[], datetime] = utc_now,
+    ):
+        self.uow_factory = uow_factory
+        self.service_factory = service_factory
+        self.ttl = ttl
+        self.budget = budget or ExpiryBudget()
+        self.clock = clock
+        self.stats = ExpiryStats()
+        self._consecutive_errors = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._async_wakeup: Optional[
+            Tuple[asyncio.AbstractEventLoop, asyncio.Event]
+        ] = None
+
+    def run_once(self) -> int:
+        """
+        Выполняет один проход. Возвращает число отмененных заказов.
+        """
+        cutoff = self.clock() - self.ttl
+        expired = 0
+        self.stats.ticks += 1
+        self.stats.backlog = False
+        for batch in range(self.budget.max_batches):
+            if batch and self._stop.wait(self.budget.batch_pause):
+                break
+            with self.uow_factory() as uow:
+                report = self.service_factory(uow).expire_pending_orders(
+                    cutoff, self.budget.batch_size
+                )
+                uow.commit()
+            self.stats.batches += 1
+            expired += len(report.applied)
+            if len(report.outcomes) < self.budget.batch_size:
+                break
+        else:
+            self.stats.backlog = True
+        self.stats.expired += expired
+        return expired
+
+    def start(self) -> threading.Thread:
+        """
+        Запускает проходы в фоновом потоке.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="reservation-expiry", daemon=True
+        )
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Останавливает поток или задачу asyncio после текущей порции.
+        """
+        self._stop.set()
+        if self._async_wakeup is not None:
+            loop, wakeup = self._async_wakeup
+            loop.call_soon_threadsafe(wakeup.set)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    async def run_async(self):
+        """
+        Цикл проходов для asyncio; завершается после stop() или отмены задачи.
+        """
+        wakeup = asyncio.Event()
+        self._async_wakeup = (asyncio.get_running_loop(), wakeup)
+        try:
+            while not self._stop.is_set():
+                delay = await asyncio.to_thread(self.tick)
+                try:
+                    await asyncio.wait_for(wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._async_wakeup = None
+
+    def start_async(self) -> "asyncio.Task":
+        # Сброс до создания задачи: stop() сразу после запуска не теряется.
+        self._stop.clear()
+        return asyncio.get_running_loop().create_task(self.run_async())
+
+    def _run(self):
+        while True:
+            if self._stop.wait(self.tick()):
+                return
+
+    def tick(self) -> float:
+        """
+        Проход с перехватом ошибок, как в фоновом цикле. Возвращает паузу
+        до следующего прохода; нужен, если проходы запускает внешний
+        планировщик.
+        """
+        try:
+            self.run_once()
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            # Фоновый цикл не должен умирать из-за занятой базы или
+            # конфликта версий: ошибка учитывается, проход повторяется позже.
+            self._consecutive_errors += 1
+            self.stats.errors += 1
+            self.stats.last_error = repr(error)
+            return min(
+                self.budget.max_backoff,
+                self.budget.poll_interval * 2 ** (self._consecutive_errors - 1),
+            )
+        self._consecutive_errors = 0
+        return (
+            self.budget.batch_pause if self.stats.backlog else self.budget.poll_interval
+        )
@@ -0,0 +1,218 @@
+import functools
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Deque, Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+UNSCOPED = "unscoped"
+
+_current_operation: ContextVar[Optional[str]] = ContextVar(
+    "sql_operation", default=None
+)
+
+
+@dataclass
+class OperationMetrics:
+    calls: int = 0
+    wall_time: float = 0.0
+    statements: int = 0
+    sql_time: float = 0.0
+    max_statement_time: float = 0.0
+
+    @property
+    def statements_per_call(self) -> float:
+        return self.statements / self.calls if self.calls else float(self.statements)
+
+
+@dataclass
+class SlowQuery:
+    operation: str
+    statement: str
+    duration: float
+
+
+class SqlInstrumentation:
+    """
+    Учет SQL-запросов по операциям сервиса. Подключается к движку явно
+    (install), операция задается контекстом operation() или оберткой
+    instrument_service. Каждый запрос помечается комментарием
+    /* op=... */, считается и замеряется; запросы дольше
+    slow_query_threshold секунд сохраняются в ограниченный буфер образцов.
+    """
+
+    def __init__(
+        self,
+        slow_query_threshold: float = 0.1,
+        slow_query_samples: int = 100,
+        tag_statements: bool = True,
+    ):
+        self.slow_query_threshold = slow_query_threshold
+        self.tag_statements = tag_statements
+        self.slow_queries: Deque[SlowQuery] = deque(maxlen=slow_query_samples)
+        self._metrics: Dict[str, OperationMetrics] = {}
+        self._lock = threading.Lock()
+
+    def install(self, engine: Engine) -> "SqlInstrumentation":
+        event.listen(engine, "before_cursor_execute", self._before_execute, retval=True)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        return self
+
+    def uninstall(self, engine: Engine):
+        event.remove(engine, "before_cursor_execute", self._before_execute)
+        event.remove(engine, "after_cursor_execute", self._after_execute)
+
+    @contextmanager
+    def operation(self, name: str):
+        """
+        Относит все запросы внутри блока к операции name. Вложенные операции
+        учитываются в самой внешней, чтобы один вызов сервиса не считался дважды.
+        """
+        if _current_operation.get() is not None:
+            yield
+            return
+        token = _current_operation.set(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            _current_operation.reset(token)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                metrics = self._metrics.setdefault(name, OperationMetrics())
+                metrics.calls += 1
+                metrics.wall_time += elapsed
+
+    def instrument_service(self, service):
+        """
+        Оборачивает публичные методы объекта сервиса, задавая операцию
+        "ИмяКласса.метод". Возвращает тот же объект.
+        """
+        prefix = type(service).__name__
+        for name in dir(service):
+            method = getattr(service, name)
+            if name.startswith("_") or not callable(method):
+                continue
+            setattr(service, name, self._wrap(f"{prefix}.{name}", method))
+        return service
+
+    def snapshot(self) -> Dict[str, OperationMetrics]:
+        """
+        Возвращает копию текущих метрик по операциям.
+        """
+        with self._lock:
+            return {name: replace(m) for name, m in self._metrics.items()}
+
+    def slow_query_samples(self) -> List[SlowQuery]:
+        with self._lock:
+            return list(self.slow_queries)
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+            self.slow_queries.clear()
+
+    def to_prometheus(self) -> str:
+        """
+        Форматирует метрики в текстовом формате Prometheus.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for metric, help_text, kind, attribute in _PROMETHEUS_METRICS:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, metrics in sorted(snapshot.items()):
+                value = getattr(metrics, attribute)
+                lines.append(f'{metric}{{operation="{_escape_label(name)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """
+        Атомарно записывает метрики в файл (для textfile-коллектора node_exporter).
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def _wrap(self, name: str, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with self.operation(name):
+                return method(*args, **kwargs)
+
+        return wrapper
+
+    def _before_execute(
+        self, _conn, _cursor, statement, parameters, context, _executemany
+    ):
+        # Время начала хранится в контексте выполнения, а не в стеке на
+        # соединении: запрос, завершившийся ошибкой, не вызывает
+        # after_cursor_execute, и запись в стеке осталась бы навсегда.
+        if context is not None:
+            context.query_start_time = time.perf_counter()
+        operation = _current_operation.get()
+        if self.tag_statements and operation is not None:
+            statement = f"{statement} /* op={_sanitize_comment(operation)} */"
+        return statement, parameters
+
+    def _after_execute(
+        self, _conn, _cursor, statement, _parameters, context, _executemany
+    ):
+        started = getattr(context, "query_start_time", None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        operation = _current_operation.get() or UNSCOPED
+        with self._lock:
+            metrics = self._metrics.setdefault(operation, OperationMetrics())
+            metrics.statements += 1
+            metrics.sql_time += duration
+            metrics.max_statement_time = max(metrics.max_statement_time, duration)
+            if duration >= self.slow_query_threshold:
+                self.slow_queries.append(SlowQuery(operation, statement, duration))
+
+
+_PROMETHEUS_METRICS = [
+    ("warehouse_operation_calls_total", "Service operation calls.", "counter", "calls"),
+    (
+        "warehouse_operation_seconds_total",
+        "Wall time spent in service operations.",
+        "counter",
+        "wall_time",
+    ),
+    (
+        "warehouse_sql_statements_total",
+        "SQL statements executed per operation.",
+        "counter",
+        "statements",
+    ),
+    (
+        "warehouse_sql_seconds_total",
+        "Time spent executing SQL per operation.",
+        "counter",
+        "sql_time",
+    ),
+    (
+        "warehouse_sql_statement_max_seconds",
+        "Slowest single SQL statement per operation.",
+        "gauge",
+        "max_statement_time",
+    ),
+]
+
+
+def _sanitize_comment(value: str) -> str:
+    return re.sub(r"[^\w.\-]", "_", value)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,620 @@
+import copy
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from my_hm.domain.events import WarehouseListener
+from my_hm.domain.exceptions import ConcurrencyConflictError
+from my_hm.domain.models import (
+    IdempotencyRecord,
+    LazyOrder,
+    Order,
+    Product,
+    Customer,
+    OrderStatus,
+    CatalogQuery,
+    ProductPage,
+    ProductSort,
+)
+from my_hm.domain.repositories import (
+    ProductRepository,
+    OrderRepository,
+    CustomerRepository,
+    IdempotencyRepository,
+)
+from my_hm.domain.clock import utc_now
+from my_hm.domain.unit_of_work import UnitOfWork
+
+_CUSTOMERS = "customers"
+_PRODUCTS = "products"
+_ORDERS = "orders"
+_IDEMPOTENCY = "idempotency_keys"
+
+
+def _sort_key(product: Product, sort: ProductSort):
+    if sort == ProductSort.NAME:
+        return product.name
+    if sort == ProductSort.PRICE:
+        return product.price
+    return product.id
+
+
+@dataclass
+class MemorySnapshot:
+    """
+    Полная копия содержимого MemoryStore. Сериализуется pickle, поэтому
+    подходит для сохранения на диск и передачи между узлами.
+    """
+
+    customers: Dict[int, Customer] = field(default_factory=dict)
+    products: Dict[int, Product] = field(default_factory=dict)
+    orders: Dict[int, Order] = field(default_factory=dict)
+    next_ids: Dict[str, int] = field(default_factory=dict)
+    idempotency_keys: Dict[str, IdempotencyRecord] = field(default_factory=dict)
+
+
+# Вторичные индексы — отдельные атрибуты, репозитории читают их напрямую.
+class MemoryStore:  # pylint: disable=too-many-instance-attributes
+    """
+    Хранилище в памяти для репозиториев InMemory*. Сущности хранятся
+    в словарях по id; вторичные индексы: клиенты по email, заказы по клиенту
+    и по статусу, заказы PENDING по времени создания и продукты в наличии —
+    отсортированные списки (ключ сортировки, id).
+
+    Изменения внутри транзакции пишутся в журнал отмены, поэтому rollback
+    и откат SAVEPOINT стоят пропорционально числу изменений, а не размеру
+    хранилища.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.tables: Dict[str, Dict[int, Any]] = {
+            _CUSTOMERS: {},
+            _PRODUCTS: {},
+            _ORDERS: {},
+            _IDEMPOTENCY: {},
+        }
+        self.next_ids = {_CUSTOMERS: 1, _PRODUCTS: 1, _ORDERS: 1}
+        self.customers_by_email: Dict[str, int] = {}
+        self.orders_by_customer: Dict[int, Set[int]] = defaultdict(set)
+        self.orders_by_status: Dict[OrderStatus, Set[int]] = defaultdict(set)
+        self.pending_by_created: List[Tuple[datetime, int]] = []
+        self.in_stock: Dict[ProductSort, List[Tuple[Any, int]]] = {
+            sort: [] for sort in ProductSort
+        }
+        self._journal: Optional[List[Tuple[str, int, Any]]] = None
+        self._saved_next_ids: Dict[str, int] = {}
+
+    def new_id(self, table: str) -> int:
+        entity_id = self.next_ids[table]
+        self.next_ids[table] += 1
+        return entity_id
+
+    def get(self, table: str, entity_id: int):
+        return self.tables[table].get(entity_id)
+
+    def put(self, table: str, entity_id: int, entity):
+        """
+        Записывает сущность (None — удаляет), обновляя индексы и журнал.
+        """
+        previous = self.tables[table].get(entity_id)
+        if self._journal is not None:
+            self._journal.append((table, entity_id, previous))
+        self._replace(table, entity_id, previous, entity)
+
+    def begin(self):
+        self._journal = []
+        self._saved_next_ids = dict(self.next_ids)
+
+    def commit(self):
+        self._journal = []
+        self._saved_next_ids = dict(self.next_ids)
+
+    def rollback(self):
+        self.rollback_to(0)
+        self.next_ids = dict(self._saved_next_ids)
+
+    def end(self):
+        self._journal = None
+
+    def mark(self) -> int:
+        return len(self._journal) if self._journal is not None else 0
+
+    def rollback_to(self, mark: int):
+        """
+        Отменяет изменения журнала, сделанные после mark.
+        """
+        journal = self._journal or []
+        while len(journal) > mark:
+            table, entity_id, previous = journal.pop()
+            current = self.tables[table].get(entity_id)
+            self._replace(table, entity_id, current, previous)
+
+    def snapshot(self) -> MemorySnapshot:
+        with self.lock:
+            return MemorySnapshot(
+                customers=copy.deepcopy(self.tables[_CUSTOMERS]),
+                products=copy.deepcopy(self.tables[_PRODUCTS]),
+                orders=copy.deepcopy(self.tables[_ORDERS]),
+                next_ids=dict(self.next_ids),
+                idempotency_keys=copy.deepcopy(self.tables[_IDEMPOTENCY]),
+            )
+
+    def restore(self, snapshot: MemorySnapshot):
+        """
+        Заменяет содержимое хранилища копией snapshot и перестраивает индексы.
+        """
+        with self.lock:
+            self.tables = {
+                _CUSTOMERS: copy.deepcopy(snapshot.customers),
+                _PRODUCTS: copy.deepcopy(snapshot.products),
+                _ORDERS: copy.deepcopy(snapshot.orders),
+                _IDEMPOTENCY: copy.deepcopy(snapshot.idempotency_keys),
+            }
+            self.next_ids = dict(snapshot.next_ids)
+            self.customers_by_email = {
+                c.email: c.id for c in self.tables[_CUSTOMERS].values()
+            }
+            self.orders_by_customer.clear()
+            self.orders_by_status.clear()
+            for index in self.in_stock.values():
+                index.clear()
+            for order in self.tables[_ORDERS].values():
+                self.orders_by_customer[order.customer_id].add(order.id)
+                self.orders_by_status[order.status].add(order.id)
+            self.pending_by_created = sorted(
+                (order.created_at, order.id)
+                for order in self.tables[_ORDERS].values()
+                if _is_pending_with_time(order)
+            )
+            for product in self.tables[_PRODUCTS].values():
+                if product.quantity > 0:
+                    for sort, index in self.in_stock.items():
+                        index.append((_sort_key(product, sort), product.id))
+            for index in self.in_stock.values():
+                index.sort()
+
+    def _replace(self, table: str, entity_id: int, previous, entity):
+        if entity is None:
+            self.tables[table].pop(entity_id, None)
+        else:
+            self.tables[table][entity_id] = entity
+        reindex = self._REINDEX.get(table)
+        if reindex is not None:
+            reindex(self, entity_id, previous, entity)
+
+    def _reindex_order(self, order_id: int, previous, order):
+        if previous is not None:
+            self.orders_by_customer[previous.customer_id].discard(order_id)
+            self.orders_by_status[previous.status].discard(order_id)
+            if _is_pending_with_time(previous):
+                key = (previous.created_at, order_id)
+                del self.pending_by_created[bisect_left(self.pending_by_created, key)]
+        if order is not None:
+            self._index_order(order)
+
+    def _reindex_customer(self, customer_id: int, previous, customer):
+        if (
+            previous is not None
+            and self.customers_by_email.get(previous.email) == customer_id
+        ):
+            del self.customers_by_email[previous.email]
+        if customer is not None:
+            self.customers_by_email[customer.email] = customer_id
+
+    def _reindex_product(self, product_id: int, previous, product):
+        if previous is not None and previous.quantity > 0:
+            for sort, index in self.in_stock.items():
+                del index[bisect_left(index, (_sort_key(previous, sort), product_id))]
+        if product is not None and product.quantity > 0:
+            for sort, index in self.in_stock.items():
+                insort(index, (_sort_key(product, sort), product_id))
+
+    # Обновление вторичных индексов по таблице; у ключей идемпотентности
+    # индексов нет.
+    _REINDEX = {
+        _ORDERS: _reindex_order,
+        _CUSTOMERS: _reindex_customer,
+        _PRODUCTS: _reindex_product,
+    }
+
+    def _index_order(self, order: Order):
+        self.orders_by_customer[order.customer_id].add(order.id)
+        self.orders_by_status[order.status].add(order.id)
+        if _is_pending_with_time(order):
+            insort(self.pending_by_created, (order.created_at, order.id))
+
+
+def _is_pending_with_time(order: Order) -> bool:
+    return order.status == OrderStatus.PENDING and order.created_at is not None
+
+
+def _check_version(entity_name: str, stored, entity):
+    if stored.version != entity.version:
+        raise ConcurrencyConflictError(entity_name, entity.id, entity.version)
+
+
+class InMemoryCustomerRepository(CustomerRepository):
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    def add(self, customer: Customer) -> Customer:
+        customer.id = self.store.new_id(_CUSTOMERS)
+        self.store.put(_CUSTOMERS, customer.id, replace(customer))
+        return customer
+
+    def get(self, customer_id: int) -> Optional[Customer]:
+        customer = self.store.get(_CUSTOMERS, customer_id)
+        return replace(customer) if customer else None
+
+    def get_many(self, customer_ids: Iterable[int]) -> Dict[int, Customer]:
+        return {
+            customer_id: replace(customer)
+            for customer_id in set(customer_ids)
+            if (customer := self.store.get(_CUSTOMERS, customer_id))
+        }
+
+    def list(self) -> List[Customer]:
+        return [replace(c) for c in self.store.tables[_CUSTOMERS].values()]
+
+    def update(self, customer: Customer):
+        stored = self.store.get(_CUSTOMERS, customer.id)
+        if stored is None:
+            return
+        _check_version("Customer", stored, customer)
+        customer.version += 1
+        self.store.put(_CUSTOMERS, customer.id, replace(customer))
+
+    def get_by_email(self, email: str) -> Optional[Customer]:
+        customer_id = self.store.customers_by_email.get(email)
+        return self.get(customer_id) if customer_id is not None else None
+
+    def get_many_by_email(self, emails: Iterable[str]) -> Dict[str, Customer]:
+        return {
+            email: customer
+            for email in set(emails)
+            if (customer := self.get_by_email(email))
+        }
+
+    def upsert_many(self, customers: Iterable[Customer]) -> List[Customer]:
+        stored = []
+        for email, customer in {c.email: c for c in customers}.items():
+            existing = self.store.get(
+                _CUSTOMERS, self.store.customers_by_email.get(email)
+            )
+            if existing is None:
+                existing = Customer(
+                    id=self.store.new_id(_CUSTOMERS), name=customer.name, email=email
+                )
+                self.store.put(_CUSTOMERS, existing.id, existing)
+            elif existing.name != customer.name:
+                existing = replace(
+                    existing, name=customer.name, version=existing.version + 1
+                )
+                self.store.put(_CUSTOMERS, existing.id, existing)
+            stored.append(replace(existing))
+        return stored
+
+
+class InMemoryProductRepository(ProductRepository):
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    def add(self, product: Product) -> Product:
+        product.id = self.store.new_id(_PRODUCTS)
+        self.store.put(_PRODUCTS, product.id, replace(product))
+        return product
+
+    def get(self, product_id: int) -> Optional[Product]:
+        product = self.store.get(_PRODUCTS, product_id)
+        return replace(product) if product else None
+
+    def get_many(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        return {
+            product_id: replace(product)
+            for product_id in set(product_ids)
+            if (product := self.store.get(_PRODUCTS, product_id))
+        }
+
+    def list(self) -> List[Product]:
+        return [replace(p) for p in self.store.tables[_PRODUCTS].values()]
+
+    def update(self, product: Product):
+        stored = self.store.get(_PRODUCTS, product.id)
+        if stored is None:
+            return
+        _check_version("Product", stored, product)
+        product.version += 1
+        self.store.put(_PRODUCTS, product.id, replace(product))
+
+    def find(self, query: CatalogQuery) -> ProductPage:
+        """
+        Выборка каталога по отсортированному индексу: позиция курсора
+        и границы префикса или диапазона цен находятся бинарным поиском,
+        дальше читается не больше limit + 1 подходящих продуктов.
+        """
+        products = self.store.tables[_PRODUCTS]
+        if query.in_stock:
+            index = self.store.in_stock[query.sort]
+        else:
+            index = sorted((_sort_key(p, query.sort), p.id) for p in products.values())
+        low, high = _index_bounds(index, query)
+        if query.after is not None:
+            cursor = tuple(query.after)
+            if query.descending:
+                high = min(high, bisect_left(index, cursor))
+            else:
+                low = max(low, bisect_right(index, cursor))
+        positions = (
+            range(high - 1, low - 1, -1) if query.descending else range(low, high)
+        )
+
+        items = []
+        for position in positions:
+            product = products[index[position][1]]
+            if not _matches(product, query):
+                continue
+            items.append(product)
+            if query.limit is not None and len(items) > query.limit:
+                break
+        next_cursor = None
+        if query.limit is not None and len(items) > query.limit:
+            items = items[: query.limit]
+            next_cursor = (_sort_key(items[-1], query.sort), items[-1].id)
+        return ProductPage(items=[replace(p) for p in items], next_cursor=next_cursor)
+
+    def reserve_stock(self, quantities: Dict[int, int]) -> List[int]:
+        """
+        Списывает остатки, если их хватает по всем продуктам; иначе ничего
+        не меняет и возвращает id недоступных продуктов.
+        """
+        failed = [
+            product_id
+            for product_id, quantity in sorted(quantities.items())
+            if (product := self.store.get(_PRODUCTS, product_id)) is None
+            or product.quantity < quantity
+        ]
+        if not failed:
+            self._add_stock({pid: -quantity for pid, quantity in quantities.items()})
+        return failed
+
+    def release_stock(self, quantities: Dict[int, int]):
+        self._add_stock(quantities)
+
+    def _add_stock(self, deltas: Dict[int, int]):
+        for product_id, delta in deltas.items():
+            product = self.store.get(_PRODUCTS, product_id)
+            if product is not None:
+                self.store.put(
+                    _PRODUCTS,
+                    product_id,
+                    replace(
+                        product,
+                        quantity=product.quantity + delta,
+                        version=product.version + 1,
+                    ),
+                )
+
+
+def _index_bounds(index: List[Tuple[Any, int]], query: CatalogQuery) -> Tuple[int, int]:
+    """
+    Сужает диапазон позиций индекса по фильтру на поле сортировки.
+    """
+    low, high = 0, len(index)
+    if query.sort == ProductSort.NAME and query.name_prefix:
+        low = bisect_left(index, (query.name_prefix,))
+        upper = query.name_prefix[:-1] + chr(ord(query.name_prefix[-1]) + 1)
+        high = bisect_left(index, (upper,))
+    elif query.sort == ProductSort.PRICE:
+        if query.min_price is not None:
+            low = bisect_left(index, (query.min_price,))
+        if query.max_price is not None:
+            high = bisect_right(index, (query.max_price, float("inf")))
+    return low, high
+
+
+def _matches(product: Product, query: CatalogQuery) -> bool:
+    if query.in_stock and product.quantity <= 0:
+        return False
+    if query.name_prefix and not product.name.startswith(query.name_prefix):
+        return False
+    if query.min_price is not None and product.price < query.min_price:
+        return False
+    if query.max_price is not None and product.price > query.max_price:
+        return False
+    return True
+
+
+class InMemoryOrderRepository(OrderRepository):
+    """
+    Заказы хранятся без списка продуктов; при чтении он собирается
+    из текущих продуктов хранилища, как при загрузке из базы.
+    """
+
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    def add(self, order: Order) -> Order:
+        return self.add_many([order])[0]
+
+    def add_many(self, orders: List[Order]) -> List[Order]:
+        for order in orders:
+            order.id = self.store.new_id(_ORDERS)
+            self._put(order)
+        return orders
+
+    def get(self, order_id: int) -> Optional[Order]:
+        order = self.store.get(_ORDERS, order_id)
+        return self._to_domain(order) if order else None
+
+    def list(self) -> List[Order]:
+        return list(self.iter_orders())
+
+    def iter_orders(
+        self,
+        batch_size: int = 1000,
+        status: Optional[OrderStatus] = None,
+        customer_id: Optional[int] = None,
+    ) -> Iterator[Order]:
+        """
+        Возвращает заказы по возрастанию id; фильтры по статусу и клиенту
+        используют индексы, а не перебор всех заказов.
+        """
+        order_ids = None
+        if status is not None:
+            order_ids = set(self.store.orders_by_status.get(status, ()))
+        if customer_id is not None:
+            by_customer = self.store.orders_by_customer.get(customer_id, set())
+            order_ids = by_customer if order_ids is None else order_ids & by_customer
+        if order_ids is None:
+            order_ids = self.store.tables[_ORDERS].keys()
+        for order_id in sorted(order_ids):
+            yield self._to_domain(self.store.get(_ORDERS, order_id))
+
+    def update(self, order: Order):
+        stored = self.store.get(_ORDERS, order.id)
+        if stored is None:
+            return
+        _check_version("Order", stored, order)
+        order.version += 1
+        self._put(order)
+
+    def transition_many(
+        self, order_ids: Iterable[int], previous: OrderStatus, status: OrderStatus
+    ) -> List[int]:
+        candidates = self.store.orders_by_status.get(previous, set())
+        updated = [order_id for order_id in order_ids if order_id in candidates]
+        for order_id in updated:
+            order = self.store.get(_ORDERS, order_id)
+            self.store.put(
+                _ORDERS,
+                order_id,
+                replace(order, status=status, version=order.version + 1),
+            )
+        return updated
+
+    def get_statuses(self, order_ids: Iterable[int]) -> Dict[int, OrderStatus]:
+        return {
+            order_id: order.status
+            for order_id in order_ids
+            if (order := self.store.get(_ORDERS, order_id))
+        }
+
+    def find_pending_before(self, created_before: datetime, limit: int) -> List[int]:
+        index = self.store.pending_by_created
+        end = min(bisect_left(index, (created_before,)), max(limit, 0))
+        return [order_id for _, order_id in index[:end]]
+
+    def line_quantities(self, order_ids: Iterable[int]) -> Dict[int, int]:
+        quantities = Counter()
+        for order_id in set(order_ids):
+            order = self.store.get(_ORDERS, order_id)
+            for line in order.lines if order else ():
+                quantities[line.product_id] += line.quantity
+        return dict(quantities)
+
+    def _put(self, order: Order):
+        self.store.put(
+            _ORDERS, order.id, replace(order, products=[], lines=list(order.lines))
+        )
+
+    def _to_domain(self, order: Order) -> LazyOrder:
+        lines = list(order.lines)
+        return LazyOrder(
+            id=order.id,
+            customer_id=order.customer_id,
+            status=order.status,
+            total_price=order.total_price,
+            lines=lines,
+            version=order.version,
+            created_at=order.created_at,
+            load_products=lambda: self._line_products(lines),
+        )
+
+    def _line_products(self, lines) -> List[Product]:
+        products = []
+        for line in lines:
+            product = self.store.get(_PRODUCTS, line.product_id)
+            if product is not None:
+                products.append(replace(product))
+        return products
+
+
+class InMemoryIdempotencyRepository(IdempotencyRepository):
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    def get(self, key: str) -> Optional[IdempotencyRecord]:
+        return self.store.get(_IDEMPOTENCY, key)
+
+    def save(
+        self, key: str, command: str, fingerprint: str, order: Order
+    ) -> IdempotencyRecord:
+        if self.store.get(_IDEMPOTENCY, key) is not None:
+            raise ValueError(f"Ключ идемпотентности {key} уже сохранен")
+        record = replace(
+            IdempotencyRecord.for_order(key, command, fingerprint, order),
+            created_at=utc_now(),
+        )
+        self.store.put(_IDEMPOTENCY, key, record)
+        return record
+
+
+class InMemoryUnitOfWork(UnitOfWork):
+    """
+    Единица работы над MemoryStore. Транзакции выполняются по одной:
+    блокировка хранилища берется на время блока with. Незафиксированные
+    изменения откатываются по журналу при rollback или выходе из блока.
+    """
+
+    def __init__(self, store: MemoryStore):
+        self.store = store
+        self.products: Optional[InMemoryProductRepository] = None
+        self.orders: Optional[InMemoryOrderRepository] = None
+        self.customers: Optional[InMemoryCustomerRepository] = None
+        self.idempotency: Optional[InMemoryIdempotencyRepository] = None
+        # Итогов, outbox и сводок у MemoryStore нет.
+        self.listeners: List[WarehouseListener] = []
+
+    def __enter__(self):
+        self.store.lock.acquire()
+        self.store.begin()
+        self.products = InMemoryProductRepository(self.store)
+        self.orders = InMemoryOrderRepository(self.store)
+        self.customers = InMemoryCustomerRepository(self.store)
+        self.idempotency = InMemoryIdempotencyRepository(self.store)
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        try:
+            self.store.rollback()
+            self.store.end()
+        finally:
+            self.store.lock.release()
+
+    def commit(self):
+        self.store.commit()
+
+    def rollback(self):
+        self.store.rollback()
+
+    def flush(self):
+        """
+        Ничего не делает: id присваиваются сразу при add. Есть для
+        совместимости с SqlAlchemyUnitOfWork.
+        """
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Откатывает изменения блока, если внутри возникло исключение.
+        """
+        mark = self.store.mark()
+        try:
+            yield self
+        except BaseException:
+            self.store.rollback_to(mark)
+            raise
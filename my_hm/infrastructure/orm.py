@@ -1,23 +1,53 @@
-from sqlalchemy import Column, Integer, String, Float, Table, ForeignKey
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+    Text,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
 Base = declarative_base()
 
+# Столбцы NOT NULL, которых не было в ранних версиях схемы, имеют
+# server_default: им заполняются существующие строки (bootstrap.ensure_schema).
+
 
 class CustomerORM(Base):
     __tablename__ = "customers"
     id = Column(Integer, primary_key=True)
     name = Column(String)
-    email = Column(String)
+    email = Column(String, unique=True, index=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
 
 class ProductORM(Base):
     __tablename__ = "products"
     id = Column(Integer, primary_key=True)
-    name = Column(String)
-    quantity = Column(Integer)
-    price = Column(Float)
+    name = Column(String, index=True)
+    quantity = Column(Integer, index=True)
+    price = Column(Float, index=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+
+order_product_associations = Table(
+    "order_product_associations",
+    Base.metadata,
+    Column("order_id", ForeignKey("orders.id"), primary_key=True),
+    Column("product_id", ForeignKey("products.id"), primary_key=True),
+    Column("quantity", Integer, nullable=False, default=1, server_default="1"),
+    Column("unit_price", Float, nullable=False, default=0.0, server_default="0"),
+)
+
+
+class OrderLineORM(Base):
+    __table__ = order_product_associations
+    product = relationship("ProductORM")
 
 
 class OrderORM(Base):
@@ -26,13 +56,90 @@ class OrderORM(Base):
     customer_id = Column(Integer, ForeignKey("customers.id"))
     status = Column(String, default="pending")
     total_price = Column(Float, default=0.0)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    created_at = Column(DateTime)
     customer = relationship("CustomerORM")
-    products = relationship("ProductORM", secondary="order_product_associations")
+    lines = relationship("OrderLineORM", cascade="all, delete-orphan")
+    products = relationship(
+        "ProductORM", secondary=order_product_associations, viewonly=True
+    )
+    # Поиск просроченных резервов: заказы статуса в порядке создания.
+    __table_args__ = (Index("ix_orders_status_created_at", "status", "created_at"),)
 
 
-order_product_associations = Table(
-    "order_product_associations",
-    Base.metadata,
-    Column("order_id", ForeignKey("orders.id")),
-    Column("product_id", ForeignKey("products.id")),
-)
+# Денормализованные итоги для отчетов. Поддерживаются инкрементально
+# (SqlAlchemyAggregates) в той же транзакции, что и операции над заказами.
+class OrderStatusTotalsORM(Base):
+    __tablename__ = "order_status_totals"
+    status = Column(String, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+
+class CustomerTotalsORM(Base):
+    __tablename__ = "customer_totals"
+    customer_id = Column(Integer, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+
+class ProductTotalsORM(Base):
+    __tablename__ = "product_totals"
+    product_id = Column(Integer, primary_key=True)
+    units_sold = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+
+class InventoryTotalsORM(Base):
+    __tablename__ = "inventory_totals"
+    id = Column(Integer, primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    value = Column(Float, nullable=False, default=0.0)
+
+
+# Проекция для чтения списков заказов (SqlAlchemyOrderSummaries): одна строка
+# на заказ без соединения со строками и продуктами.
+class OrderSummaryORM(Base):
+    __tablename__ = "order_summaries"
+    order_id = Column(Integer, primary_key=True)
+    customer_id = Column(Integer, nullable=False)
+    status = Column(String, nullable=False)
+    line_count = Column(Integer, nullable=False, default=0)
+    item_count = Column(Integer, nullable=False, default=0)
+    total_price = Column(Float, nullable=False, default=0.0)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    # История клиента и выборка по статусу читаются диапазоном индекса
+    # в порядке id, без сортировки.
+    __table_args__ = (
+        Index("ix_order_summaries_customer_order", "customer_id", "order_id"),
+        Index("ix_order_summaries_status_order", "status", "order_id"),
+    )
+
+
+# Транзакционный outbox: события изменений пишутся в той же транзакции,
+# что и сами изменения (SqlAlchemyOutbox), и читаются потребителями по курсору.
+class OutboxEventORM(Base):
+    __tablename__ = "outbox_events"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event_type = Column(String, nullable=False)
+    aggregate_type = Column(String, nullable=False)
+    aggregate_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+
+class OutboxCursorORM(Base):
+    __tablename__ = "outbox_cursors"
+    consumer = Column(String, primary_key=True)
+    last_event_id = Column(Integer, nullable=False, default=0)
+
+
+# Ответы команд по ключам идемпотентности (response — JSON снимка заказа).
+class IdempotencyKeyORM(Base):
+    __tablename__ = "idempotency_keys"
+    key = Column(String, primary_key=True)
+    command = Column(String, nullable=False)
+    fingerprint = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False)
@@ -0,0 +1,262 @@
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Union
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from my_hm.domain.events import DomainEvent, EventType, WarehouseListener
+from my_hm.domain.models import Order, OrderStatus, Product
+from my_hm.domain.clock import utc_now
+from .orm import OutboxCursorORM, OutboxEventORM
+from .sql_helpers import chunked
+
+EventSink = Callable[[List[DomainEvent]], None]
+
+
+def _event_row(
+    event_type: EventType, aggregate_type: str, aggregate_id: int, payload: dict
+) -> dict:
+    return {
+        "event_type": event_type.value,
+        "aggregate_type": aggregate_type,
+        "aggregate_id": aggregate_id,
+        "payload": json.dumps(payload, ensure_ascii=False),
+        "created_at": utc_now(),
+    }
+
+
+def _to_event(event_orm: OutboxEventORM) -> DomainEvent:
+    return DomainEvent(
+        id=event_orm.id,
+        event_type=EventType(event_orm.event_type),
+        aggregate_type=event_orm.aggregate_type,
+        aggregate_id=event_orm.aggregate_id,
+        payload=json.loads(event_orm.payload),
+        created_at=event_orm.created_at,
+    )
+
+
+class SqlAlchemyOutbox(WarehouseListener):
+    """
+    Транзакционный outbox. Подключается к WarehouseService как listener и
+    записывает события в таблицу outbox_events в той же сессии, поэтому
+    событие фиксируется тогда и только тогда, когда фиксируется изменение.
+
+    Пакетные переходы пишут по событию на заказ одним многострочным
+    INSERT на порцию.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def product_created(self, product: Product):
+        self._write(
+            [
+                _event_row(
+                    EventType.PRODUCT_CREATED,
+                    "product",
+                    product.id,
+                    {
+                        "name": product.name,
+                        "quantity": product.quantity,
+                        "price": product.price,
+                    },
+                )
+            ]
+        )
+
+    def orders_created(self, orders: List[Order]):
+        self._write(
+            [
+                _event_row(
+                    EventType.ORDER_CREATED,
+                    "order",
+                    order.id,
+                    {
+                        "customer_id": order.customer_id,
+                        "status": order.status.value,
+                        "total_price": order.total_price,
+                        "lines": [
+                            {
+                                "product_id": line.product_id,
+                                "quantity": line.quantity,
+                                "unit_price": line.unit_price,
+                            }
+                            for line in order.lines
+                        ],
+                    },
+                )
+                for order in orders
+            ]
+        )
+
+    def order_status_changed(self, order: Order, previous: OrderStatus):
+        self.orders_transitioned([order.id], previous, order.status)
+
+    def orders_transitioned(
+        self, order_ids: List[int], previous: OrderStatus, status: OrderStatus
+    ):
+        payload = {"previous": previous.value, "status": status.value}
+        self._write(
+            [
+                _event_row(EventType.ORDER_STATUS_CHANGED, "order", order_id, payload)
+                for order_id in order_ids
+            ]
+        )
+
+    def stock_changed(self, deltas: Dict[int, int]):
+        self._write(
+            [
+                _event_row(
+                    EventType.STOCK_CHANGED, "product", product_id, {"delta": delta}
+                )
+                for product_id, delta in sorted(deltas.items())
+                if delta
+            ]
+        )
+
+    def _write(self, rows: List[dict]):
+        for chunk in chunked(rows):
+            self.session.execute(insert(OutboxEventORM.__table__), chunk)
+
+
+class OutboxConsumer:
+    """
+    Потребитель outbox с сохраняемым курсором (id последнего обработанного
+    события) в таблице outbox_cursors. События читаются порциями по
+    batch_size по первичному ключу после курсора; курсор сдвигается только
+    после того, как порция передана получателю, поэтому доставка — «хотя бы
+    один раз»: после сбоя порция будет прочитана повторно.
+
+    SQLite допускает одного писателя, поэтому события фиксируются в порядке
+    id и курсор не пропускает еще не зафиксированные события.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        name: str,
+        batch_size: int = 500,
+    ):
+        if batch_size <= 0:
+            raise ValueError("Размер порции должен быть положительным числом")
+        self.session_factory = session_factory
+        self.name = name
+        self.batch_size = batch_size
+
+    def position(self) -> int:
+        """
+        Возвращает id последнего подтвержденного события (0 — ни одного).
+        """
+        with self.session_factory() as session:
+            cursor = session.get(OutboxCursorORM, self.name)
+            return cursor.last_event_id if cursor else 0
+
+    def poll(self, limit: Optional[int] = None) -> List[DomainEvent]:
+        """
+        Возвращает следующие события после курсора, не сдвигая его.
+        """
+        with self.session_factory() as session:
+            cursor = session.get(OutboxCursorORM, self.name)
+            after = cursor.last_event_id if cursor else 0
+            events = session.scalars(
+                select(OutboxEventORM)
+                .where(OutboxEventORM.id > after)
+                .order_by(OutboxEventORM.id)
+                .limit(limit or self.batch_size)
+            )
+            return [_to_event(event) for event in events]
+
+    def acknowledge(self, event_id: int):
+        """
+        Сдвигает курсор на event_id. Курсор не сдвигается назад.
+        """
+        with self.session_factory() as session:
+            statement = sqlite_insert(OutboxCursorORM.__table__).values(
+                consumer=self.name, last_event_id=event_id
+            )
+            session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=["consumer"],
+                    set_={"last_event_id": statement.excluded.last_event_id},
+                    where=OutboxCursorORM.__table__.c.last_event_id
+                    < statement.excluded.last_event_id,
+                )
+            )
+            session.commit()
+
+    def run_once(self, sink: EventSink) -> int:
+        """
+        Передает получателю одну порцию событий и подтверждает ее.
+        Возвращает число переданных событий.
+        """
+        events = self.poll()
+        if events:
+            sink(events)
+            self.acknowledge(events[-1].id)
+        return len(events)
+
+    def drain(self, sink: EventSink) -> int:
+        """
+        Передает получателю порции, пока не будут прочитаны все события.
+        Возвращает общее число переданных событий.
+        """
+        total = 0
+        while True:
+            count = self.run_once(sink)
+            total += count
+            if count < self.batch_size:
+                return total
+
+    def stream(self) -> Iterator[DomainEvent]:
+        """
+        Итерирует события порциями. Порция подтверждается, когда
+        потребитель запрашивает событие следующей порции; при прерывании
+        итерации неподтвержденная порция будет выдана снова.
+        """
+        while True:
+            events = self.poll()
+            yield from events
+            if not events:
+                return
+            self.acknowledge(events[-1].id)
+            if len(events) < self.batch_size:
+                return
+
+
+class JsonlFileSink:
+    """
+    Получатель событий для локальной проверки: дописывает события в файл
+    JSONL, по одному объекту на строку. С fsync=True порция сбрасывается на
+    диск до подтверждения курсора.
+    """
+
+    def __init__(self, path: Union[str, Path], fsync: bool = False):
+        self.path = Path(path)
+        self.fsync = fsync
+
+    def __call__(self, events: List[DomainEvent]):
+        with self.path.open("a", encoding="utf-8") as file:
+            for event in events:
+                file.write(
+                    json.dumps(
+                        {
+                            "id": event.id,
+                            "event_type": event.event_type.value,
+                            "aggregate_type": event.aggregate_type,
+                            "aggregate_id": event.aggregate_id,
+                            "payload": event.payload,
+                            "created_at": (
+                                event.created_at.isoformat()
+                                if event.created_at
+                                else None
+                            ),
+                        },
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+            file.flush()
+            if self.fsync:
+                os.fsync(file.fileno())
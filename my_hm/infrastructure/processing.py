@@ -0,0 +1,230 @@
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.exc import DBAPIError
+from my_hm.domain.exceptions import ConcurrencyConflictError
+from my_hm.domain.models import Order, OrderStatus
+from my_hm.domain.services import RetryPolicy, WarehouseService
+from .database import Database, EngineConfig, is_memory_database
+from .unit_of_work import SqlAlchemyUnitOfWork
+
+
+class CommandKind(Enum):
+    CREATE = "create"
+    CONFIRM = "confirm"
+    SHIP = "ship"
+    CANCEL = "cancel"
+
+
+@dataclass
+class OrderCommand:
+    """
+    Команда обработки заказа. Для CREATE задаются customer_id и items
+    ({product_id: количество}), для остальных — order_id.
+    """
+
+    kind: CommandKind
+    order_id: Optional[int] = None
+    customer_id: Optional[int] = None
+    items: Dict[int, int] = field(default_factory=dict)
+
+    @classmethod
+    def create(cls, customer_id: int, items: Dict[int, int]) -> "OrderCommand":
+        return cls(CommandKind.CREATE, customer_id=customer_id, items=dict(items))
+
+    @classmethod
+    def confirm(cls, order_id: int) -> "OrderCommand":
+        return cls(CommandKind.CONFIRM, order_id=order_id)
+
+    @classmethod
+    def ship(cls, order_id: int) -> "OrderCommand":
+        return cls(CommandKind.SHIP, order_id=order_id)
+
+    @classmethod
+    def cancel(cls, order_id: int) -> "OrderCommand":
+        return cls(CommandKind.CANCEL, order_id=order_id)
+
+
+@dataclass
+class CommandResult:
+    order_id: Optional[int] = None
+    status: Optional[OrderStatus] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class ParallelOrderProcessor:
+    """
+    Выполняет очередь команд над заказами в пуле процессов. Каждый процесс
+    создает собственный движок и сессии. Команды над существующим заказом
+    распределяются по процессам по id заказа, поэтому команды одного
+    заказа выполняются в одном процессе в исходном порядке; новые заказы
+    распределяются по процессам по очереди. Результаты возвращаются
+    в порядке команд.
+
+    Порядок между разными заказами не гарантируется, даже если у них есть
+    общие продукты: отмена одного заказа и создание другого из того же
+    остатка могут выполниться в любом порядке. Записи не распараллеливаются:
+    SQLite допускает одного писателя, процессы берут блокировку записи сразу
+    (BEGIN IMMEDIATE) и пишут по очереди, а параллельно выполняется только
+    работа Python (чтение, проверки, построение заказов).
+
+    Внутри процесса команды выполняются порциями по batch_size в одной
+    транзакции; каждая команда — в своем SAVEPOINT, так что ошибка одной
+    команды (доменная или ошибка базы данных) записывается в ее результат
+    и не откатывает остальные. Если блокировка записи не получена
+    за busy_timeout (SQLITE_BUSY), порция откатывается и повторяется
+    по busy_retry; после последней попытки, как и при других ошибках
+    фиксации, все команды порции получают ошибку.
+    """
+
+    def __init__(
+        self,
+        config: EngineConfig,
+        workers: Optional[int] = None,
+        batch_size: int = 500,
+        busy_retry: Optional[RetryPolicy] = None,
+    ):
+        if is_memory_database(config.url):
+            raise ValueError("Параллельная обработка требует файловую базу данных")
+        if batch_size <= 0:
+            raise ValueError("Размер порции должен быть положительным числом")
+        self.config = replace(config, begin_immediate=True)
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.busy_retry = busy_retry or RetryPolicy(
+            attempts=5, backoff=0.05, max_backoff=1.0
+        )
+
+    def process(self, commands: Iterable[OrderCommand]) -> List[CommandResult]:
+        commands = list(commands)
+        shards = self._shard(commands)
+        results: List[Optional[CommandResult]] = [None] * len(commands)
+        if not shards:
+            return []
+        # spawn: дочерние процессы не наследуют соединения SQLite родителя.
+        with ProcessPoolExecutor(
+            max_workers=min(self.workers, len(shards)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.config,),
+        ) as pool:
+            futures = [
+                pool.submit(_run_shard, shard, self.batch_size, self.busy_retry)
+                for shard in shards
+            ]
+            for future in futures:
+                for index, result in future.result():
+                    results[index] = result
+        return results
+
+    def _shard(
+        self, commands: List[OrderCommand]
+    ) -> List[List[Tuple[int, OrderCommand]]]:
+        """
+        Распределяет команды по шардам, сохраняя их порядок внутри шарда.
+        Ключ шарда — id заказа, для создания заказа — номер команды.
+        """
+        shards: Dict[int, List[Tuple[int, OrderCommand]]] = {}
+        for index, command in enumerate(commands):
+            key = index if command.kind == CommandKind.CREATE else command.order_id
+            shards.setdefault(key % self.workers, []).append((index, command))
+        return [shards[key] for key in sorted(shards)]
+
+
+_worker_database: Optional[Database] = None
+
+
+def _init_worker(config: EngineConfig):
+    global _worker_database  # pylint: disable=global-statement
+    _worker_database = Database(config)
+
+
+def _run_shard(
+    commands: List[Tuple[int, OrderCommand]], batch_size: int, busy_retry: RetryPolicy
+) -> List[Tuple[int, CommandResult]]:
+    results = []
+    for start in range(0, len(commands), batch_size):
+        batch = commands[start : start + batch_size]
+        for attempt in range(1, busy_retry.attempts + 1):
+            try:
+                results.extend(_run_batch(batch))
+                break
+            except (DBAPIError, sqlite3.Error) as error:
+                cause = _cause(error)
+                if _is_busy(cause) and attempt < busy_retry.attempts:
+                    time.sleep(busy_retry.delay(attempt))
+                    continue
+                results.extend(
+                    (index, CommandResult(error=str(cause))) for index, _ in batch
+                )
+                break
+    return results
+
+
+def _run_batch(
+    batch: List[Tuple[int, OrderCommand]],
+) -> List[Tuple[int, CommandResult]]:
+    """
+    Выполняет порцию команд одной транзакцией. Ошибка базы данных
+    откатывает всю порцию, и ее можно выполнить заново.
+    """
+    results = []
+    with SqlAlchemyUnitOfWork(_worker_database.session_factory) as uow:
+        service = WarehouseService(
+            uow.products,
+            uow.orders,
+            uow.customers,
+            listeners=uow.listeners,
+        )
+        executed = []
+        for index, command in batch:
+            try:
+                with uow.savepoint():
+                    order = _execute(service, command)
+                executed.append((index, order))
+            except (ValueError, ConcurrencyConflictError) as error:
+                results.append((index, CommandResult(error=str(error))))
+            except DBAPIError as error:
+                # Занятая база откатывает и повторяет всю порцию.
+                if _is_busy(_cause(error)):
+                    raise
+                results.append((index, CommandResult(error=str(_cause(error)))))
+        uow.commit()
+    results.extend(
+        (index, CommandResult(order_id=order.id, status=order.status))
+        for index, order in executed
+    )
+    return results
+
+
+def _cause(error: Exception) -> Exception:
+    return error.orig if isinstance(error, DBAPIError) else error
+
+
+def _is_busy(error: Exception) -> bool:
+    """
+    SQLITE_BUSY/SQLITE_LOCKED: блокировку записи держит другой процесс.
+    """
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and (
+        "locked" in message or "busy" in message
+    )
+
+
+def _execute(service: WarehouseService, command: OrderCommand) -> Order:
+    if command.kind == CommandKind.CREATE:
+        return service.create_order(command.customer_id, command.items)
+    if command.kind == CommandKind.CONFIRM:
+        return service.confirm_order(command.order_id)
+    if command.kind == CommandKind.SHIP:
+        return service.ship_order(command.order_id)
+    return service.cancel_order(command.order_id)
@@ -1,26 +1,87 @@
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import case, func, select, update
 from sqlalchemy.orm import Session
-from my_hm.domain.models import Order, Product, Customer, OrderStatus
+from my_hm.domain.exceptions import ConcurrencyConflictError
+from my_hm.domain.models import (
+    IdempotencyRecord,
+    LazyOrder,
+    Order,
+    OrderLine,
+    Product,
+    Customer,
+    OrderStatus,
+    CatalogQuery,
+    ProductPage,
+)
 from my_hm.domain.repositories import (
     ProductRepository,
     OrderRepository,
     CustomerRepository,
+    IdempotencyRepository,
+)
+from .orm import ProductORM, OrderORM, OrderLineORM, CustomerORM, IdempotencyKeyORM
+from .sql_helpers import (
+    CASE_CHUNK_SIZE,
+    ORDER_LINES_LOADER,
+    catalog_page,
+    catalog_statement,
+    chunked,
+    customer_upsert,
+    idempotency_row,
+    latest_by_email,
+    order_lines,
+    to_idempotency_record,
+    to_customer,
+    to_product,
 )
-from .orm import ProductORM, OrderORM, CustomerORM
+
+
+def _add_and_assign_ids(session: Session, pairs: List[tuple]):
+    """
+    Добавляет ORM-объекты пар (доменный объект, ORM-объект) в сессию одним
+    flush и проставляет доменным объектам назначенные базой id. Пакет
+    записывается одним flush, а не по flush на объект; вызывающий код
+    получает сущности уже с id.
+    """
+    session.add_all([entity_orm for _, entity_orm in pairs])
+    session.flush()
+    for entity, entity_orm in pairs:
+        entity.id = entity_orm.id
+
+
+def _compare_and_swap(session: Session, model, entity, values: dict):
+    """
+    Обновляет строку одним UPDATE ... WHERE id = :id AND version = :version,
+    увеличивая версию. Если строка есть, но версия другая, значит ее изменила
+    другая транзакция после чтения: выбрасывается ConcurrencyConflictError.
+    Отсутствующая строка, как и раньше, молча пропускается.
+    """
+    updated = (
+        session.query(model)
+        .filter(model.id == entity.id, model.version == entity.version)
+        .update({**values, model.version: model.version + 1})
+    )
+    if updated:
+        entity.version += 1
+    elif session.query(model.id).filter(model.id == entity.id).first():
+        raise ConcurrencyConflictError(model.__name__, entity.id, entity.version)
 
 
 class SqlAlchemyCustomerRepository(CustomerRepository):
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, read_session: Optional[Session] = None):
         self.session = session
+        # Сессия пула только для чтения: используется методами, которые
+        # не должны видеть незафиксированные изменения текущей транзакции.
+        self.read_session = read_session or session
 
     def add(self, customer: Customer) -> Customer:
         """
         Добавляет нового клиента в репозиторий и сохраняет его в базе данных.
         """
         customer_orm = CustomerORM(name=customer.name, email=customer.email)
-        self.session.add(customer_orm)
-        self.session.flush()  # Получить id
-        customer.id = customer_orm.id
+        _add_and_assign_ids(self.session, [(customer, customer_orm)])
         return customer
 
     def get(self, customer_id: int) -> Optional[Customer]:
@@ -29,31 +90,83 @@ class SqlAlchemyCustomerRepository(CustomerRepository):
         """
         customer_orm = self.session.query(CustomerORM).filter_by(id=customer_id).first()
         if customer_orm:
-            return Customer(
-                id=customer_orm.id, name=customer_orm.name, email=customer_orm.email
-            )
+            return to_customer(customer_orm)
         return None
 
+    def get_many(self, customer_ids: Iterable[int]) -> Dict[int, Customer]:
+        """
+        Получает клиентов по списку ID, возвращая словарь {id: клиент}.
+        """
+        customers = {}
+        for chunk in chunked(set(customer_ids)):
+            for c in self.session.query(CustomerORM).filter(CustomerORM.id.in_(chunk)):
+                customers[c.id] = to_customer(c)
+        return customers
+
     def list(self) -> List[Customer]:
         """
         Возвращает список всех клиентов.
         """
-        customers_orm = self.session.query(CustomerORM).all()
-        return [Customer(id=c.id, name=c.name, email=c.email) for c in customers_orm]
+        customers_orm = self.read_session.query(CustomerORM).all()
+        return [to_customer(c) for c in customers_orm]
 
     def update(self, customer: Customer):
         """
-        Обновляет информацию о клиенте в базе данных.
+        Обновляет информацию о клиенте, если версия в базе совпадает
+        с версией customer.
         """
-        customer_orm = self.session.query(CustomerORM).filter_by(id=customer.id).first()
-        if customer_orm:
-            customer_orm.name = customer.name
-            customer_orm.email = customer.email
+        _compare_and_swap(
+            self.session,
+            CustomerORM,
+            customer,
+            {CustomerORM.name: customer.name, CustomerORM.email: customer.email},
+        )
+
+    def get_by_email(self, email: str) -> Optional[Customer]:
+        """
+        Получает клиента по email (поиск по уникальному индексу).
+        """
+        return self.get_many_by_email([email]).get(email)
+
+    def get_many_by_email(self, emails: Iterable[str]) -> Dict[str, Customer]:
+        """
+        Получает клиентов по списку email, возвращая словарь {email: клиент}.
+        """
+        customers = {}
+        for chunk in chunked(set(emails)):
+            for c in self.session.scalars(
+                select(CustomerORM)
+                .where(CustomerORM.email.in_(chunk))
+                .execution_options(populate_existing=True)
+            ):
+                customers[c.email] = to_customer(c)
+        return customers
+
+    def upsert_many(self, customers: Iterable[Customer]) -> List[Customer]:
+        """
+        Добавляет или обновляет клиентов одним INSERT ... ON CONFLICT
+        (executemany), затем читает их id и версии запросом по email.
+        """
+        latest = latest_by_email(customers)
+        if not latest:
+            return []
+        # Клиенты, добавленные через add, должны попасть в базу раньше,
+        # иначе их INSERT при commit нарушит уникальность email.
+        self.session.flush()
+        self.session.execute(
+            customer_upsert(),
+            [{"name": c.name, "email": c.email} for c in latest.values()],
+        )
+        stored = self.get_many_by_email(latest)
+        return [stored[email] for email in latest]
 
 
 class SqlAlchemyProductRepository(ProductRepository):
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, read_session: Optional[Session] = None):
         self.session = session
+        # Сессия пула только для чтения: используется методами, которые
+        # не должны видеть незафиксированные изменения текущей транзакции.
+        self.read_session = read_session or session
 
     def add(self, product: Product) -> Product:
         """
@@ -62,9 +175,7 @@ class SqlAlchemyProductRepository(ProductRepository):
         product_orm = ProductORM(
             name=product.name, quantity=product.quantity, price=product.price
         )
-        self.session.add(product_orm)
-        self.session.flush()
-        product.id = product_orm.id
+        _add_and_assign_ids(self.session, [(product, product_orm)])
         return product
 
     def get(self, product_id: int) -> Optional[Product]:
@@ -73,83 +184,299 @@ class SqlAlchemyProductRepository(ProductRepository):
         """
         product_orm = self.session.query(ProductORM).filter_by(id=product_id).first()
         if product_orm:
-            return Product(
-                id=product_orm.id,
-                name=product_orm.name,
-                quantity=product_orm.quantity,
-                price=product_orm.price,
-            )
+            return to_product(product_orm)
         return None
 
+    def get_many(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        """
+        Получает продукты по списку ID, возвращая словарь {id: продукт}.
+        """
+        products = {}
+        for chunk in chunked(set(product_ids)):
+            for p in self.session.query(ProductORM).filter(ProductORM.id.in_(chunk)):
+                products[p.id] = to_product(p)
+        return products
+
+    def list(self) -> List[Product]:
+        """
+        Возвращает список всех продуктов.
+        """
+        products_orm = self.read_session.query(ProductORM).all()
+        return [to_product(p) for p in products_orm]
+
+    def update(self, product: Product):
+        """
+        Обновляет информацию о продукте, если версия в базе совпадает
+        с версией product.
+        """
+        _compare_and_swap(
+            self.session,
+            ProductORM,
+            product,
+            {
+                ProductORM.name: product.name,
+                ProductORM.quantity: product.quantity,
+                ProductORM.price: product.price,
+            },
+        )
+
+    def find(self, query: CatalogQuery) -> ProductPage:
+        """
+        Выборка каталога с фильтрами и пагинацией по ключу. Все условия
+        выполняются в SQL и опираются на индексы по quantity, name и price.
+        """
+        products_orm = self.read_session.scalars(catalog_statement(query)).all()
+        return catalog_page(products_orm, query)
+
+    def reserve_stock(self, quantities: Dict[int, int]) -> List[int]:
+        """
+        Списывает остатки условным UPDATE ... WHERE quantity >= :n по каждому
+        продукту, без чтения строки в Python и без блокировок на время работы
+        кода. Если какого-то продукта не хватило, уже списанное возвращается
+        и функция сообщает id недоступных продуктов.
+        """
+        reserved = {}
+        failed = []
+        # Фиксированный порядок id уменьшает риск взаимных блокировок.
+        for product_id, quantity in sorted(quantities.items()):
+            updated = (
+                self.session.query(ProductORM)
+                .filter(ProductORM.id == product_id, ProductORM.quantity >= quantity)
+                .update(
+                    {
+                        ProductORM.quantity: ProductORM.quantity - quantity,
+                        ProductORM.version: ProductORM.version + 1,
+                    }
+                )
+            )
+            if updated:
+                reserved[product_id] = quantity
+            else:
+                failed.append(product_id)
+        if failed and reserved:
+            self.release_stock(reserved)
+        return failed
+
+    def release_stock(self, quantities: Dict[int, int]):
+        """
+        Возвращает остатки на склад одним UPDATE на порцию продуктов.
+        """
+        for chunk in chunked(sorted(quantities), CASE_CHUNK_SIZE):
+            increments = {product_id: quantities[product_id] for product_id in chunk}
+            self.session.query(ProductORM).filter(ProductORM.id.in_(chunk)).update(
+                {
+                    ProductORM.quantity: ProductORM.quantity
+                    + case(increments, value=ProductORM.id, else_=0),
+                    ProductORM.version: ProductORM.version + 1,
+                },
+                synchronize_session="fetch",
+            )
+
+
+def _lazy_order_to_domain(order_orm: OrderORM, session: Session) -> LazyOrder:
+    lines = order_lines(order_orm)
+    return LazyOrder(
+        id=order_orm.id,
+        customer_id=order_orm.customer_id,
+        status=OrderStatus(order_orm.status),
+        total_price=order_orm.total_price,
+        lines=lines,
+        version=order_orm.version,
+        created_at=order_orm.created_at,
+        load_products=lambda: _load_line_products(session, lines),
+    )
+
+
+def _load_line_products(session: Session, lines: List[OrderLine]) -> List[Product]:
+    """
+    Загружает продукты строк заказа одним запросом, в порядке строк.
+    """
+    product_ids = [line.product_id for line in lines]
+    products = {}
+    for chunk in chunked(product_ids):
+        for p in session.scalars(select(ProductORM).where(ProductORM.id.in_(chunk))):
+            products[p.id] = to_product(p)
+    return [products[pid] for pid in product_ids if pid in products]
+
 
 class SqlAlchemyOrderRepository(OrderRepository):
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, read_session: Optional[Session] = None):
         self.session = session
+        # Сессия пула только для чтения: используется методами, которые
+        # не должны видеть незафиксированные изменения текущей транзакции.
+        self.read_session = read_session or session
 
     def add(self, order: Order) -> Order:
         """
         Добавляет новый заказ в репозиторий и сохраняет его в базе данных.
         """
-        order_orm = OrderORM(
-            customer_id=order.customer_id,
-            status=order.status.value,
-            total_price=order.total_price,
-        )
-        order_orm.products = [
-            self.session.query(ProductORM).filter_by(id=p.id).one()
-            for p in order.products
-        ]
-        self.session.add(order_orm)
-        self.session.flush()
-        order.id = order_orm.id
-        return order
+        return self.add_many([order])[0]
+
+    def add_many(self, orders: List[Order]) -> List[Order]:
+        """
+        Добавляет пакет заказов. Каждая строка заказа хранится одной записью
+        с количеством и ценой, продукты не загружаются; весь пакет
+        сохраняется одним flush, после которого у заказов есть id.
+        """
+        orders_orm = []
+        for order in orders:
+            order_orm = OrderORM(
+                customer_id=order.customer_id,
+                status=order.status.value,
+                total_price=order.total_price,
+                created_at=order.created_at,
+            )
+            order_orm.lines = [
+                OrderLineORM(
+                    product_id=line.product_id,
+                    quantity=line.quantity,
+                    unit_price=line.unit_price,
+                )
+                for line in order.lines
+            ]
+            orders_orm.append(order_orm)
+        _add_and_assign_ids(self.session, list(zip(orders, orders_orm)))
+        return orders
 
     def get(self, order_id: int) -> Optional[Order]:
         """
         Получает заказ по его ID.
         """
-        order_orm = self.session.query(OrderORM).filter_by(id=order_id).first()
+        order_orm = (
+            self.session.query(OrderORM)
+            .options(ORDER_LINES_LOADER)
+            .populate_existing()
+            .filter_by(id=order_id)
+            .first()
+        )
         if order_orm:
-            products = [
-                Product(id=p.id, name=p.name, quantity=p.quantity, price=p.price)
-                for p in order_orm.products
-            ]
-            return Order(
-                id=order_orm.id,
-                customer_id=order_orm.customer_id,
-                products=products,
-                status=OrderStatus(order_orm.status),
-                total_price=order_orm.total_price,
-            )
+            return _lazy_order_to_domain(order_orm, self.session)
         return None
 
     def list(self) -> List[Order]:
         """
         Возвращает список всех заказов в репозитории.
         """
-        orders_orm = self.session.query(OrderORM).all()
-        orders = []
-        for order_orm in orders_orm:
-            products = [
-                Product(id=p.id, name=p.name, quantity=p.quantity, price=p.price)
-                for p in order_orm.products
-            ]
-            orders.append(
-                Order(
-                    id=order_orm.id,
-                    customer_id=order_orm.customer_id,
-                    products=products,
-                    status=OrderStatus(order_orm.status),
-                    total_price=order_orm.total_price,
+        return list(self.iter_orders())
+
+    def iter_orders(
+        self,
+        batch_size: int = 1000,
+        status: Optional[OrderStatus] = None,
+        customer_id: Optional[int] = None,
+    ) -> Iterator[Order]:
+        """
+        Потоково возвращает заказы, читая их из базы порциями по batch_size.
+        Строки каждой порции подгружаются одним дополнительным запросом
+        (selectinload), продукты — только при обращении к order.products,
+        поэтому память ограничена размером порции.
+        """
+        query = self.read_session.query(OrderORM).options(ORDER_LINES_LOADER)
+        if status is not None:
+            query = query.filter(OrderORM.status == status.value)
+        if customer_id is not None:
+            query = query.filter(OrderORM.customer_id == customer_id)
+        for order_orm in query.order_by(OrderORM.id).yield_per(batch_size):
+            yield _lazy_order_to_domain(order_orm, self.read_session)
+
+    def update(self, order: Order):
+        """
+        Обновляет заказ одним UPDATE, без повторного чтения строки.
+        Статус записывается, только если заказ не менялся с момента чтения
+        (версия совпадает), иначе выбрасывается ConcurrencyConflictError.
+        """
+        _compare_and_swap(
+            self.session,
+            OrderORM,
+            order,
+            {
+                OrderORM.status: order.status.value,
+                OrderORM.total_price: order.total_price,
+            },
+        )
+
+    def transition_many(
+        self, order_ids: Iterable[int], previous: OrderStatus, status: OrderStatus
+    ) -> List[int]:
+        """
+        Меняет статус одним UPDATE ... WHERE id IN (...) AND status = :previous
+        RETURNING id на каждую порцию id; версия заказов увеличивается.
+        """
+        updated = []
+        for chunk in chunked(order_ids):
+            result = self.session.execute(
+                update(OrderORM)
+                .where(OrderORM.id.in_(chunk), OrderORM.status == previous.value)
+                .values(status=status.value, version=OrderORM.version + 1)
+                .returning(OrderORM.id)
+                .execution_options(synchronize_session=False)
+            )
+            updated.extend(result.scalars())
+        return updated
+
+    def get_statuses(self, order_ids: Iterable[int]) -> Dict[int, OrderStatus]:
+        """
+        Возвращает текущие статусы заказов {id: статус}, не загружая заказы.
+        """
+        statuses = {}
+        for chunk in chunked(order_ids):
+            rows = self.session.execute(
+                select(OrderORM.id, OrderORM.status).where(OrderORM.id.in_(chunk))
+            )
+            statuses.update((order_id, OrderStatus(value)) for order_id, value in rows)
+        return statuses
+
+    def find_pending_before(self, created_before: datetime, limit: int) -> List[int]:
+        """
+        Читает id просроченных заказов по индексу (status, created_at):
+        диапазон индекса уже упорядочен по времени создания, сортировки нет.
+        """
+        return list(
+            self.session.scalars(
+                select(OrderORM.id)
+                .where(
+                    OrderORM.status == OrderStatus.PENDING.value,
+                    OrderORM.created_at < created_before,
                 )
+                .order_by(OrderORM.created_at, OrderORM.id)
+                .limit(limit)
             )
-        return orders
+        )
 
-    def update(self, order: Order):
+    def line_quantities(self, order_ids: Iterable[int]) -> Dict[int, int]:
         """
-        Обновляет информацию о заказе в базе данных.
+        Суммирует количество по продуктам в строках заказов (GROUP BY в SQL).
         """
-        order_orm = self.session.query(OrderORM).filter_by(id=order.id).first()
-        if order_orm:
-            order_orm.status = order.status.value
-            order_orm.total_price = order.total_price
+        quantities = Counter()
+        for chunk in chunked(order_ids):
+            rows = self.session.execute(
+                select(OrderLineORM.product_id, func.sum(OrderLineORM.quantity))
+                .where(OrderLineORM.order_id.in_(chunk))
+                .group_by(OrderLineORM.product_id)
+            )
+            for product_id, quantity in rows:
+                quantities[product_id] += quantity
+        return dict(quantities)
+
+
+class SqlAlchemyIdempotencyRepository(IdempotencyRepository):
+    """
+    Ответы команд в таблице idempotency_keys. Ключ таблицы — сам ключ
+    идемпотентности: если две транзакции одновременно выполнили команду
+    с одним ключом, вторая получит ошибку целостности при commit и откатится
+    вместе со своим заказом.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def get(self, key: str) -> Optional[IdempotencyRecord]:
+        row = self.session.get(IdempotencyKeyORM, key)
+        return to_idempotency_record(row) if row else None
+
+    def save(
+        self, key: str, command: str, fingerprint: str, order: Order
+    ) -> IdempotencyRecord:
+        row = idempotency_row(key, command, fingerprint, order)
+        self.session.add(row)
+        return to_idempotency_record(row)
@@ -0,0 +1,186 @@
+import json
+from typing import Dict, Iterable, Iterator, List
+from sqlalchemy import Select, select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import selectinload
+from my_hm.domain.clock import utc_now
+from my_hm.domain.models import (
+    IdempotencyRecord,
+    Order,
+    OrderLine,
+    Product,
+    Customer,
+    OrderStatus,
+    CatalogQuery,
+    ProductPage,
+    ProductSort,
+)
+from .orm import ProductORM, OrderORM, OrderLineORM, CustomerORM, IdempotencyKeyORM
+
+# SQLite ограничивает число параметров в одном запросе, поэтому
+# списки id для IN (...) отправляются частями.
+IN_CLAUSE_CHUNK_SIZE = 500
+# Для UPDATE с CASE по продуктам: каждый продукт дает три параметра
+# (WHEN, THEN и элемент IN), поэтому порции в три раза меньше.
+CASE_CHUNK_SIZE = IN_CLAUSE_CHUNK_SIZE // 3
+
+
+def chunked(
+    ids: Iterable[int], size: int = IN_CLAUSE_CHUNK_SIZE
+) -> Iterator[List[int]]:
+    """
+    Разбивает набор id на части не длиннее size.
+    """
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start : start + size]
+
+
+def to_customer(customer_orm: CustomerORM) -> Customer:
+    return Customer(
+        id=customer_orm.id,
+        name=customer_orm.name,
+        email=customer_orm.email,
+        version=customer_orm.version,
+    )
+
+
+def to_product(product_orm: ProductORM) -> Product:
+    return Product(
+        id=product_orm.id,
+        name=product_orm.name,
+        quantity=product_orm.quantity,
+        price=product_orm.price,
+        version=product_orm.version,
+    )
+
+
+def customer_upsert():
+    """
+    INSERT ... ON CONFLICT(email) DO UPDATE для executemany по строкам
+    {"name", "email"}. Версия увеличивается, только если имя изменилось,
+    чтобы повторная синхронизация не давала ложных конфликтов версий.
+    """
+    table = CustomerORM.__table__
+    statement = sqlite_insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.email],
+        set_={"name": statement.excluded.name, "version": table.c.version + 1},
+        where=table.c.name != statement.excluded.name,
+    )
+
+
+def latest_by_email(customers: Iterable[Customer]) -> Dict[str, Customer]:
+    return {customer.email: customer for customer in customers}
+
+
+_PRODUCT_SORT_COLUMNS = {
+    ProductSort.ID: ProductORM.id,
+    ProductSort.NAME: ProductORM.name,
+    ProductSort.PRICE: ProductORM.price,
+}
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    """
+    Возвращает наименьшую строку, большую всех строк с данным префиксом.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def catalog_statement(query: CatalogQuery) -> Select:
+    """
+    Строит SELECT каталога: фильтры, сортировку и условие курсора.
+    При заданном limit выбирается на одну строку больше, чтобы узнать,
+    есть ли следующая страница.
+    """
+    sort_column = _PRODUCT_SORT_COLUMNS[query.sort]
+    statement = select(ProductORM)
+    if query.in_stock:
+        statement = statement.where(ProductORM.quantity > 0)
+    if query.name_prefix:
+        # Диапазон вместо LIKE, чтобы использовать индекс по name.
+        statement = statement.where(
+            ProductORM.name >= query.name_prefix,
+            ProductORM.name < _prefix_upper_bound(query.name_prefix),
+        )
+    if query.min_price is not None:
+        statement = statement.where(ProductORM.price >= query.min_price)
+    if query.max_price is not None:
+        statement = statement.where(ProductORM.price <= query.max_price)
+    if query.after is not None:
+        key = tuple_(sort_column, ProductORM.id)
+        cursor = tuple_(*query.after)
+        statement = statement.where(key < cursor if query.descending else key > cursor)
+    if query.descending:
+        statement = statement.order_by(sort_column.desc(), ProductORM.id.desc())
+    else:
+        statement = statement.order_by(sort_column, ProductORM.id)
+    if query.limit is not None:
+        statement = statement.limit(query.limit + 1)
+    return statement
+
+
+def catalog_page(products_orm: List[ProductORM], query: CatalogQuery) -> ProductPage:
+    next_cursor = None
+    if query.limit is not None and len(products_orm) > query.limit:
+        products_orm = products_orm[: query.limit]
+        last = products_orm[-1]
+        next_cursor = (getattr(last, _PRODUCT_SORT_COLUMNS[query.sort].key), last.id)
+    return ProductPage(
+        items=[to_product(p) for p in products_orm],
+        next_cursor=next_cursor,
+    )
+
+
+# Синхронные репозитории загружают только строки заказов, продукты
+# подгружаются LazyOrder при обращении. AsyncSession не умеет ленивую
+# загрузку, поэтому асинхронные репозитории загружают продукты сразу.
+ORDER_LINES_LOADER = selectinload(OrderORM.lines)
+ORDER_LINES_WITH_PRODUCTS_LOADER = selectinload(OrderORM.lines).joinedload(
+    OrderLineORM.product
+)
+
+
+def order_lines(order_orm: OrderORM) -> List[OrderLine]:
+    return [
+        OrderLine(line.product_id, line.quantity, line.unit_price)
+        for line in order_orm.lines
+    ]
+
+
+def order_to_domain(order_orm: OrderORM) -> Order:
+    products = [to_product(line.product) for line in order_orm.lines]
+    return Order(
+        id=order_orm.id,
+        customer_id=order_orm.customer_id,
+        products=products,
+        status=OrderStatus(order_orm.status),
+        total_price=order_orm.total_price,
+        lines=order_lines(order_orm),
+        version=order_orm.version,
+        created_at=order_orm.created_at,
+    )
+
+
+def to_idempotency_record(row: IdempotencyKeyORM) -> IdempotencyRecord:
+    return IdempotencyRecord(
+        key=row.key,
+        command=row.command,
+        fingerprint=row.fingerprint,
+        response=json.loads(row.response),
+        created_at=row.created_at,
+    )
+
+
+def idempotency_row(
+    key: str, command: str, fingerprint: str, order: Order
+) -> IdempotencyKeyORM:
+    record = IdempotencyRecord.for_order(key, command, fingerprint, order)
+    return IdempotencyKeyORM(
+        key=key,
+        command=command,
+        fingerprint=fingerprint,
+        response=json.dumps(record.response),
+        created_at=utc_now(),
+    )
@@ -0,0 +1,194 @@
+from datetime import datetime
+from typing import Callable, List, Optional
+from sqlalchemy import Select, delete, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+from my_hm.domain.events import WarehouseListener
+from my_hm.domain.models import (
+    Order,
+    OrderStatus,
+    OrderSummary,
+    OrderSummaryPage,
+    OrderSummaryQuery,
+)
+from my_hm.domain.clock import utc_now
+from .orm import OrderLineORM, OrderORM, OrderSummaryORM
+from .sql_helpers import chunked
+
+_SUMMARY_COLUMNS = (
+    OrderSummaryORM.order_id,
+    OrderSummaryORM.customer_id,
+    OrderSummaryORM.status,
+    OrderSummaryORM.line_count,
+    OrderSummaryORM.item_count,
+    OrderSummaryORM.total_price,
+    OrderSummaryORM.created_at,
+    OrderSummaryORM.updated_at,
+)
+
+
+def _summary_statement(query: OrderSummaryQuery) -> Select:
+    """
+    Строит SELECT сводок: фильтры и условие курсора по id заказа. Как и в
+    каталоге, при заданном limit выбирается на одну строку больше.
+    """
+    statement = select(*_SUMMARY_COLUMNS)
+    if query.customer_id is not None:
+        statement = statement.where(OrderSummaryORM.customer_id == query.customer_id)
+    if query.status is not None:
+        statement = statement.where(OrderSummaryORM.status == query.status.value)
+    if query.created_from is not None:
+        statement = statement.where(OrderSummaryORM.created_at >= query.created_from)
+    if query.created_before is not None:
+        statement = statement.where(OrderSummaryORM.created_at < query.created_before)
+    if query.after is not None:
+        statement = statement.where(
+            OrderSummaryORM.order_id < query.after
+            if query.descending
+            else OrderSummaryORM.order_id > query.after
+        )
+    order_id = OrderSummaryORM.order_id
+    statement = statement.order_by(order_id.desc() if query.descending else order_id)
+    if query.limit is not None:
+        statement = statement.limit(query.limit + 1)
+    return statement
+
+
+def _to_summary(row) -> OrderSummary:
+    return OrderSummary(
+        order_id=row.order_id,
+        customer_id=row.customer_id,
+        status=OrderStatus(row.status),
+        line_count=row.line_count,
+        item_count=row.item_count,
+        total_price=row.total_price,
+        created_at=row.created_at,
+        updated_at=row.updated_at,
+    )
+
+
+class SqlAlchemyOrderSummaries(WarehouseListener):
+    """
+    Проекция для чтения списков заказов (таблица order_summaries): одна
+    плоская строка на заказ с клиентом, статусом, числом строк и единиц,
+    суммой и временем создания и последнего изменения. Подключается
+    к WarehouseService как listener и обновляется в той же транзакции, что
+    и заказы, поэтому история клиента читается одним диапазоном индекса
+    (customer_id, order_id) без загрузки заказов, строк и продуктов.
+
+    Заказы, записанные в обход сервиса (bulk-импорт), проекция не видит;
+    для сверки есть rebuild(). При создании таблицы ensure_schema заполняет
+    ее rebuild() по уже существующим заказам.
+    """
+
+    tables = (OrderSummaryORM.__tablename__,)
+
+    def __init__(
+        self,
+        session: Session,
+        read_session: Optional[Session] = None,
+        clock: Callable[[], datetime] = utc_now,
+    ):
+        self.session = session
+        self.read_session = read_session or session
+        self.clock = clock
+
+    def orders_created(self, orders: List[Order]):
+        now = self.clock()
+        rows = [
+            {
+                "order_id": order.id,
+                "customer_id": order.customer_id,
+                "status": order.status.value,
+                "line_count": len(order.lines),
+                "item_count": sum(line.quantity for line in order.lines),
+                "total_price": order.total_price,
+                "created_at": order.created_at,
+                "updated_at": order.created_at or now,
+            }
+            for order in orders
+        ]
+        for chunk in chunked(rows):
+            self.session.execute(insert(OrderSummaryORM.__table__), chunk)
+
+    def order_status_changed(self, order: Order, previous: OrderStatus):
+        self.orders_transitioned([order.id], previous, order.status)
+
+    def orders_transitioned(
+        self, order_ids: List[int], previous: OrderStatus, status: OrderStatus
+    ):
+        now = self.clock()
+        for chunk in chunked(order_ids):
+            self.session.execute(
+                update(OrderSummaryORM)
+                .where(OrderSummaryORM.order_id.in_(chunk))
+                .values(status=status.value, updated_at=now)
+            )
+
+    def get(self, order_id: int) -> Optional[OrderSummary]:
+        """
+        Возвращает сводку заказа по id.
+        """
+        row = self.read_session.execute(
+            select(*_SUMMARY_COLUMNS).where(OrderSummaryORM.order_id == order_id)
+        ).one_or_none()
+        return _to_summary(row) if row else None
+
+    def find(self, query: OrderSummaryQuery) -> OrderSummaryPage:
+        """
+        Выборка сводок с фильтрами и пагинацией по ключу.
+        """
+        rows = self.read_session.execute(_summary_statement(query)).all()
+        next_cursor = None
+        if query.limit is not None and len(rows) > query.limit:
+            rows = rows[: query.limit]
+            next_cursor = rows[-1].order_id
+        return OrderSummaryPage(
+            items=[_to_summary(row) for row in rows], next_cursor=next_cursor
+        )
+
+    def customer_history(
+        self,
+        customer_id: int,
+        limit: int = 20,
+        after: Optional[int] = None,
+        status: Optional[OrderStatus] = None,
+    ) -> OrderSummaryPage:
+        """
+        Страница заказов клиента, новые первыми ("мои заказы").
+        """
+        return self.find(
+            OrderSummaryQuery(
+                customer_id=customer_id, status=status, after=after, limit=limit
+            )
+        )
+
+    def rebuild(self):
+        """
+        Заполняет проекцию заново по таблицам заказов одним INSERT ... SELECT.
+        Время изменения пересчитанных строк — момент пересчета.
+        """
+        self.session.execute(delete(OrderSummaryORM))
+        lines = (
+            select(
+                OrderLineORM.order_id,
+                func.count().label("line_count"),  # pylint: disable=not-callable
+                func.sum(OrderLineORM.quantity).label("item_count"),
+            )
+            .group_by(OrderLineORM.order_id)
+            .subquery()
+        )
+        self.session.execute(
+            insert(OrderSummaryORM).from_select(
+                [column.key for column in _SUMMARY_COLUMNS],
+                select(
+                    OrderORM.id,
+                    OrderORM.customer_id,
+                    OrderORM.status,
+                    func.coalesce(lines.c.line_count, 0),
+                    func.coalesce(lines.c.item_count, 0),
+                    OrderORM.total_price,
+                    OrderORM.created_at,
+                    literal(self.clock(), OrderSummaryORM.updated_at.type),
+                ).outerjoin(lines, lines.c.order_id == OrderORM.id),
+            )
+        )
@@ -1,19 +1,196 @@
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from my_hm.domain.events import WarehouseListener
+from my_hm.domain.repositories import (
+    ProductRepository,
+    OrderRepository,
+    CustomerRepository,
+    IdempotencyRepository,
+)
 from my_hm.domain.unit_of_work import UnitOfWork
+from .aggregates import SqlAlchemyAggregates
+from .outbox import SqlAlchemyOutbox
+from .summaries import SqlAlchemyOrderSummaries
+from .cache import (
+    IdentityMapCache,
+    CachedCustomerRepository,
+    CachedIdempotencyRepository,
+    CachedProductRepository,
+)
+from .repositories import (
+    SqlAlchemyProductRepository,
+    SqlAlchemyOrderRepository,
+    SqlAlchemyCustomerRepository,
+    SqlAlchemyIdempotencyRepository,
+)
 
 
-class SqlAlchemyUnitOfWork(UnitOfWork):
+@dataclass
+class TransactionStats:
+    """
+    Статистика одной транзакции единицы работы.
+    """
 
-    def __init__(self, session):
-        pass
+    statements: int = 0
+    flushes: int = 0
+    savepoints: int = 0
+    wall_time: float = 0.0
+    committed: bool = False
+
+
+# Атрибуты — репозитории и проекции, которые единица работы открывает
+# вызывающему коду, и состояние ее транзакции.
+class SqlAlchemyUnitOfWork(UnitOfWork):  # pylint: disable=too-many-instance-attributes
+    """
+    Единица работы поверх SQLAlchemy. Владеет сессией и репозиториями.
+    Репозитории сбрасывают в базу только новые сущности (один flush на вызов
+    add или add_many, чтобы вернуть их с id); остальные изменения
+    отправляются при commit или явном flush.
+
+    Если переданы кэши, репозитории продуктов, клиентов и ответов по ключам
+    идемпотентности оборачиваются кэширующими, а измененные записи
+    вытесняются из кэша после commit/rollback.
+
+    С read_session_factory запросы только на чтение (list, find, iter_orders)
+    выполняются через отдельный пул и не ждут писателя.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        product_cache: Optional[IdentityMapCache] = None,
+        customer_cache: Optional[IdentityMapCache] = None,
+        read_session_factory: Optional[Callable[[], Session]] = None,
+        idempotency_cache: Optional[IdentityMapCache] = None,
+    ):
+        self.session_factory = session_factory
+        self.read_session_factory = read_session_factory
+        self.read_session: Optional[Session] = None
+        self.product_cache = product_cache
+        self.customer_cache = customer_cache
+        self.idempotency_cache = idempotency_cache
+        self.session: Optional[Session] = None
+        self.products: Optional[ProductRepository] = None
+        self.orders: Optional[OrderRepository] = None
+        self.customers: Optional[CustomerRepository] = None
+        self.idempotency: Optional[IdempotencyRepository] = None
+        self.aggregates: Optional[SqlAlchemyAggregates] = None
+        self.outbox: Optional[SqlAlchemyOutbox] = None
+        self.summaries: Optional[SqlAlchemyOrderSummaries] = None
+        self.stats = TransactionStats()
+        self.history: List[TransactionStats] = []
+        self._started_at = 0.0
 
     def __enter__(self):
-        pass
+        self.session = self.session_factory()
+        if self.read_session_factory is not None:
+            self.read_session = self.read_session_factory()
+        self.products = SqlAlchemyProductRepository(self.session, self.read_session)
+        self.orders = SqlAlchemyOrderRepository(self.session, self.read_session)
+        self.customers = SqlAlchemyCustomerRepository(self.session, self.read_session)
+        self.aggregates = SqlAlchemyAggregates(self.session, self.read_session)
+        self.outbox = SqlAlchemyOutbox(self.session)
+        self.summaries = SqlAlchemyOrderSummaries(self.session, self.read_session)
+        self.idempotency = SqlAlchemyIdempotencyRepository(self.session)
+        if self.product_cache is not None:
+            self.products = CachedProductRepository(self.products, self.product_cache)
+        if self.customer_cache is not None:
+            self.customers = CachedCustomerRepository(
+                self.customers, self.customer_cache
+            )
+        if self.idempotency_cache is not None:
+            self.idempotency = CachedIdempotencyRepository(
+                self.idempotency, self.idempotency_cache
+            )
+        event.listen(self.session, "after_begin", self._on_begin)
+        event.listen(self.session, "after_flush", self._on_flush)
+        self._start_transaction()
+        return self
 
     def __exit__(self, exception_type, exception_value, traceback):
-        pass
+        if self.session.in_transaction():
+            self.rollback()
+        self.session.close()
+        if self.read_session is not None:
+            self.read_session.close()
+
+    @property
+    def listeners(self) -> List[WarehouseListener]:
+        """
+        Listeners приложения: итоги для отчетов, outbox и сводки заказов.
+        """
+        return [self.aggregates, self.outbox, self.summaries]
 
     def commit(self):
-        pass
+        """
+        Сохраняет все накопленные изменения одним flush и фиксирует транзакцию.
+        """
+        self.session.commit()
+        self._invalidate_caches()
+        self._finish_transaction(committed=True)
 
     def rollback(self):
-        pass
+        """
+        Откатывает текущую транзакцию.
+        """
+        self.session.rollback()
+        self._invalidate_caches()
+        self._finish_transaction(committed=False)
+
+    def flush(self):
+        """
+        Отправляет накопленные изменения в базу, не фиксируя транзакцию.
+        Нужен, когда id новых объектов требуются до commit.
+        """
+        self.session.flush()
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Открывает вложенную транзакцию (SAVEPOINT). Если внутри блока возникло
+        исключение, откатываются только изменения этого блока, а исключение
+        пробрасывается дальше.
+        """
+        self.stats.savepoints += 1
+        with self.session.begin_nested():
+            yield self
+
+    def _invalidate_caches(self):
+        for repo in (self.products, self.customers, self.idempotency):
+            if isinstance(
+                repo,
+                (
+                    CachedProductRepository,
+                    CachedCustomerRepository,
+                    CachedIdempotencyRepository,
+                ),
+            ):
+                repo.invalidate_pending()
+
+    def _start_transaction(self):
+        self.stats = TransactionStats()
+        self._started_at = time.perf_counter()
+
+    def _finish_transaction(self, committed: bool):
+        if self.read_session is not None:
+            # Снимок читателя отпускается вместе с транзакцией записи,
+            # чтобы следующая транзакция видела свежие данные.
+            self.read_session.rollback()
+        self.stats.wall_time = time.perf_counter() - self._started_at
+        self.stats.committed = committed
+        self.history.append(self.stats)
+        self._start_transaction()
+
+    def _on_begin(self, _session, _transaction, connection):
+        if not event.contains(connection, "before_cursor_execute", self._on_execute):
+            event.listen(connection, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *_args):
+        self.stats.statements += 1
+
+    def _on_flush(self, _session, _flush_context):
+        self.stats.flushes += 1
@@ -1,34 +1,30 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from my_hm.domain.services import WarehouseService
-from my_hm.infrastructure.orm import Base
-from my_hm.infrastructure.repositories import (
-    SqlAlchemyProductRepository,
-    SqlAlchemyOrderRepository,
-    SqlAlchemyCustomerRepository,
-)
-from my_hm.infrastructure.unit_of_work import SqlAlchemyUnitOfWork
-from my_hm.infrastructure.database import DATABASE_URL
-
-engine = create_engine(DATABASE_URL)
-SessionFactory = sessionmaker(bind=engine)
-Base.metadata.create_all(engine)
-
-
-def main():
-    session = SessionFactory()
-    product_repo = SqlAlchemyProductRepository(session)
-    order_repo = SqlAlchemyOrderRepository(session)
-    customer_repo = SqlAlchemyCustomerRepository(session)
-    uow = SqlAlchemyUnitOfWork(session)
-    warehouse_service = WarehouseService(product_repo, order_repo, customer_repo)
+import os
+from typing import Optional
+from my_hm.bootstrap import Application
+
+
+def main(app: Optional[Application] = None):
+    # Учет SQL по операциям включается переменной окружения
+    # WAREHOUSE_SQL_METRICS: любое непустое значение печатает сводку,
+    # путь к файлу .prom дополнительно сохраняет метрики в формате Prometheus.
+    sql_metrics = os.environ.get("WAREHOUSE_SQL_METRICS", "")
+    app = app or Application()
+    instrumentation = None
+    if sql_metrics:
+        from my_hm.infrastructure.instrumentation import SqlInstrumentation
+
+        instrumentation = SqlInstrumentation().install(app.database.engine)
+    uow = app.unit_of_work()
 
     with uow:
-        """Создание клиента"""
-        customer = warehouse_service.create_customer(
-            name="Bradley Pitt", email="bradley@gmail.com"
+        warehouse_service = app.service(uow)
+        if instrumentation:
+            instrumentation.instrument_service(warehouse_service)
+
+        """Создание клиента (повторный запуск обновляет существующего)"""
+        [customer] = warehouse_service.upsert_customers(
+            [("Bradley Pitt", "bradley@gmail.com")]
         )
-        print(f"Created customer: {customer}")
 
         """ Создание товаров"""
         product1 = warehouse_service.create_product(
@@ -37,6 +33,7 @@ def main():
         product2 = warehouse_service.create_product(
             name="Chair", quantity=50, price=20.0
         )
+        print(f"Created customer: {customer}")
         print(f"Created products: {product1}, {product2}")
 
         """ Создание заказа"""
@@ -54,5 +51,15 @@ def main():
         print(f"Shipped order: {shipped_order}")
 
         uow.commit()
-    if __name__ == "__main__":
-        main()
+        print(f"Orders by status: {uow.aggregates.status_totals()}")
+        print(f"Inventory: {uow.aggregates.inventory()}")
+    print(f"Transaction stats: {uow.history[-1]}")
+    if instrumentation:
+        for operation, metrics in instrumentation.snapshot().items():
+            print(f"SQL {operation}: {metrics}")
+        if sql_metrics.endswith(".prom"):
+            instrumentation.write_prometheus(sql_metrics)
+
+
+if __name__ == "__main__":
+    main()
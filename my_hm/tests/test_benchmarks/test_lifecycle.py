@@ -0,0 +1,58 @@
+"""Тестовый модуль для нагрузочного теста жизненного цикла заказа"""
+
+import pytest
+
+from my_hm.benchmarks.lifecycle import BenchmarkConfig, run_benchmark
+from my_hm.bootstrap import Application
+from my_hm.infrastructure.database import EngineConfig
+
+
+@pytest.mark.parametrize("storage", ["memory", "file", "store"])
+def test_benchmark_reports_every_operation(storage, tmp_path):
+    config = BenchmarkConfig(
+        customers=5,
+        products=20,
+        orders=10,
+        order_size=2,
+        concurrency=2,
+        storage=storage,
+        path=str(tmp_path / "bench.db"),
+    )
+
+    report = run_benchmark(config)
+
+    assert [r.operation for r in report.operations] == [
+        "create",
+        "confirm",
+        "ship",
+        "cancel",
+    ]
+    assert [r.count for r in report.operations] == [10, 10, 5, 5]
+    assert all(r.errors == 0 for r in report.operations)
+    if storage != "store":
+        assert all(r.statements_per_op > 0 for r in report.operations)
+    assert "p99 ms" in report.format()
+
+
+def test_benchmark_uses_seeded_ids_on_existing_database(tmp_path):
+    path = tmp_path / "bench.db"
+    app = Application(EngineConfig(url=f"sqlite:///{path}"))
+    with app.unit_of_work() as uow:
+        service = app.service(uow)
+        for i in range(20):
+            service.create_product(f"Sold out {i}", 0, 1.0)
+        uow.commit()
+    app.close()
+    config = BenchmarkConfig(
+        customers=5,
+        products=20,
+        orders=10,
+        order_size=2,
+        storage="file",
+        path=str(path),
+    )
+
+    report = run_benchmark(config)
+
+    assert [r.count for r in report.operations] == [10, 10, 5, 5]
+    assert all(r.errors == 0 for r in report.operations)
@@ -0,0 +1,42 @@
+"""Тестовый модуль для общих правил команд сервисов"""
+
+import pytest
+
+from my_hm.domain.commands import (
+    BulkTransition,
+    apply_transition,
+    normalize_batch,
+)
+from my_hm.domain.models import Order, OrderStatus, TransitionOutcome
+
+
+def test_normalize_batch_collects_ids_to_load():
+    customer_ids, batch, product_ids = normalize_batch([(1, [2, 2, 3]), (4, {3: 5})])
+
+    assert customer_ids == {1, 4}
+    assert batch == [(1, {2: 2, 3: 1}), (4, {3: 5})]
+    assert product_ids == {2, 3}
+
+
+def test_apply_transition_returns_previous_status():
+    order = Order(id=1, customer_id=1)
+
+    assert apply_transition(order, Order.confirm) == OrderStatus.PENDING
+    assert order.status == OrderStatus.CONFIRMED
+    with pytest.raises(ValueError, match="Заказ не найден"):
+        apply_transition(None, Order.confirm)
+
+
+def test_bulk_transition_stops_when_every_order_moved():
+    plan = BulkTransition([3, 1, 3, 2], OrderStatus.CANCELLED)
+    steps = plan.steps()
+
+    assert next(steps) == OrderStatus.PENDING
+    plan.applied([1])
+    assert next(steps) == OrderStatus.CONFIRMED
+    plan.applied([3, 2])
+    assert not list(steps)
+
+    report = plan.finish({})
+    assert list(report.outcomes) == [3, 1, 2]
+    assert set(report.outcomes.values()) == {TransitionOutcome.APPLIED}
@@ -1,8 +1,18 @@
 """Тестовый модуль для models"""
 
+import copy
+import pickle
+
 import pytest
 
-from my_hm.domain.models import Product, Order, Customer, OrderStatus
+from my_hm.domain.models import (
+    Product,
+    Order,
+    OrderLine,
+    Customer,
+    OrderStatus,
+    LazyOrder,
+)
 
 
 def test_customer_creation():
@@ -39,6 +49,7 @@ def test_order_creation():
     assert order.status == OrderStatus.PENDING
     assert order.total_price == 0.0
     assert order.products == []
+    assert order.lines == []
 
 
 def test_order_add_product():
@@ -46,10 +57,35 @@ def test_order_add_product():
     order = Order()
     order.add_product(product, quantity=2)
     assert len(order.products) == 1
+    assert order.lines == [OrderLine(product_id=1, quantity=2, unit_price=20.0)]
     assert order.total_price == 40.0
     assert product.quantity == 3
 
 
+def test_order_add_same_product_merges_line():
+    product = Product(id=1, name="Chair", quantity=600, price=20.0)
+    order = Order()
+    order.add_product(product, quantity=500)
+    order.add_product(product, quantity=1)
+    assert order.lines == [OrderLine(product_id=1, quantity=501, unit_price=20.0)]
+    assert len(order.products) == 1
+    assert order.quantities() == {1: 501}
+    assert product.quantity == 99
+
+
+def test_order_add_product_invalid_quantity():
+    product = Product(id=1, name="Chair", quantity=5, price=20.0)
+    order = Order()
+    with pytest.raises(ValueError, match="Количество должно быть положительным числом"):
+        order.add_product(product, quantity=0)
+
+
+def test_order_line_is_compact():
+    line = OrderLine(product_id=1, quantity=3, unit_price=20.0)
+    assert not hasattr(line, "__dict__")
+    assert line.total_price == 60.0
+
+
 def test_order_add_product_insufficient_stock():
     product = Product(id=1, name="Chair", quantity=1, price=20.0)
     order = Order()
@@ -87,8 +123,18 @@ def test_order_ship_invalid_status():
 
 
 def test_order_cancel():
+    product = Product(id=1, name="Chair", quantity=3, price=20.0)
+    order = Order(status=OrderStatus.PENDING)
+    order.add_product(product, quantity=2)
+    order.cancel()
+    assert order.status == OrderStatus.CANCELLED
+    assert product.quantity == 3
+
+
+def test_order_cancel_without_lines_restores_one_unit_per_product():
     product = Product(id=1, name="Chair", quantity=3, price=20.0)
     order = Order(status=OrderStatus.PENDING, products=[product])
+    assert order.lines == [OrderLine(1, 1, 20.0)]
     order.cancel()
     assert order.status == OrderStatus.CANCELLED
     assert product.quantity == 4
@@ -105,3 +151,45 @@ def test_order_status_enum():
     assert OrderStatus.CONFIRMED.value == "confirmed"
     assert OrderStatus.SHIPPED.value == "shipped"
     assert OrderStatus.CANCELLED.value == "cancelled"
+
+
+def test_models_use_slots():
+    product = Product(id=1, name="Chair", quantity=3, price=20.0)
+    assert not hasattr(product, "__dict__")
+    with pytest.raises(AttributeError):
+        product.color = "red"
+
+
+def test_lazy_order_loads_products_once():
+    calls = []
+
+    def load():
+        calls.append(1)
+        return [Product(id=1, name="Chair", quantity=3, price=20.0)]
+
+    order = LazyOrder(id=1, lines=[OrderLine(1, 2, 20.0)], load_products=load)
+    assert not order.products_loaded
+    products = order.products
+    assert [p.name for p in products] == ["Chair"]
+    assert order.products is products
+    assert len(calls) == 1
+
+
+def test_lazy_order_cancel_does_not_load_products():
+    order = LazyOrder(id=1, lines=[OrderLine(1, 2, 20.0)], load_products=pytest.fail)
+    order.cancel()
+    assert order.status == OrderStatus.CANCELLED
+    assert not order.products_loaded
+
+
+def test_lazy_order_copies_are_plain_orders():
+    order = LazyOrder(
+        id=1,
+        lines=[OrderLine(1, 2, 20.0)],
+        load_products=lambda: [Product(id=1, name="Chair", quantity=3, price=20.0)],
+    )
+    for clone in (copy.deepcopy(order), pickle.loads(pickle.dumps(order))):
+        assert isinstance(clone, Order)
+        assert not isinstance(clone, LazyOrder)
+        assert clone.id == 1
+        assert [p.name for p in clone.products] == ["Chair"]
@@ -1,8 +1,19 @@
 """Тестовый модуль для services"""
 from unittest.mock import Mock
 import pytest
-from my_hm.domain.models import Product, Order, Customer, OrderStatus
-from my_hm.domain.services import WarehouseService
+from my_hm.domain.models import (
+    Product,
+    Order,
+    OrderLine,
+    Customer,
+    OrderStatus,
+    CatalogQuery,
+    IdempotencyRecord,
+    ProductPage,
+)
+from my_hm.domain.exceptions import ConcurrencyConflictError
+from my_hm.domain.commands import command_fingerprint
+from my_hm.domain.services import RetryPolicy, WarehouseService
 
 
 @pytest.fixture
@@ -15,6 +26,7 @@ def mock_repos():
 
 def test_create_customer(mock_repos):
     product_repo, order_repo, customer_repo = mock_repos
+    customer_repo.get_by_email.return_value = None
     customer_repo.add.return_value = Customer(
         id=1, name="Bradley", email="bradley@gmail.com"
     )
@@ -27,6 +39,18 @@ def test_create_customer(mock_repos):
     customer_repo.add.assert_called_once()
 
 
+def test_create_customer_duplicate_email(mock_repos):
+    product_repo, order_repo, customer_repo = mock_repos
+    customer_repo.get_by_email.return_value = Customer(
+        id=1, name="Bradley", email="bradley@gmail.com"
+    )
+
+    service = WarehouseService(product_repo, order_repo, customer_repo)
+    with pytest.raises(ValueError, match="уже существует"):
+        service.create_customer("Brad", "bradley@gmail.com")
+    customer_repo.add.assert_not_called()
+
+
 def test_create_product(mock_repos):
     product_repo, order_repo, customer_repo = mock_repos
     product_repo.add.return_value = Product(
@@ -43,29 +67,98 @@ def test_create_product(mock_repos):
 
 def test_create_order(mock_repos):
     product_repo, order_repo, customer_repo = mock_repos
-    customer_repo.get.return_value = Customer(id=1, name="Bradley")
-    product_repo.get.return_value = Product(id=2, name="Chair", quantity=5, price=20.0)
-    order_repo.add.return_value = Order(
-        id=3,
-        customer_id=1,
-        products=[Product(id=2, quantity=4, price=20.0)],
-        total_price=20.0,
-    )
+    customer_repo.get_many.return_value = {1: Customer(id=1, name="Bradley")}
+    product_repo.get_many.return_value = {
+        2: Product(id=2, name="Chair", quantity=5, price=20.0)
+    }
+    product_repo.reserve_stock.return_value = []
+    order_repo.add_many.side_effect = lambda orders: orders
 
     service = WarehouseService(product_repo, order_repo, customer_repo)
     order = service.create_order(1, [2])
 
-    assert order.id == 3
     assert order.customer_id == 1
     assert len(order.products) == 1
-    customer_repo.get.assert_called_once_with(1)
-    product_repo.get.assert_called_once_with(2)
-    order_repo.add.assert_called_once()
+    assert order.total_price == 20.0
+    customer_repo.get_many.assert_called_once_with({1})
+    product_repo.get_many.assert_called_once_with({2})
+    order_repo.add_many.assert_called_once()
+
+
+def test_create_order_with_quantities(mock_repos):
+    product_repo, order_repo, customer_repo = mock_repos
+    customer_repo.get_many.return_value = {1: Customer(id=1, name="Bradley")}
+    product_repo.get_many.return_value = {
+        2: Product(id=2, name="Chair", quantity=600, price=20.0)
+    }
+    product_repo.reserve_stock.return_value = []
+    order_repo.add_many.side_effect = lambda orders: orders
+
+    service = WarehouseService(product_repo, order_repo, customer_repo)
+    order = service.create_order(1, {2: 500})
+
+    assert order.lines == [OrderLine(product_id=2, quantity=500, unit_price=20.0)]
+    assert order.total_price == 10000.0
+    product_repo.reserve_stock.assert_called_once_with({2: 500})
+
+
+def test_create_orders_loads_batch_once(mock_repos):
+    product_repo, order_repo, customer_repo = mock_repos
+    customer_repo.get_many.return_value = {
+        1: Customer(id=1, name="Bradley"),
+        2: Customer(id=2, name="Angelina"),
+    }
+    product_repo.get_many.return_value = {
+        10: Product(id=10, name="Chair", quantity=5, price=20.0),
+        11: Product(id=11, name="Table", quantity=1, price=1000.0),
+    }
+    product_repo.reserve_stock.return_value = []
+    order_repo.add_many.side_effect = lambda orders: orders
+
+    service = WarehouseService(product_repo, order_repo, customer_repo)
+    orders = service.create_orders([(1, [10, 11]), (2, [10, 10])])
+
+    assert [o.customer_id for o in orders] == [1, 2]
+    assert orders[0].total_price == 1020.0
+    assert orders[1].total_price == 40.0
+    customer_repo.get_many.assert_called_once_with({1, 2})
+    product_repo.get_many.assert_called_once_with({10, 11})
+    product_repo.reserve_stock.assert_called_once_with({10: 3, 11: 1})
+    product_repo.get.assert_not_called()
+    order_repo.add_many.assert_called_once()
+
+
+def test_create_orders_shares_stock_across_batch(mock_repos):
+    product_repo, order_repo, customer_repo = mock_repos
+    customer_repo.get_many.return_value = {1: Customer(id=1, name="Bradley")}
+    product_repo.get_many.return_value = {
+        11: Product(id=11, name="Table", quantity=1, price=1000.0)
+    }
+
+    service = WarehouseService(product_repo, order_repo, customer_repo)
+    with pytest.raises(ValueError, match="Продукт 11 недоступен"):
+        service.create_orders([(1, [11]), (1, [11])])
+    order_repo.add_many.assert_not_called()
+
+
+def test_create_order_reservation_failed(mock_repos):
+    product_repo, order_repo, customer_repo = mock_repos
+    customer_repo.get_many.return_value = {1: Customer(id=1, name="Bradley")}
+    product_repo.get_many.return_value = {
+        2: Product(id=2, name="Chair", quantity=5, price=20.0)
+    }
+    product_repo.reserve_stock.return_value = [2]
+
+    service = WarehouseService(product_repo, order_repo, customer_repo)
+    with pytest.raises(ValueError, match="Продукт 2 недоступен"):
+        service.create_order(1, [2])
+    order_repo.add_many.assert_not_called()
 
 
 def test_create_order_customer_not_found(mock_repos):
     product_repo, order_repo, customer_repo = mock_repos
-    customer_repo.get.return_value = None
+    customer_repo.get_many.return_value = {}
+    product_repo.get_many.return_value = {}
 
     service = WarehouseService(product_repo, order_repo, customer_repo)
     with pytest.raises(ValueError, match="Клиент не найден"):
@@ -75,7 +168,9 @@ def test_create_order_customer_not_found(mock_repos):
 def test_confirm_order(mock_repos):
     product_repo, order_repo, customer_repo = mock_repos
     order = Order(
-     id=1, status=OrderStatus.PENDING, products=[Product(id=2, quantity=4, price=600.0)]
+        id=1,
+        status=OrderStatus.PENDING,
+        products=[Product(id=2, quantity=4, price=600.0)],
     )
     order_repo.get.return_value = order
 
@@ -83,7 +178,7 @@ def test_confirm_order(mock_repos):
     confirmed = service.confirm_order(1)
 
     assert confirmed.status == OrderStatus.CONFIRMED
-    product_repo.update.assert_called_once()
+    product_repo.update.assert_not_called()
     order_repo.update.assert_called_once()
 
 
@@ -111,7 +206,10 @@ def test_ship_order(mock_repos):
 def test_cancel_order(mock_repos):
     product_repo, order_repo, customer_repo = mock_repos
     order = Order(
-        id=1, status=OrderStatus.PENDING, products=[Product(id=2, quantity=4, price=900.0)]
+        id=1,
+        status=OrderStatus.PENDING,
+        products=[Product(id=2, quantity=4, price=900.0)],
+        lines=[OrderLine(product_id=2, quantity=3, unit_price=900.0)],
     )
     order_repo.get.return_value = order
 
@@ -119,18 +217,138 @@ def test_cancel_order(mock_repos):
     cancelled = service.cancel_order(1)
 
     assert cancelled.status == OrderStatus.CANCELLED
-    product_repo.update.assert_called_once()
+    product_repo.release_stock.assert_called_once_with({2: 3})
     order_repo.update.assert_called_once()
 
 
+def test_cancel_order_notifies_listeners(mock_repos):
+    product_repo, order_repo, customer_repo = mock_repos
+    order = Order(
+        id=1,
+        status=OrderStatus.CONFIRMED,
+        products=[Product(id=2, quantity=4, price=900.0)],
+        lines=[OrderLine(product_id=2, quantity=3, unit_price=900.0)],
+    )
+    order_repo.get.return_value = order
+    listener = Mock()
+
+    service = WarehouseService(
+        product_repo, order_repo, customer_repo, listeners=[listener]
+    )
+    service.cancel_order(1)
+
+    listener.stock_changed.assert_called_once_with({2: 3})
+    listener.order_status_changed.assert_called_once_with(order, OrderStatus.CONFIRMED)
+
+
+def test_confirm_order_retries_on_conflict(mock_repos):
+    product_repo, order_repo, customer_repo = mock_repos
+    order_repo.get.side_effect = lambda order_id: Order(
+        id=order_id, status=OrderStatus.PENDING
+    )
+    order_repo.update.side_effect = [ConcurrencyConflictError("OrderORM", 1, 1), None]
+
+    service = WarehouseService(product_repo, order_repo, customer_repo)
+    service.retry_policy = RetryPolicy(backoff=0)
+    confirmed = service.confirm_order(1)
+
+    assert confirmed.status == OrderStatus.CONFIRMED
+    assert order_repo.get.call_count == 2
+
+
+def test_cancel_order_gives_up_after_retries(mock_repos):
+    product_repo, order_repo, customer_repo = mock_repos
+    order_repo.get.side_effect = lambda order_id: Order(
+        id=order_id, status=OrderStatus.PENDING
+    )
+    order_repo.update.side_effect = ConcurrencyConflictError("OrderORM", 1, 1)
+
+    service = WarehouseService(product_repo, order_repo, customer_repo)
+    service.retry_policy = RetryPolicy(attempts=2, backoff=0)
+    with pytest.raises(ConcurrencyConflictError):
+        service.cancel_order(1)
+
+    assert order_repo.update.call_count == 2
+    product_repo.release_stock.assert_not_called()
+
+
+def _confirm_fingerprint(order_id):
+    return command_fingerprint("confirm_order", order_id)
+
+
+def test_confirm_order_with_idempotency_key(mock_repos):
+    product_repo, order_repo, customer_repo = mock_repos
+    idempotency_repo = Mock()
+    idempotency_repo.get.return_value = None
+    order_repo.get.return_value = Order(id=1, customer_id=2, status=OrderStatus.PENDING)
+
+    service = WarehouseService(
+        product_repo, order_repo, customer_repo, idempotency_repo=idempotency_repo
+    )
+    order = service.confirm_order(1, idempotency_key="req-1")
+
+    assert order.status == OrderStatus.CONFIRMED
+    key, command, _, saved = idempotency_repo.save.call_args.args
+    assert (key, command, saved) == ("req-1", "confirm_order", order)
+
+
+def test_retried_command_returns_stored_response(mock_repos):
+    product_repo, order_repo, customer_repo = mock_repos
+    order = Order(
+        id=7,
+        customer_id=2,
+        status=OrderStatus.CONFIRMED,
+        total_price=40.0,
+        lines=[OrderLine(3, 2, 20.0)],
+    )
+    idempotency_repo = Mock()
+    service = WarehouseService(
+        product_repo, order_repo, customer_repo, idempotency_repo=idempotency_repo
+    )
+    idempotency_repo.get.return_value = IdempotencyRecord.for_order(
+        "req-1", "confirm_order", _confirm_fingerprint(7), order
+    )
+    replayed = service.confirm_order(7, idempotency_key="req-1")
+
+    assert (replayed.id, replayed.status, replayed.lines) == (
+        7,
+        OrderStatus.CONFIRMED,
+        [OrderLine(3, 2, 20.0)],
+    )
+    order_repo.get.assert_not_called()
+    order_repo.update.assert_not_called()
+    product_repo.get_many.assert_not_called()
+    idempotency_repo.save.assert_not_called()
+
+
+def test_idempotency_key_reused_with_other_arguments(mock_repos):
+    product_repo, order_repo, customer_repo = mock_repos
+    idempotency_repo = Mock()
+    idempotency_repo.get.return_value = IdempotencyRecord.for_order(
+        "req-1", "confirm_order", _confirm_fingerprint(7), Order(id=7)
+    )
+    service = WarehouseService(
+        product_repo, order_repo, customer_repo, idempotency_repo=idempotency_repo
+    )
+
+    with pytest.raises(ValueError, match="другими параметрами"):
+        service.confirm_order(8, idempotency_key="req-1")
+    with pytest.raises(ValueError, match="другими параметрами"):
+        service.ship_order(7, idempotency_key="req-1")
+    with pytest.raises(ValueError, match="не подключено"):
+        WarehouseService(product_repo, order_repo, customer_repo).confirm_order(
+            7, idempotency_key="req-1"
+        )
+    order_repo.get.assert_not_called()
+
+
 def test_get_available_products(mock_repos):
     product_repo, order_repo, customer_repo = mock_repos
     products = [
-        Product(id=1, quantity=5,  price=130.0),
-        Product(id=2, quantity=0,  price=90.0),
-        Product(id=3, quantity=10,  price=210.0),
+        Product(id=1, quantity=5, price=130.0),
+        Product(id=3, quantity=10, price=210.0),
     ]
-    product_repo.list.return_value = products
+    product_repo.find.return_value = ProductPage(items=products)
 
     service = WarehouseService(product_repo, order_repo, customer_repo)
     available = service.get_available_products()
@@ -138,3 +356,5 @@ def test_get_available_products(mock_repos):
     assert len(available) == 2
     assert available[0].id == 1
     assert available[1].id == 3
+    product_repo.find.assert_called_once_with(CatalogQuery(in_stock=True, limit=None))
+    product_repo.list.assert_not_called()
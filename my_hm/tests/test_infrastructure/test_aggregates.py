@@ -0,0 +1,158 @@
+"""Тесты денормализованных итогов по заказам и складу"""
+
+import pytest
+from sqlalchemy import event
+
+from my_hm.bootstrap import ensure_schema
+from my_hm.domain.models import OrderStatus, Totals
+from my_hm.domain.services import WarehouseService
+from my_hm.infrastructure.aggregates import SqlAlchemyAggregates
+from my_hm.infrastructure.orm import Base
+from my_hm.infrastructure.repositories import (
+    SqlAlchemyCustomerRepository,
+    SqlAlchemyOrderRepository,
+    SqlAlchemyProductRepository,
+)
+from my_hm.tests.test_infrastructure.test_repositories import count_statements
+
+
+@pytest.fixture
+def aggregates(session):
+    return SqlAlchemyAggregates(session)
+
+
+@pytest.fixture
+def service(session, aggregates):
+    return WarehouseService(
+        SqlAlchemyProductRepository(session),
+        SqlAlchemyOrderRepository(session),
+        SqlAlchemyCustomerRepository(session),
+        listeners=[aggregates],
+    )
+
+
+def snapshot(aggregates, customer_ids, product_ids):
+    return (
+        aggregates.status_totals(),
+        [aggregates.customer_totals(cid) for cid in customer_ids],
+        [aggregates.product_totals(pid) for pid in product_ids],
+        aggregates.inventory(),
+    )
+
+
+def test_lifecycle_updates_totals_incrementally(service, aggregates):
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    table = service.create_product("Table", 10, 100.0)
+    chair = service.create_product("Chair", 50, 20.0)
+    assert aggregates.inventory() == Totals(60, 2000.0)
+
+    first = service.create_order(customer.id, {table.id: 2, chair.id: 4})
+    second = service.create_order(customer.id, [chair.id])
+    service.confirm_order(first.id)
+    service.ship_order(first.id)
+    service.cancel_order(second.id)
+
+    totals = aggregates.status_totals()
+    assert totals[OrderStatus.SHIPPED] == Totals(1, 280.0)
+    assert totals[OrderStatus.CANCELLED] == Totals(1, 20.0)
+    assert totals[OrderStatus.PENDING] == Totals(0, 0.0)
+    assert aggregates.customer_totals(customer.id) == Totals(1, 280.0)
+    assert aggregates.product_totals(chair.id) == Totals(4, 80.0)
+    assert aggregates.inventory() == Totals(54, 1720.0)
+
+
+def test_incremental_totals_match_rebuild(service, aggregates):
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    products = [service.create_product(f"P{i}", 20, 10.0 + i) for i in range(3)]
+    product_ids = [p.id for p in products]
+    orders = service.create_orders(
+        [
+            (customer.id, {product_ids[0]: 3, product_ids[1]: 1}),
+            (customer.id, product_ids),
+        ]
+    )
+    service.confirm_order(orders[0].id)
+    service.cancel_order(orders[1].id)
+
+    incremental = snapshot(aggregates, [customer.id], product_ids)
+    aggregates.rebuild()
+
+    assert snapshot(aggregates, [customer.id], product_ids) == incremental
+
+
+def test_reading_totals_is_single_statement(engine, service, aggregates):
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    product = service.create_product("Table", 10, 100.0)
+    for _ in range(5):
+        service.create_order(customer.id, [product.id])
+
+    statements = count_statements(engine)
+    assert aggregates.customer_totals(customer.id) == Totals(5, 500.0)
+    assert len(statements) == 1
+
+
+def test_bulk_transitions_match_rebuild(service, aggregates):
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    product = service.create_product("Table", 50, 10.0)
+    orders = service.create_orders([(customer.id, {product.id: 2})] * 6)
+    order_ids = [order.id for order in orders]
+    service.confirm_orders(order_ids[:4])
+    service.ship_orders(order_ids[:2])
+    service.cancel_orders(order_ids)
+
+    incremental = snapshot(aggregates, [customer.id], [product.id])
+    assert incremental[0][OrderStatus.CANCELLED] == Totals(4, 80.0)
+    assert incremental[3] == Totals(46, 460.0)
+    aggregates.rebuild()
+
+    assert snapshot(aggregates, [customer.id], [product.id]) == incremental
+
+
+def test_large_cancel_stays_under_sqlite_variable_limit(engine, service):
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    products = [service.create_product(f"P{i}", 5, 1.0) for i in range(1200)]
+    order = service.create_order(customer.id, {p.id: 2 for p in products})
+    parameters = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, params, context, many: parameters.append(
+            0 if many else len(params)
+        ),
+    )
+
+    service.cancel_order(order.id)
+
+    # 999 — лимит параметров SQLite до версии 3.32
+    assert max(parameters) < 999
+    assert {
+        p.quantity
+        for p in service.product_repo.get_many([p.id for p in products]).values()
+    } == {5}
+
+
+def test_totals_are_filled_when_tables_are_created(engine, session):
+    plain = WarehouseService(
+        SqlAlchemyProductRepository(session),
+        SqlAlchemyOrderRepository(session),
+        SqlAlchemyCustomerRepository(session),
+    )
+    customer = plain.create_customer("Bradley", "bradley@gmail.com")
+    chair = plain.create_product("Chair", 10, 20.0)
+    order = plain.create_order(customer.id, {chair.id: 2})
+    session.commit()
+    aggregates = SqlAlchemyAggregates(session)
+    for name in SqlAlchemyAggregates.tables:
+        Base.metadata.tables[name].drop(engine)
+
+    assert ensure_schema(engine)
+    service = WarehouseService(
+        plain.product_repo, plain.order_repo, plain.customer_repo, [aggregates]
+    )
+    service.cancel_order(order.id)
+
+    totals = aggregates.status_totals()
+    assert totals[OrderStatus.PENDING] == Totals(0, 0.0)
+    assert totals[OrderStatus.CANCELLED] == Totals(1, 40.0)
+    assert aggregates.customer_totals(customer.id) == Totals(0, 0.0)
+    assert aggregates.inventory() == Totals(10, 200.0)
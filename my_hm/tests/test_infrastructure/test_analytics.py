@@ -0,0 +1,93 @@
+"""Тесты векторных отчетов по складу и заказам"""
+
+import numpy as np
+import pytest
+
+from my_hm.domain.models import OrderStatus, Totals
+from my_hm.infrastructure.aggregates import SqlAlchemyAggregates
+from my_hm.infrastructure.analytics import WarehouseAnalytics
+from my_hm.tests.test_infrastructure.test_repositories import make_service
+
+
+@pytest.fixture
+def seeded(session):
+    aggregates = SqlAlchemyAggregates(session)
+    service = make_service(session)
+    service.listeners.append(aggregates)
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    table = service.create_product("Table", 10, 1000.0)
+    chair = service.create_product("Chair", 50, 20.0)
+    lamp = service.create_product("Lamp", 3, 40.0)
+    service.create_product("Sofa", 0, 700.0)
+    orders = service.create_orders(
+        [
+            (customer.id, {table.id: 1, chair.id: 4}),
+            (customer.id, {chair.id: 2}),
+            (customer.id, {lamp.id: 1}),
+            (customer.id, {table.id: 2}),
+        ]
+    )
+    service.confirm_order(orders[0].id)
+    service.ship_order(orders[0].id)
+    service.cancel_order(orders[3].id)
+    session.commit()
+    return aggregates, table, chair, lamp
+
+
+def test_reports_match_incremental_totals(session, seeded):
+    aggregates, table, chair, lamp = seeded
+    analytics = WarehouseAnalytics(session, chunk_size=2)
+
+    assert analytics.inventory_value() == aggregates.inventory()
+    assert analytics.status_histogram() == aggregates.status_totals()
+    assert analytics.revenue_by_product() == {
+        pid: aggregates.product_totals(pid).amount
+        for pid in (table.id, chair.id, lamp.id)
+    }
+
+
+def test_reorder_candidates_and_top_products(session, seeded):
+    _, table, chair, lamp = seeded
+    analytics = WarehouseAnalytics(session)
+
+    assert analytics.reorder_candidates(5) == [(4, 0), (lamp.id, 2)]
+    # отмененный заказ на два стола в выручку не входит
+    assert analytics.top_products_by_revenue(2) == [
+        (table.id, 1000.0),
+        (chair.id, 120.0),
+    ]
+    assert analytics.top_products_by_revenue(10)[-1] == (lamp.id, 40.0)
+    assert not analytics.top_products_by_revenue(0)
+
+
+@pytest.mark.usefixtures("seeded")
+def test_order_size_histogram(session):
+    analytics = WarehouseAnalytics(session)
+
+    counts, edges = analytics.order_size_histogram(bins=[0, 2, 4, 10])
+    assert counts.tolist() == [1, 1, 1]
+    counts, _ = analytics.order_size_histogram(
+        bins=[0, 2, 4, 10], include_cancelled=True
+    )
+    assert counts.tolist() == [1, 2, 1]
+    assert edges.tolist() == [0, 2, 4, 10]
+
+
+@pytest.mark.usefixtures("seeded")
+def test_columns_are_cached_until_refresh(session):
+    analytics = WarehouseAnalytics(session)
+    before = analytics.inventory_value()
+    make_service(session).create_product("Shelf", 1, 50.0)
+
+    assert analytics.inventory_value() == before
+    analytics.refresh()
+    assert analytics.inventory_value() == Totals(before.count + 1, before.amount + 50)
+
+
+def test_empty_database(session):
+    analytics = WarehouseAnalytics(session)
+
+    assert analytics.inventory_value() == Totals()
+    assert not analytics.top_products_by_revenue(3)
+    assert analytics.status_histogram()[OrderStatus.PENDING] == Totals()
+    assert np.array_equal(analytics.order_lines().statuses, [])
@@ -0,0 +1,194 @@
+"""Тестовый модуль для асинхронных репозиториев и AsyncWarehouseService"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from my_hm.domain.async_services import AsyncWarehouseService
+from my_hm.domain.events import EventType
+from my_hm.domain.models import CatalogQuery, OrderStatus, Totals
+from my_hm.infrastructure.async_unit_of_work import AsyncSqlAlchemyUnitOfWork
+from my_hm.infrastructure.orm import Base
+from my_hm.infrastructure.outbox import OutboxConsumer
+
+# Драйвер нужен только при подключении, импорты выше от него не зависят.
+pytest.importorskip("aiosqlite")
+
+
+async def make_session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
+
+
+def service_for(uow):
+    return AsyncWarehouseService(uow.products, uow.orders, uow.customers)
+
+
+def aggregates_snapshot(aggregates, customer_ids, product_ids):
+    return (
+        aggregates.status_totals(),
+        [aggregates.customer_totals(cid) for cid in customer_ids],
+        [aggregates.product_totals(pid) for pid in product_ids],
+        aggregates.inventory(),
+    )
+
+
+def test_async_order_lifecycle(tmp_path):
+    async def scenario():
+        engine, session_factory = await make_session_factory(tmp_path)
+        async with AsyncSqlAlchemyUnitOfWork(session_factory) as uow:
+            service = service_for(uow)
+            customer = await service.create_customer("Bradley", "bradley@gmail.com")
+            chair = await service.create_product("Chair", 5, 20.0)
+            await service.create_product("Chest", 0, 150.0)
+            order = await service.create_order(customer.id, {chair.id: 3})
+            await uow.commit()
+
+        async with AsyncSqlAlchemyUnitOfWork(session_factory) as uow:
+            service = service_for(uow)
+            assert (await uow.products.get(chair.id)).quantity == 2
+            confirmed = await service.confirm_order(order.id)
+            cancelled = await service.cancel_order(order.id)
+            await uow.commit()
+
+        async with AsyncSqlAlchemyUnitOfWork(session_factory) as uow:
+            service = service_for(uow)
+            available = await service.get_available_products()
+            orders = [o async for o in uow.orders.iter_orders(batch_size=1)]
+        await engine.dispose()
+        return order, confirmed, cancelled, available, orders
+
+    order, confirmed, cancelled, available, orders = asyncio.run(scenario())
+
+    assert order.total_price == 60.0
+    assert confirmed.status == OrderStatus.CONFIRMED
+    assert cancelled.status == OrderStatus.CANCELLED
+    assert [p.name for p in available] == ["Chair"]
+    assert available[0].quantity == 5
+    assert [o.quantities() for o in orders] == [{order.lines[0].product_id: 3}]
+
+
+def test_async_reservation_failure_and_search(tmp_path):
+    async def scenario():
+        engine, session_factory = await make_session_factory(tmp_path)
+        async with AsyncSqlAlchemyUnitOfWork(session_factory) as uow:
+            service = service_for(uow)
+            customer = await service.create_customer("Bradley", "bradley@gmail.com")
+            table = await service.create_product("Table", 1, 1000.0)
+            with pytest.raises(ValueError, match="Недостаточно Table на складе"):
+                await service.create_order(customer.id, {table.id: 2})
+            page = await service.search_products(CatalogQuery(name_prefix="Ta"))
+        await engine.dispose()
+        return page
+
+    page = asyncio.run(scenario())
+    assert [p.name for p in page.items] == ["Table"]
+
+
+def test_async_service_keeps_totals_current(tmp_path):
+    async def scenario():
+        engine, session_factory = await make_session_factory(tmp_path)
+        async with AsyncSqlAlchemyUnitOfWork(session_factory) as uow:
+            service = AsyncWarehouseService(
+                uow.products, uow.orders, uow.customers, listeners=uow.listeners
+            )
+            customer = await service.create_customer("Bradley", "bradley@gmail.com")
+            table = await service.create_product("Table", 10, 100.0)
+            chair = await service.create_product("Chair", 50, 20.0)
+            first = await service.create_order(customer.id, {table.id: 2, chair.id: 4})
+            others = await service.create_orders([(customer.id, [chair.id])] * 4)
+            other_ids = [order.id for order in others]
+            await service.confirm_order(first.id)
+            await service.ship_order(first.id)
+            await service.confirm_orders(other_ids[:2])
+            await service.cancel_order(other_ids[0])
+            await service.cancel_orders(other_ids[1:3])
+            await service.expire_pending_orders(datetime.max)
+            await uow.commit()
+
+        async with AsyncSqlAlchemyUnitOfWork(session_factory) as uow:
+            ids = ([customer.id], [table.id, chair.id])
+            incremental = await uow.session.run_sync(
+                lambda _: aggregates_snapshot(uow.aggregates, *ids)
+            )
+            await uow.session.run_sync(lambda _: uow.aggregates.rebuild())
+            rebuilt = await uow.session.run_sync(
+                lambda _: aggregates_snapshot(uow.aggregates, *ids)
+            )
+        await engine.dispose()
+        return incremental, rebuilt
+
+    incremental, rebuilt = asyncio.run(scenario())
+
+    statuses, [customer_totals], _, inventory = incremental
+    assert statuses[OrderStatus.SHIPPED] == Totals(1, 280.0)
+    assert statuses[OrderStatus.CANCELLED] == Totals(4, 80.0)
+    assert customer_totals == Totals(1, 280.0)
+    assert inventory == Totals(54, 1720.0)
+    assert rebuilt == incremental
+
+
+def test_async_service_writes_outbox_events(tmp_path):
+    async def scenario():
+        engine, session_factory = await make_session_factory(tmp_path)
+        async with AsyncSqlAlchemyUnitOfWork(session_factory) as uow:
+            service = AsyncWarehouseService(
+                uow.products, uow.orders, uow.customers, listeners=uow.listeners
+            )
+            customer = await service.create_customer("Bradley", "bradley@gmail.com")
+            chair = await service.create_product("Chair", 5, 20.0)
+            order = await service.create_order(customer.id, {chair.id: 2})
+            await service.cancel_orders([order.id])
+            await uow.commit()
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'async.db'}")
+    events = OutboxConsumer(sessionmaker(bind=engine), "billing").poll()
+    engine.dispose()
+    assert [event.event_type for event in events] == [
+        EventType.PRODUCT_CREATED,
+        EventType.STOCK_CHANGED,
+        EventType.ORDER_CREATED,
+        EventType.ORDER_STATUS_CHANGED,
+        EventType.STOCK_CHANGED,
+    ]
+    assert events[3].payload["status"] == "cancelled"
+
+
+def test_async_service_keeps_order_summaries(tmp_path):
+    async def scenario():
+        engine, session_factory = await make_session_factory(tmp_path)
+        async with AsyncSqlAlchemyUnitOfWork(session_factory) as uow:
+            service = AsyncWarehouseService(
+                uow.products, uow.orders, uow.customers, listeners=uow.listeners
+            )
+            customer = await service.create_customer("Bradley", "bradley@gmail.com")
+            chair = await service.create_product("Chair", 10, 20.0)
+            orders = await service.create_orders(
+                [(customer.id, {chair.id: 2}), (customer.id, [chair.id])]
+            )
+            await service.confirm_order(orders[0].id)
+            await service.cancel_orders([orders[1].id])
+            await uow.commit()
+
+        async with AsyncSqlAlchemyUnitOfWork(session_factory) as uow:
+            page = await uow.session.run_sync(
+                lambda _: uow.summaries.customer_history(customer.id)
+            )
+        await engine.dispose()
+        return page.items
+
+    summaries = asyncio.run(scenario())
+
+    assert [(s.status, s.item_count, s.total_price) for s in summaries] == [
+        (OrderStatus.CANCELLED, 1, 20.0),
+        (OrderStatus.CONFIRMED, 2, 40.0),
+    ]
@@ -0,0 +1,128 @@
+"""Тесты обновления схемы существующих баз и общих кэшей приложения"""
+
+import pytest
+from sqlalchemy import create_engine
+
+from my_hm.__main__ import run
+from my_hm.bootstrap import Application, ensure_schema
+from my_hm.domain.models import OrderStatus, Totals
+from my_hm.infrastructure.database import EngineConfig
+
+# Схема первой версии приложения: без версий, количеств в строках заказа
+# и уникального email; повторный продукт в заказе — повторная строка.
+BASELINE_SCHEMA = [
+    "CREATE TABLE customers (id INTEGER NOT NULL, name VARCHAR, email VARCHAR, "
+    "PRIMARY KEY (id))",
+    "CREATE TABLE products (id INTEGER NOT NULL, name VARCHAR, quantity INTEGER, "
+    "price FLOAT, PRIMARY KEY (id))",
+    "CREATE TABLE orders (id INTEGER NOT NULL, customer_id INTEGER, "
+    "status VARCHAR, total_price FLOAT, PRIMARY KEY (id), "
+    "FOREIGN KEY(customer_id) REFERENCES customers (id))",
+    "CREATE TABLE order_product_associations (order_id INTEGER, "
+    "product_id INTEGER, FOREIGN KEY(order_id) REFERENCES orders (id), "
+    "FOREIGN KEY(product_id) REFERENCES products (id))",
+]
+
+
+def test_new_columns_and_indexes_are_added_to_existing_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'warehouse.db'}")
+    ensure_schema(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX ix_orders_status_created_at")
+        connection.exec_driver_sql("ALTER TABLE orders DROP COLUMN created_at")
+        connection.exec_driver_sql("PRAGMA user_version = 0")
+
+    assert ensure_schema(engine)
+    with engine.connect() as connection:
+        columns = connection.exec_driver_sql("PRAGMA table_info(orders)").fetchall()
+        indexes = connection.exec_driver_sql("PRAGMA index_list(orders)").fetchall()
+    assert "created_at" in [column[1] for column in columns]
+    assert "ix_orders_status_created_at" in [index[1] for index in indexes]
+    engine.dispose()
+
+
+def baseline_database(path, customers):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        for statement in BASELINE_SCHEMA:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql(
+            "INSERT INTO customers (name, email) VALUES (?, ?)", customers
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO products (name, quantity, price) VALUES ('Chair', 8, 20.0)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO orders (customer_id, status, total_price) "
+            "VALUES (1, 'pending', 40.0)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO order_product_associations VALUES (1, 1), (1, 1)"
+        )
+    return engine
+
+
+def test_baseline_database_is_upgraded(tmp_path, capsys):
+    path = tmp_path / "warehouse.db"
+    baseline_database(path, [("Bradley", "bradley@gmail.com")]).dispose()
+    database = f"sqlite:///{path}"
+
+    assert run(["--database", database, "init-db"]) == 0
+    assert "Schema updated" in capsys.readouterr().out
+
+    app = Application(EngineConfig(url=database))
+    with app.unit_of_work() as uow:
+        # итоги и сводки новых таблиц заполнены по старым заказам
+        assert uow.aggregates.status_totals()[OrderStatus.PENDING] == Totals(1, 40.0)
+        assert uow.aggregates.customer_totals(1) == Totals(1, 40.0)
+        assert uow.aggregates.inventory() == Totals(8, 160.0)
+        summary = uow.summaries.get(1)
+        assert (summary.status, summary.item_count) == (OrderStatus.PENDING, 2)
+
+        order = uow.orders.get(1)
+        assert (order.version, order.quantities()) == (1, {1: 2})
+        assert order.lines[0].unit_price == 20.0
+        app.service(uow).cancel_order(order.id)
+        uow.commit()
+    with app.unit_of_work() as uow:
+        assert uow.products.get(1).quantity == 10
+        totals = uow.aggregates.status_totals()
+        assert totals[OrderStatus.PENDING] == Totals(0, 0.0)
+        assert totals[OrderStatus.CANCELLED] == Totals(1, 40.0)
+        assert uow.aggregates.inventory() == Totals(10, 200.0)
+        assert uow.summaries.get(1).status == OrderStatus.CANCELLED
+    app.close()
+    assert run(["--database", database, "demo"]) == 0
+
+
+def test_duplicate_emails_block_unique_index(tmp_path):
+    customers = [("Bradley", "bradley@gmail.com"), ("Brad", "bradley@gmail.com")]
+    engine = baseline_database(tmp_path / "warehouse.db", customers)
+
+    with pytest.raises(ValueError, match="ix_customers_email"):
+        ensure_schema(engine)
+    # обновление выполняется одной транзакцией и откатывается целиком
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA user_version").scalar() == 0
+        columns = connection.exec_driver_sql("PRAGMA table_info(customers)").all()
+        lines = connection.exec_driver_sql(
+            "SELECT * FROM order_product_associations"
+        ).all()
+    assert "version" not in [column[1] for column in columns]
+    assert lines == [(1, 1), (1, 1)]
+    engine.dispose()
+
+
+def test_application_reads_through_shared_caches(tmp_path):
+    app = Application(EngineConfig(url=f"sqlite:///{tmp_path / 'warehouse.db'}"))
+    with app.unit_of_work() as uow:
+        product = app.service(uow).create_product("Chair", 5, 20.0)
+        uow.commit()
+
+    for _ in range(2):
+        with app.unit_of_work() as uow:
+            assert uow.products.get(product.id).quantity == 5
+    app.close()
+
+    stats = app.caches["product"].stats()
+    assert (stats.misses, stats.hits) == (1, 1)
@@ -0,0 +1,158 @@
+"""Тестовый модуль для пакетного импорта и экспорта"""
+
+import json
+
+import pytest
+
+from my_hm.domain.models import OrderStatus
+from my_hm.infrastructure.bulk_io import (
+    BulkImporter,
+    export_orders,
+    export_products,
+    read_rows,
+)
+from my_hm.infrastructure.repositories import (
+    SqlAlchemyCustomerRepository,
+    SqlAlchemyOrderRepository,
+    SqlAlchemyProductRepository,
+)
+
+
+def write_csv(path, text):
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def test_import_products_from_csv_in_chunks(session, tmp_path):
+    source = write_csv(
+        tmp_path / "products.csv",
+        "name,quantity,price\n"
+        "Table,10,1000.0\n"
+        "Chair,-1,20.0\n"
+        "Sofa,3,0\n"
+        "Lamp,7,15.5\n"
+        "Shelf,2,40\n",
+    )
+
+    report = BulkImporter(session, chunk_size=2).import_products(read_rows(source))
+
+    assert report.imported == 3
+    assert [e.line for e in report.rejected] == [2, 3]
+    assert "отрицательным" in report.rejected[0].message
+    names = sorted(p.name for p in SqlAlchemyProductRepository(session).list())
+    assert names == ["Lamp", "Shelf", "Table"]
+
+
+def test_import_stops_on_invalid_row_when_not_skipping(session, tmp_path):
+    source = write_csv(tmp_path / "products.csv", "name,quantity,price\nTable,x,1.0\n")
+
+    with pytest.raises(ValueError, match="Строка 1"):
+        BulkImporter(session, skip_invalid=False).import_products(read_rows(source))
+
+
+def test_import_customers_and_orders_from_jsonl(session, tmp_path):
+    customers = tmp_path / "customers.jsonl"
+    customers.write_text(
+        '{"name": "Bradley", "email": "bradley@gmail.com"}\n{"name": "Angelina"}\n',
+        encoding="utf-8",
+    )
+    importer = BulkImporter(session)
+    report = importer.import_customers(read_rows(customers))
+    assert report.imported == 1
+    # повторная загрузка обновляет клиентов по email, а не дублирует их
+    importer.import_customers([{"name": "Brad", "email": "bradley@gmail.com"}])
+    [customer] = SqlAlchemyCustomerRepository(session).list()
+    assert (customer.id, customer.name) == (1, "Brad")
+
+    importer.import_products([{"name": "Chair", "quantity": 5, "price": 20.0}])
+    orders = tmp_path / "orders.jsonl"
+    orders.write_text(
+        json.dumps(
+            {
+                "customer_id": 1,
+                "status": "confirmed",
+                "lines": [{"product_id": 1, "quantity": 3, "unit_price": 20.0}],
+            }
+        )
+        + "\n",
+        encoding="utf-8",
+    )
+    report = importer.import_orders(read_rows(orders))
+
+    assert report.imported == 1
+    [order] = SqlAlchemyOrderRepository(session).list()
+    assert order.status == OrderStatus.CONFIRMED
+    assert order.quantities() == {1: 3}
+    assert order.total_price == 60.0
+
+
+def test_import_orders_rejects_duplicate_lines_and_unknown_references(session):
+    importer = BulkImporter(session)
+    importer.import_customers([{"name": "Bradley", "email": "b@gmail.com"}])
+    importer.import_products([{"name": "Chair", "quantity": 5, "price": 20.0}])
+    line = {"product_id": 1, "quantity": 1, "unit_price": 20.0}
+
+    report = importer.import_orders(
+        [
+            {"customer_id": 1, "lines": [line, line]},
+            {"customer_id": 7, "lines": [line]},
+            {"customer_id": 1, "lines": [dict(line, product_id=9)]},
+            {"customer_id": 1, "lines": [line]},
+        ]
+    )
+
+    assert report.imported == 1
+    assert [(e.line, e.message) for e in report.rejected] == [
+        (1, "Продукт 1 повторяется в заказе"),
+        (2, "Клиент 7 не найден"),
+        (3, "Продукт 9 не найден"),
+    ]
+    [order] = SqlAlchemyOrderRepository(session).list()
+    assert order.quantities() == {1: 1}
+
+
+def test_import_orders_stops_on_unknown_reference_when_not_skipping(session):
+    importer = BulkImporter(session, skip_invalid=False)
+
+    with pytest.raises(ValueError, match="Строка 1: Клиент 1 не найден"):
+        importer.import_orders(
+            [
+                {
+                    "customer_id": 1,
+                    "lines": [{"product_id": 1, "quantity": 1, "unit_price": 1.0}],
+                }
+            ]
+        )
+
+
+def test_export_round_trip(session, tmp_path):
+    importer = BulkImporter(session)
+    importer.import_customers([{"name": "Bradley", "email": "b@gmail.com"}])
+    importer.import_products(
+        {"name": f"P{i}", "quantity": i, "price": 1.0 + i} for i in range(5)
+    )
+    importer.import_orders(
+        [
+            {
+                "customer_id": 1,
+                "created_at": "2026-01-02T03:04:05",
+                "lines": [
+                    {"product_id": 1, "quantity": 1, "unit_price": 1.0},
+                    {"product_id": 2, "quantity": 2, "unit_price": 2.0},
+                ],
+            }
+        ]
+    )
+    product_repo = SqlAlchemyProductRepository(session)
+    order_repo = SqlAlchemyOrderRepository(session)
+
+    assert export_products(product_repo, tmp_path / "products.csv", batch_size=2) == 5
+    assert export_orders(order_repo, tmp_path / "lines.csv") == 2
+    assert export_orders(order_repo, tmp_path / "orders.jsonl") == 1
+
+    [order] = read_rows(tmp_path / "orders.jsonl")
+    assert order["total_price"] == 5.0
+    assert order["created_at"] == "2026-01-02T03:04:05"
+    assert len(order["lines"]) == 2
+    products = list(read_rows(tmp_path / "products.csv"))
+    assert [p["name"] for p in products] == ["P0", "P1", "P2", "P3", "P4"]
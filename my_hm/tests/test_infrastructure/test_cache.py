@@ -0,0 +1,181 @@
+"""Тестовый модуль для кэша карты идентичности"""
+
+from unittest.mock import Mock
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from my_hm.domain.models import Customer, Product
+from my_hm.bootstrap import Application
+from my_hm.infrastructure.cache import (
+    CachedCustomerRepository,
+    CachedProductRepository,
+    IdentityMapCache,
+)
+from my_hm.infrastructure.database import EngineConfig
+from my_hm.infrastructure.unit_of_work import SqlAlchemyUnitOfWork
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_counts_hits_and_misses():
+    cache = IdentityMapCache()
+    assert cache.get(1) is None
+    cache.put(1, "value")
+    assert cache.get(1) == "value"
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.size) == (1, 1, 1)
+
+
+def test_cache_evicts_least_recently_used():
+    cache = IdentityMapCache(max_size=2)
+    cache.put(1, "a")
+    cache.put(2, "b")
+    cache.get(1)
+    cache.put(3, "c")
+
+    assert cache.get(2) is None
+    assert cache.get(1) == "a"
+    assert cache.stats().evictions == 1
+
+
+def test_cache_expires_entries():
+    clock = FakeClock()
+    cache = IdentityMapCache(ttl=10.0, clock=clock)
+    cache.put(1, "a")
+    clock.now = 11.0
+
+    assert cache.get(1) is None
+    assert len(cache) == 0
+
+
+def test_cached_repository_returns_copies():
+    inner = Mock()
+    inner.get.return_value = Product(id=1, name="Chair", quantity=5, price=20.0)
+    repo = CachedProductRepository(inner, IdentityMapCache())
+
+    first = repo.get(1)
+    first.quantity = 0
+    second = repo.get(1)
+
+    assert second.quantity == 5
+    inner.get.assert_called_once_with(1)
+
+
+def test_cached_repository_get_many_loads_only_misses():
+    inner = Mock()
+    inner.get.return_value = Customer(id=1, name="Bradley", email="b@gmail.com")
+    inner.get_many.return_value = {2: Customer(id=2, name="Alice", email="a@gmail.com")}
+    repo = CachedCustomerRepository(inner, IdentityMapCache())
+    repo.get(1)
+
+    customers = repo.get_many([1, 2])
+
+    assert set(customers) == {1, 2}
+    inner.get_many.assert_called_once_with([2])
+
+
+def test_product_get_many_reads_stock_past_cache():
+    cache = IdentityMapCache()
+    inner = Mock()
+    inner.get.return_value = Product(id=1, name="Chair", quantity=0, price=20.0)
+    inner.get_many.return_value = {
+        1: Product(id=1, name="Chair", quantity=5, price=20.0)
+    }
+    repo = CachedProductRepository(inner, cache)
+    repo.get(1)
+
+    assert repo.get_many([1])[1].quantity == 5
+    assert cache.get(1).quantity == 5
+
+
+def test_value_read_before_concurrent_invalidation_is_not_cached():
+    cache = IdentityMapCache()
+    stale = Product(id=1, name="Chair", quantity=5, price=20.0)
+    inner = Mock()
+    # Другая транзакция фиксирует изменение и вытесняет запись, пока
+    # эта транзакция читает продукт по старому снимку.
+    inner.get.side_effect = lambda product_id: cache.invalidate(product_id) or stale
+    repo = CachedProductRepository(inner, cache)
+
+    assert repo.get(1).quantity == 5
+    assert len(cache) == 0
+
+    # следующая транзакция снова кэширует
+    repo.invalidate_pending()
+    inner.get.side_effect = None
+    inner.get.return_value = Product(id=1, name="Chair", quantity=3, price=20.0)
+    repo.get(1)
+    assert cache.get(1).quantity == 3
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine)
+
+
+def test_committed_stock_change_invalidates_shared_cache(session_factory):
+    product_cache = IdentityMapCache()
+    customer_cache = IdentityMapCache()
+
+    def uow():
+        return SqlAlchemyUnitOfWork(session_factory, product_cache, customer_cache)
+
+    with uow() as setup:
+        chair = setup.products.add(Product(name="Chair", quantity=5, price=20.0))
+        customer = setup.customers.add(Customer(name="Bradley", email="b@gmail.com"))
+        setup.commit()
+
+    with uow() as reader:
+        assert reader.products.get(chair.id).quantity == 5
+        assert reader.customers.get(customer.id).name == "Bradley"
+
+    with uow() as writer:
+        assert writer.products.reserve_stock({chair.id: 2}) == []
+        assert writer.products.get(chair.id).quantity == 3
+        writer.rollback()
+
+    with uow() as writer:
+        assert writer.products.get(chair.id).quantity == 5
+        writer.products.reserve_stock({chair.id: 2})
+        writer.commit()
+
+    with uow() as reader:
+        assert reader.products.get(chair.id).quantity == 3
+        assert reader.customers.get(customer.id).name == "Bradley"
+
+    assert customer_cache.stats().hits == 1
+
+
+def test_stock_restocked_by_another_application_is_visible(tmp_path):
+    url = f"sqlite:///{tmp_path / 'warehouse.db'}"
+    first = Application(EngineConfig(url=url))
+    second = Application(EngineConfig(url=url))
+    try:
+        with first.unit_of_work() as uow:
+            service = first.service(uow)
+            chair = service.create_product("Chair", 1, 20.0)
+            customer = service.create_customer("Bradley", "b@gmail.com")
+            order = service.create_order(customer.id, {chair.id: 1})
+            uow.commit()
+        with first.unit_of_work() as uow:
+            assert uow.products.get(chair.id).quantity == 0
+
+        with second.unit_of_work() as uow:
+            second.service(uow).cancel_order(order.id)
+            uow.commit()
+
+        with first.unit_of_work() as uow:
+            reorder = first.service(uow).create_order(customer.id, {chair.id: 1})
+            uow.commit()
+        assert reorder.id != order.id
+    finally:
+        first.close()
+        second.close()
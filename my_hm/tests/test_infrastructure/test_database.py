@@ -0,0 +1,96 @@
+"""Тесты настройки движка SQLite: WAL, прагмы и пул только для чтения"""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from my_hm.bootstrap import Application
+from my_hm.domain.models import CatalogQuery
+from my_hm.domain.services import WarehouseService
+from my_hm.infrastructure.database import Database, EngineConfig
+from my_hm.infrastructure.orm import Base
+from my_hm.infrastructure.unit_of_work import SqlAlchemyUnitOfWork
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = Database(
+        EngineConfig(url=f"sqlite:///{tmp_path / 'warehouse.db'}", busy_timeout=0.5)
+    )
+    Base.metadata.create_all(database.engine)
+    yield database
+    database.dispose()
+
+
+def make_uow(database):
+    return SqlAlchemyUnitOfWork(
+        database.session_factory, read_session_factory=database.read_session_factory
+    )
+
+
+def test_write_engine_uses_wal_and_pragmas(database):
+    with database.engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 500
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1
+
+
+def test_read_engine_rejects_writes(database):
+    with database.read_engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute(
+                text("INSERT INTO customers (name, email) VALUES ('a', 'b')")
+            )
+
+
+def test_memory_database_falls_back_to_single_engine():
+    database = Database(EngineConfig(url="sqlite://"))
+    Base.metadata.create_all(database.engine)
+
+    assert database.read_engine is database.engine
+    assert database.read_session_factory is None
+    with database.read_engine.connect() as connection:
+        # таблица видна: чтение идет в ту же базу, а не в новую пустую
+        assert connection.execute(text("SELECT count(*) FROM customers")).scalar() == 0
+    database.dispose()
+
+
+def test_memory_application_reads_its_own_writes():
+    app = Application(EngineConfig(url="sqlite://"))
+    with app.unit_of_work() as uow:
+        service = app.service(uow)
+        service.create_product("Table", 10, 100.0)
+        assert [p.name for p in service.search_products(CatalogQuery()).items] == [
+            "Table"
+        ]
+        uow.commit()
+    with app.unit_of_work() as uow:
+        assert len(app.service(uow).search_products(CatalogQuery()).items) == 1
+    app.close()
+
+
+def test_reads_go_to_read_pool_and_ignore_uncommitted_writes(database):
+    with make_uow(database) as uow:
+        service = WarehouseService(uow.products, uow.orders, uow.customers)
+        service.create_product("Table", 10, 100.0)
+
+        assert uow.products.get(1) is not None
+        assert service.search_products(CatalogQuery()).items == []
+        uow.commit()
+
+        assert [p.name for p in service.get_available_products()] == ["Table"]
+
+
+def test_reader_is_not_blocked_by_open_writer(database):
+    with make_uow(database) as writer:
+        WarehouseService(
+            writer.products, writer.orders, writer.customers
+        ).create_product("Chair", 5, 20.0)
+
+        with make_uow(database) as reader:
+            assert reader.products.list() == []
+            assert reader.orders.list() == []
+        writer.commit()
+
+    with make_uow(database) as reader:
+        assert [p.name for p in reader.products.list()] == ["Chair"]
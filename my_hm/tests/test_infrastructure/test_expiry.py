@@ -0,0 +1,262 @@
+"""Тесты отмены просроченных резервов"""
+
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from my_hm.domain.models import OrderStatus, Totals
+from my_hm.domain.services import WarehouseService
+from my_hm.infrastructure.expiry import ExpiryBudget, ReservationExpiryScheduler
+from my_hm.infrastructure.memory import InMemoryUnitOfWork, MemoryStore
+from my_hm.infrastructure.orm import Base
+from my_hm.infrastructure.unit_of_work import SqlAlchemyUnitOfWork
+
+START = datetime(2024, 5, 1, 12, 0)
+TTL = timedelta(minutes=30)
+
+
+class FakeClock:
+    def __init__(self, now=START):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlalchemy"])
+def uow_factory(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryStore()
+        yield lambda: InMemoryUnitOfWork(store)
+        return
+    # файловая база, чтобы фоновый поток видел те же данные
+    engine = create_engine(f"sqlite:///{tmp_path / 'warehouse.db'}")
+    Base.metadata.create_all(engine)
+    yield lambda: SqlAlchemyUnitOfWork(sessionmaker(bind=engine))
+    engine.dispose()
+
+
+def make_service(uow, clock):
+    service = WarehouseService(uow.products, uow.orders, uow.customers)
+    service.clock = clock
+    return service
+
+
+def place_orders(uow_factory, clock, count, quantity=1):
+    """
+    Создает count заказов на один продукт; каждый следующий на минуту новее.
+    """
+    with uow_factory() as uow:
+        service = make_service(uow, clock)
+        customer = service.create_customer("Bradley", "bradley@gmail.com")
+        product = service.create_product("Chair", 100, 20.0)
+        orders = []
+        for _ in range(count):
+            orders.extend(
+                service.create_orders([(customer.id, {product.id: quantity})])
+            )
+            clock.now += timedelta(minutes=1)
+        uow.commit()
+        return product.id, [order.id for order in orders]
+
+
+def snapshot(uow_factory, product_id, order_ids):
+    with uow_factory() as uow:
+        statuses = [uow.orders.get(order_id).status for order_id in order_ids]
+        return statuses, uow.products.get(product_id).quantity
+
+
+def test_expires_only_stale_pending_orders(uow_factory):
+    clock = FakeClock()
+    product_id, order_ids = place_orders(uow_factory, clock, 4, quantity=5)
+    with uow_factory() as uow:
+        make_service(uow, clock).confirm_order(order_ids[0])
+        uow.commit()
+
+    # заказы созданы в 12:00 .. 12:03, просрочены созданные раньше 12:02
+    clock.now = START + TTL + timedelta(minutes=2)
+    scheduler = ReservationExpiryScheduler(uow_factory, TTL, clock=clock)
+
+    assert scheduler.run_once() == 1
+    statuses, quantity = snapshot(uow_factory, product_id, order_ids)
+    assert statuses == [
+        OrderStatus.CONFIRMED,
+        OrderStatus.CANCELLED,
+        OrderStatus.PENDING,
+        OrderStatus.PENDING,
+    ]
+    assert quantity == 100 - 3 * 5
+    assert scheduler.run_once() == 0
+
+
+def test_find_pending_before_returns_oldest_first(uow_factory):
+    clock = FakeClock()
+    _, order_ids = place_orders(uow_factory, clock, 5)
+
+    with uow_factory() as uow:
+        found = uow.orders.find_pending_before(START + timedelta(minutes=4), 3)
+        assert found == order_ids[:3]
+        make_service(uow, clock).cancel_order(order_ids[1])
+        assert uow.orders.find_pending_before(START, 10) == []
+        assert uow.orders.find_pending_before(clock.now, 10) == [
+            order_ids[0],
+            *order_ids[2:],
+        ]
+
+
+def test_backlog_is_limited_by_batch_budget(uow_factory):
+    clock = FakeClock()
+    product_id, order_ids = place_orders(uow_factory, clock, 7)
+    clock.now += TTL
+    scheduler = ReservationExpiryScheduler(
+        uow_factory, TTL, budget=ExpiryBudget(batch_size=2, max_batches=2), clock=clock
+    )
+
+    assert scheduler.run_once() == 4
+    assert scheduler.stats.backlog
+    assert scheduler.run_once() == 3
+    assert not scheduler.stats.backlog
+    assert scheduler.stats.batches == 4
+    statuses, quantity = snapshot(uow_factory, product_id, order_ids)
+    assert set(statuses) == {OrderStatus.CANCELLED}
+    assert quantity == 100
+
+
+def test_confirmed_after_selection_is_not_cancelled(uow_factory):
+    clock = FakeClock()
+    product_id, order_ids = place_orders(uow_factory, clock, 2)
+    clock.now += TTL
+    with uow_factory() as uow:
+        service = make_service(uow, clock)
+        find_pending_before = uow.orders.find_pending_before
+
+        def find_then_confirm(created_before, limit):
+            found = find_pending_before(created_before, limit)
+            service.confirm_order(order_ids[0])
+            return found
+
+        uow.orders.find_pending_before = find_then_confirm
+        report = service.expire_pending_orders(clock.now, 10)
+        uow.commit()
+
+    assert report.applied == [order_ids[1]]
+    assert report.current_statuses == {order_ids[0]: OrderStatus.CONFIRMED}
+    assert snapshot(uow_factory, product_id, order_ids)[1] == 99
+
+
+def test_background_thread_expires_orders(uow_factory):
+    clock = FakeClock()
+    product_id, order_ids = place_orders(uow_factory, clock, 3)
+    clock.now += TTL
+    scheduler = ReservationExpiryScheduler(
+        uow_factory, TTL, budget=ExpiryBudget(poll_interval=0.01), clock=clock
+    )
+
+    scheduler.start()
+    try:
+        for _ in range(500):
+            if scheduler.stats.expired == 3:
+                break
+            threading.Event().wait(0.01)
+    finally:
+        scheduler.stop(timeout=5)
+
+    assert scheduler.stats.expired == 3
+    assert snapshot(uow_factory, product_id, order_ids)[1] == 100
+
+
+def test_asyncio_task_expires_orders(uow_factory):
+    clock = FakeClock()
+    _, order_ids = place_orders(uow_factory, clock, 2)
+    clock.now += TTL
+    # долгая пауза: stop() должен прервать ожидание, а не ждать poll_interval
+    scheduler = ReservationExpiryScheduler(
+        uow_factory, TTL, budget=ExpiryBudget(poll_interval=60.0), clock=clock
+    )
+
+    async def run():
+        task = scheduler.start_async()
+        while scheduler.stats.expired < 2:
+            await asyncio.sleep(0.01)
+        scheduler.stop()
+        await asyncio.wait_for(task, 5)
+
+    asyncio.run(run())
+    assert scheduler.stats.ticks >= 1
+
+
+def test_stop_right_after_start_async_is_not_lost(uow_factory):
+    scheduler = ReservationExpiryScheduler(
+        uow_factory, TTL, budget=ExpiryBudget(poll_interval=60.0)
+    )
+
+    async def run():
+        task = scheduler.start_async()
+        scheduler.stop()
+        await asyncio.wait_for(task, 5)
+
+    asyncio.run(run())
+    assert scheduler.stats.ticks == 0
+
+
+def test_default_service_updates_listeners(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'warehouse.db'}")
+    Base.metadata.create_all(engine)
+
+    def uow_factory():
+        return SqlAlchemyUnitOfWork(sessionmaker(bind=engine))
+
+    with uow_factory() as uow:
+        service = WarehouseService(
+            uow.products, uow.orders, uow.customers, listeners=uow.listeners
+        )
+        service.clock = lambda: START
+        customer = service.create_customer("Bradley", "bradley@gmail.com")
+        product = service.create_product("Chair", 10, 20.0)
+        order = service.create_order(customer.id, {product.id: 3})
+        uow.commit()
+
+    expired_at = START + TTL + timedelta(minutes=1)
+    ReservationExpiryScheduler(uow_factory, TTL, clock=lambda: expired_at).run_once()
+
+    with uow_factory() as uow:
+        assert uow.summaries.get(order.id).status == OrderStatus.CANCELLED
+        totals = uow.aggregates.status_totals()
+        assert totals[OrderStatus.CANCELLED] == Totals(1, 60.0)
+        assert uow.aggregates.inventory() == Totals(10, 200.0)
+    engine.dispose()
+
+
+def test_errors_back_off_exponentially():
+    def broken_uow():
+        raise RuntimeError("database is locked")
+
+    scheduler = ReservationExpiryScheduler(
+        broken_uow, TTL, budget=ExpiryBudget(poll_interval=10.0, max_backoff=35.0)
+    )
+
+    assert [scheduler.tick() for _ in range(4)] == [10.0, 20.0, 35.0, 35.0]
+    assert scheduler.stats.errors == 4
+    assert "database is locked" in scheduler.stats.last_error
+
+
+def test_invalid_budget():
+    with pytest.raises(ValueError):
+        ExpiryBudget(batch_size=0)
+
+
+def test_pending_index_is_used(engine):
+    with engine.connect() as connection:
+        plan = connection.execute(
+            text(
+                "EXPLAIN QUERY PLAN SELECT id FROM orders "
+                "WHERE status = 'PENDING' AND created_at < '2024-01-01' "
+                "ORDER BY created_at, id LIMIT 10"
+            )
+        ).fetchall()
+
+    assert "ix_orders_status_created_at" in " ".join(row[-1] for row in plan)
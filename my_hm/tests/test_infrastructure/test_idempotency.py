@@ -0,0 +1,236 @@
+"""Тесты команд с ключами идемпотентности"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from my_hm.domain.models import OrderStatus
+from my_hm.domain.services import WarehouseService
+from my_hm.infrastructure.cache import IdentityMapCache
+from my_hm.infrastructure.memory import InMemoryUnitOfWork, MemoryStore
+from my_hm.infrastructure.orm import Base
+from my_hm.infrastructure.unit_of_work import SqlAlchemyUnitOfWork
+from my_hm.tests.test_infrastructure.test_repositories import count_statements
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'warehouse.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(params=["memory", "sqlalchemy", "sqlalchemy+lru"])
+def uow_factory(request, file_engine):
+    if request.param == "memory":
+        store = MemoryStore()
+        return lambda: InMemoryUnitOfWork(store)
+    cache = IdentityMapCache(ttl=None) if request.param.endswith("lru") else None
+    return lambda: SqlAlchemyUnitOfWork(
+        sessionmaker(bind=file_engine), idempotency_cache=cache
+    )
+
+
+def make_service(uow):
+    return WarehouseService(
+        uow.products, uow.orders, uow.customers, idempotency_repo=uow.idempotency
+    )
+
+
+def seed(uow_factory):
+    with uow_factory() as uow:
+        service = make_service(uow)
+        customer = service.create_customer("Bradley", "bradley@gmail.com")
+        product = service.create_product("Chair", 10, 20.0)
+        uow.commit()
+        return customer.id, product.id
+
+
+def run_command(uow_factory, command):
+    with uow_factory() as uow:
+        result = command(make_service(uow))
+        uow.commit()
+        return result
+
+
+def stock(uow_factory, product_id):
+    with uow_factory() as uow:
+        return uow.products.get(product_id).quantity
+
+
+def test_retried_create_order_reserves_stock_once(uow_factory):
+    customer_id, product_id = seed(uow_factory)
+
+    def create(service):
+        return service.create_order(customer_id, {product_id: 3}, idempotency_key="r1")
+
+    first = run_command(uow_factory, create)
+    retried = run_command(uow_factory, create)
+
+    assert retried.id == first.id
+    assert (retried.status, retried.total_price) == (OrderStatus.PENDING, 60.0)
+    assert retried.created_at == first.created_at
+    assert [p.id for p in retried.products] == [product_id]
+    assert stock(uow_factory, product_id) == 7
+    with uow_factory() as uow:
+        assert len(uow.orders.list()) == 1
+
+
+def test_retried_cancel_releases_stock_once(uow_factory):
+    customer_id, product_id = seed(uow_factory)
+    order = run_command(
+        uow_factory, lambda service: service.create_order(customer_id, {product_id: 4})
+    )
+
+    def cancel(service):
+        return service.cancel_order(order.id, idempotency_key="cancel-1")
+
+    assert run_command(uow_factory, cancel).status == OrderStatus.CANCELLED
+    # без ключа повтор отклонился бы: заказ уже отменен
+    assert run_command(uow_factory, cancel).status == OrderStatus.CANCELLED
+    assert stock(uow_factory, product_id) == 10
+
+
+def test_key_reused_for_other_command_is_rejected(uow_factory):
+    customer_id, product_id = seed(uow_factory)
+    run_command(
+        uow_factory,
+        lambda service: service.create_order(
+            customer_id, [product_id], idempotency_key="r1"
+        ),
+    )
+
+    with pytest.raises(ValueError, match="другими параметрами"):
+        run_command(
+            uow_factory,
+            lambda service: service.create_order(
+                customer_id, {product_id: 2}, idempotency_key="r1"
+            ),
+        )
+    # список id и словарь количеств — одна и та же команда
+    run_command(
+        uow_factory,
+        lambda service: service.create_order(
+            customer_id, {product_id: 1}, idempotency_key="r1"
+        ),
+    )
+    assert stock(uow_factory, product_id) == 9
+
+
+def test_failed_and_rolled_back_commands_are_not_stored(uow_factory):
+    customer_id, product_id = seed(uow_factory)
+
+    with pytest.raises(ValueError):
+        run_command(
+            uow_factory,
+            lambda service: service.create_order(
+                customer_id, {product_id: 50}, idempotency_key="r1"
+            ),
+        )
+    with uow_factory() as uow:
+        make_service(uow).create_order(
+            customer_id, {product_id: 1}, idempotency_key="r2"
+        )
+        uow.rollback()
+        assert uow.idempotency.get("r2") is None
+
+    for key in ("r1", "r2"):
+        run_command(
+            uow_factory,
+            lambda service, key=key: service.create_order(
+                customer_id, {product_id: 1}, idempotency_key=key
+            ),
+        )
+    assert stock(uow_factory, product_id) == 8
+
+
+def test_cached_retry_does_not_query_database(file_engine):
+    cache = IdentityMapCache(ttl=None)
+
+    def uow_factory():
+        return SqlAlchemyUnitOfWork(
+            sessionmaker(bind=file_engine), idempotency_cache=cache
+        )
+
+    customer_id, product_id = seed(uow_factory)
+
+    def create(service):
+        return service.create_order(customer_id, {product_id: 1}, idempotency_key="r1")
+
+    run_command(uow_factory, create)
+    statements = count_statements(file_engine)
+    run_command(uow_factory, create)
+    assert len(statements) == 1
+    assert "FROM idempotency_keys" in statements[0]
+
+    statements.clear()
+    run_command(uow_factory, create)
+    assert statements == []
+    assert cache.stats().hits == 1
+
+
+def test_concurrent_duplicate_is_rolled_back(file_engine):
+    session_factory = sessionmaker(bind=file_engine)
+    customer_id, product_id = seed(lambda: SqlAlchemyUnitOfWork(session_factory))
+
+    def create(service):
+        return service.create_order(customer_id, {product_id: 2}, idempotency_key="r1")
+
+    run_command(lambda: SqlAlchemyUnitOfWork(session_factory), create)
+    with SqlAlchemyUnitOfWork(session_factory) as uow:
+        # проверка ключа выполнилась до фиксации первой транзакции
+        uow.idempotency.get = lambda key: None
+        create(make_service(uow))
+        with pytest.raises(IntegrityError):
+            uow.commit()
+
+    assert stock(lambda: SqlAlchemyUnitOfWork(session_factory), product_id) == 8
+
+
+def test_async_service_replays_stored_response(tmp_path):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from my_hm.domain.async_services import AsyncWarehouseService
+    from my_hm.infrastructure.async_unit_of_work import AsyncSqlAlchemyUnitOfWork
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        def make_async_service(uow):
+            return AsyncWarehouseService(
+                uow.products,
+                uow.orders,
+                uow.customers,
+                idempotency_repo=uow.idempotency,
+            )
+
+        async with AsyncSqlAlchemyUnitOfWork(session_factory) as uow:
+            service = make_async_service(uow)
+            customer = await service.create_customer("Bradley", "b@gmail.com")
+            product = await service.create_product("Chair", 5, 20.0)
+            await uow.commit()
+        results = []
+        for _ in range(2):
+            async with AsyncSqlAlchemyUnitOfWork(session_factory) as uow:
+                order = await make_async_service(uow).create_order(
+                    customer.id, {product.id: 2}, idempotency_key="r1"
+                )
+                await uow.commit()
+                results.append(order)
+        async with AsyncSqlAlchemyUnitOfWork(session_factory) as uow:
+            quantity = (await uow.products.get(product.id)).quantity
+        await engine.dispose()
+        return results, quantity
+
+    (first, retried), quantity = asyncio.run(scenario())
+    assert retried.id == first.id
+    assert [p.quantity for p in retried.products] == [3]
+    assert quantity == 3
@@ -0,0 +1,86 @@
+"""Тестовый модуль для учета SQL-запросов по операциям"""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from my_hm.domain.services import WarehouseService
+from my_hm.infrastructure.instrumentation import UNSCOPED, SqlInstrumentation
+from my_hm.infrastructure.repositories import (
+    SqlAlchemyCustomerRepository,
+    SqlAlchemyOrderRepository,
+    SqlAlchemyProductRepository,
+)
+
+
+def make_service(session):
+    return WarehouseService(
+        SqlAlchemyProductRepository(session),
+        SqlAlchemyOrderRepository(session),
+        SqlAlchemyCustomerRepository(session),
+    )
+
+
+def test_statements_are_attributed_to_service_methods(engine, session):
+    instrumentation = SqlInstrumentation(slow_query_threshold=0.0).install(engine)
+    service = instrumentation.instrument_service(make_service(session))
+
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    chair = service.create_product("Chair", 5, 20.0)
+    order = service.create_order(customer.id, {chair.id: 2})
+    service.confirm_order(order.id)
+    SqlAlchemyProductRepository(session).list()
+
+    snapshot = instrumentation.snapshot()
+    assert snapshot["WarehouseService.create_order"].calls == 1
+    # create_order вызывает create_orders, но учитывается один раз
+    assert "WarehouseService.create_orders" not in snapshot
+    # SELECT клиентов и продуктов, UPDATE остатков, INSERT заказа и его строк
+    assert snapshot["WarehouseService.create_order"].statements == 5
+    # SELECT заказа, SELECT строк заказа и UPDATE без повторного чтения
+    assert snapshot["WarehouseService.confirm_order"].statements == 3
+    assert snapshot[UNSCOPED].statements > 0
+
+    samples = instrumentation.slow_query_samples()
+    tagged = [s for s in samples if s.operation == "WarehouseService.confirm_order"]
+    assert tagged
+    assert all("/* op=WarehouseService.confirm_order */" in s.statement for s in tagged)
+
+
+def test_prometheus_dump(engine, session, tmp_path):
+    instrumentation = SqlInstrumentation().install(engine)
+    with instrumentation.operation("export"):
+        SqlAlchemyProductRepository(session).list()
+
+    path = tmp_path / "warehouse.prom"
+    instrumentation.write_prometheus(str(path))
+    text = path.read_text(encoding="utf-8")
+
+    assert "# TYPE warehouse_sql_statements_total counter" in text
+    assert 'warehouse_sql_statements_total{operation="export"} 1' in text
+    assert 'warehouse_operation_calls_total{operation="export"} 1' in text
+
+
+def test_uninstall_stops_recording(engine, session):
+    instrumentation = SqlInstrumentation().install(engine)
+    instrumentation.uninstall(engine)
+
+    SqlAlchemyProductRepository(session).list()
+
+    assert instrumentation.snapshot() == {}
+
+
+def test_failed_statement_is_not_timed_into_next_one(engine):
+    instrumentation = SqlInstrumentation().install(engine)
+
+    with engine.connect() as conn:
+        with instrumentation.operation("broken"):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+        with instrumentation.operation("ok"):
+            conn.execute(text("SELECT 1"))
+        assert "query_start_time" not in conn.info
+
+    snapshot = instrumentation.snapshot()
+    assert snapshot["broken"].statements == 0
+    assert snapshot["ok"].statements == 1
@@ -0,0 +1,171 @@
+"""Тесты репозиториев в памяти и их совместимости с SQLAlchemy-реализацией"""
+
+import pickle
+
+import pytest
+
+from my_hm.domain.exceptions import ConcurrencyConflictError
+from my_hm.domain.models import (
+    CatalogQuery,
+    OrderStatus,
+    ProductSort,
+    TransitionOutcome,
+)
+from my_hm.domain.services import WarehouseService
+from my_hm.infrastructure.memory import InMemoryUnitOfWork, MemoryStore
+from my_hm.infrastructure.repositories import (
+    SqlAlchemyCustomerRepository,
+    SqlAlchemyOrderRepository,
+    SqlAlchemyProductRepository,
+)
+
+CATALOG = [
+    ("Table", 10, 1000.0),
+    ("Chair", 50, 20.0),
+    ("Sofa", 0, 700.0),
+    ("Cabinet", 3, 300.0),
+    ("Chandelier", 2, 150.0),
+]
+
+
+@pytest.fixture(params=["memory", "sqlalchemy"])
+def service(request, session):
+    if request.param == "memory":
+        with InMemoryUnitOfWork(MemoryStore()) as uow:
+            yield WarehouseService(uow.products, uow.orders, uow.customers)
+        return
+    yield WarehouseService(
+        SqlAlchemyProductRepository(session),
+        SqlAlchemyOrderRepository(session),
+        SqlAlchemyCustomerRepository(session),
+    )
+
+
+def seed(service):
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    products = [service.create_product(*row) for row in CATALOG]
+    return customer, products
+
+
+def test_catalog_pages_match_across_backends(service):
+    seed(service)
+    query = CatalogQuery(sort=ProductSort.PRICE, descending=True, limit=2)
+
+    names = []
+    while True:
+        page = service.search_products(query)
+        names.extend(p.name for p in page.items)
+        if page.next_cursor is None:
+            break
+        query.after = page.next_cursor
+
+    assert names == ["Table", "Cabinet", "Chandelier", "Chair"]
+    prefixed = service.search_products(
+        CatalogQuery(name_prefix="Ch", sort=ProductSort.NAME, in_stock=False)
+    )
+    assert [p.name for p in prefixed.items] == ["Chair", "Chandelier"]
+
+
+def test_lifecycle_and_bulk_transitions_match_across_backends(service):
+    customer, products = seed(service)
+    table, chair = products[0], products[1]
+    orders = service.create_orders(
+        [(customer.id, {table.id: 2, chair.id: 1}), (customer.id, [chair.id])] * 2
+    )
+    service.customer_repo.get(customer.id)
+    order_ids = [order.id for order in orders]
+
+    service.confirm_order(order_ids[0])
+    service.ship_order(order_ids[0])
+    report = service.cancel_orders(order_ids)
+
+    assert report.outcomes[order_ids[0]] == TransitionOutcome.INVALID_STATUS
+    assert report.applied == order_ids[1:]
+    assert service.product_repo.get(table.id).quantity == 8
+    assert service.product_repo.get(chair.id).quantity == 49
+    cancelled = list(
+        service.order_repo.iter_orders(
+            status=OrderStatus.CANCELLED, customer_id=customer.id
+        )
+    )
+    assert [o.id for o in cancelled] == order_ids[1:]
+    assert [p.name for p in cancelled[1].products] == ["Table", "Chair"]
+
+
+def test_stale_update_raises_conflict(service):
+    customer, _ = seed(service)
+    stale = service.customer_repo.get(customer.id)
+    fresh = service.customer_repo.get(customer.id)
+    fresh.name = "Brad"
+    service.customer_repo.update(fresh)
+
+    with pytest.raises(ConcurrencyConflictError):
+        service.customer_repo.update(stale)
+
+
+def test_customer_upsert_matches_across_backends(service):
+    customer, _ = seed(service)
+
+    stored = service.upsert_customers(
+        [("Brad", "bradley@gmail.com"), ("Angelina", "angelina@gmail.com")]
+    )
+
+    assert stored[0].id == customer.id
+    assert (stored[0].name, stored[0].version) == ("Brad", 2)
+    assert service.customer_repo.get_by_email("angelina@gmail.com") == stored[1]
+    assert service.upsert_customers([("Brad", "bradley@gmail.com")]) == stored[:1]
+    with pytest.raises(ValueError):
+        service.create_customer("Angelina", "angelina@gmail.com")
+
+
+def test_rollback_restores_data_and_indexes():
+    store = MemoryStore()
+    with InMemoryUnitOfWork(store) as uow:
+        service = WarehouseService(uow.products, uow.orders, uow.customers)
+        customer = service.create_customer("Bradley", "bradley@gmail.com")
+        product = service.create_product("Table", 5, 100.0)
+        uow.commit()
+
+        order = service.create_order(customer.id, {product.id: 5})
+        assert service.get_available_products() == []
+        uow.rollback()
+
+        assert service.order_repo.get(order.id) is None
+        assert [p.name for p in service.get_available_products()] == ["Table"]
+        assert store.orders_by_customer[customer.id] == set()
+        assert service.create_order(customer.id, [product.id]).id == order.id
+
+
+def test_savepoint_rolls_back_only_nested_changes():
+    store = MemoryStore()
+    with InMemoryUnitOfWork(store) as uow:
+        service = WarehouseService(uow.products, uow.orders, uow.customers)
+        service.create_product("Table", 5, 100.0)
+        with pytest.raises(ValueError):
+            with uow.savepoint():
+                service.create_product("Chair", 5, 20.0)
+                raise ValueError
+        uow.commit()
+
+    with InMemoryUnitOfWork(store) as uow:
+        assert [p.name for p in uow.products.list()] == ["Table"]
+
+
+def test_snapshot_restore_round_trip():
+    store = MemoryStore()
+    with InMemoryUnitOfWork(store) as uow:
+        service = WarehouseService(uow.products, uow.orders, uow.customers)
+        customer = service.create_customer("Bradley", "bradley@gmail.com")
+        product = service.create_product("Table", 5, 100.0)
+        order = service.create_order(customer.id, [product.id])
+        uow.commit()
+
+    snapshot = pickle.loads(pickle.dumps(store.snapshot()))
+    replica = MemoryStore()
+    replica.restore(snapshot)
+
+    with InMemoryUnitOfWork(replica) as uow:
+        service = WarehouseService(uow.products, uow.orders, uow.customers)
+        assert service.order_repo.get(order.id).total_price == 100.0
+        assert [p.quantity for p in service.get_available_products()] == [4]
+        assert service.create_product("Chair", 1, 1.0).id == product.id + 1
@@ -0,0 +1,133 @@
+"""Тесты транзакционного outbox и потребителя событий"""
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from my_hm.domain.events import EventType
+from my_hm.domain.models import OrderStatus
+from my_hm.domain.services import WarehouseService
+from my_hm.infrastructure.bulk_io import read_rows
+from my_hm.infrastructure.outbox import (
+    JsonlFileSink,
+    OutboxConsumer,
+    SqlAlchemyOutbox,
+)
+from my_hm.infrastructure.repositories import (
+    SqlAlchemyCustomerRepository,
+    SqlAlchemyOrderRepository,
+    SqlAlchemyProductRepository,
+)
+
+
+@pytest.fixture
+def service(session):
+    return WarehouseService(
+        SqlAlchemyProductRepository(session),
+        SqlAlchemyOrderRepository(session),
+        SqlAlchemyCustomerRepository(session),
+        listeners=[SqlAlchemyOutbox(session)],
+    )
+
+
+@pytest.fixture
+def consumer(engine):
+    return OutboxConsumer(sessionmaker(bind=engine), "billing", batch_size=3)
+
+
+def events_of(consumer):
+    return consumer.poll(limit=1000)
+
+
+def test_changes_are_recorded_in_order(session, service, consumer):
+    bradley = service.create_customer("Bradley", "bradley@gmail.com")
+    chair = service.create_product("Chair", 10, 20.0)
+    order = service.create_order(bradley.id, {chair.id: 2})
+    service.confirm_order(order.id)
+    service.cancel_order(order.id)
+    session.commit()
+
+    events = events_of(consumer)
+    assert [(e.event_type, e.aggregate_id) for e in events] == [
+        (EventType.PRODUCT_CREATED, chair.id),
+        (EventType.STOCK_CHANGED, chair.id),
+        (EventType.ORDER_CREATED, order.id),
+        (EventType.ORDER_STATUS_CHANGED, order.id),
+        (EventType.STOCK_CHANGED, chair.id),
+        (EventType.ORDER_STATUS_CHANGED, order.id),
+    ]
+    assert [e.id for e in events] == sorted(e.id for e in events)
+    assert events[1].payload == {"delta": -2}
+    assert events[2].payload["lines"] == [
+        {"product_id": chair.id, "quantity": 2, "unit_price": 20.0}
+    ]
+    assert events[5].payload == {"previous": "confirmed", "status": "cancelled"}
+    assert events[0].created_at is not None
+
+
+def test_rolled_back_changes_emit_nothing(session, service, consumer):
+    service.create_product("Chair", 10, 20.0)
+    session.rollback()
+
+    assert events_of(consumer) == []
+
+
+def test_bulk_transition_emits_event_per_order(session, service, consumer):
+    bradley = service.create_customer("Bradley", "bradley@gmail.com")
+    chair = service.create_product("Chair", 10, 20.0)
+    orders = service.create_orders([(bradley.id, [chair.id])] * 3)
+    session.commit()
+    consumer.acknowledge(events_of(consumer)[-1].id)
+
+    report = service.confirm_orders([o.id for o in orders] + [999])
+    session.commit()
+
+    events = events_of(consumer)
+    assert len(report.applied) == 3
+    assert [e.aggregate_id for e in events] == [o.id for o in orders]
+    assert {e.payload["status"] for e in events} == {OrderStatus.CONFIRMED.value}
+
+
+def test_consumer_drains_into_file_sink(tmp_path, session, service, consumer):
+    for i in range(4):
+        service.create_product(f"P{i}", 1, 10.0)
+    session.commit()
+    sink = JsonlFileSink(tmp_path / "events.jsonl")
+
+    assert consumer.drain(sink) == 4
+    assert consumer.drain(sink) == 0
+    service.create_product("P4", 1, 10.0)
+    session.commit()
+    assert consumer.drain(sink) == 1
+
+    rows = list(read_rows(tmp_path / "events.jsonl"))
+    assert [row["payload"]["name"] for row in rows] == [f"P{i}" for i in range(5)]
+    assert consumer.position() == rows[-1]["id"]
+    assert OutboxConsumer(consumer.session_factory, "audit").position() == 0
+
+
+def test_failed_sink_gets_events_again(session, service, consumer):
+    service.create_product("Chair", 1, 10.0)
+    session.commit()
+
+    def failing_sink(events):
+        raise RuntimeError("sink unavailable")
+
+    with pytest.raises(RuntimeError):
+        consumer.run_once(failing_sink)
+    delivered = []
+    assert consumer.run_once(delivered.extend) == 1
+    assert delivered[0].event_type == EventType.PRODUCT_CREATED
+
+
+def test_stream_acknowledges_consumed_batches(session, service, consumer):
+    for i in range(5):
+        service.create_product(f"P{i}", 1, 10.0)
+    session.commit()
+
+    stream = consumer.stream()
+    first = [next(stream) for _ in range(4)]
+    stream.close()
+    # первая порция (3 события) подтверждена, вторая выдается снова
+    assert consumer.position() == first[2].id
+    assert [e.id for e in consumer.stream()] == [first[3].id, first[3].id + 1]
+    assert consumer.poll() == []
@@ -0,0 +1,141 @@
+"""Тесты параллельной обработки команд над заказами"""
+
+import sqlite3
+import threading
+from dataclasses import replace
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from my_hm.domain.models import OrderStatus
+from my_hm.domain.services import RetryPolicy, WarehouseService
+from my_hm.infrastructure.database import Database, EngineConfig
+from my_hm.infrastructure.orm import Base
+from my_hm.infrastructure.processing import OrderCommand, ParallelOrderProcessor
+from my_hm.infrastructure.unit_of_work import SqlAlchemyUnitOfWork
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = EngineConfig(url=f"sqlite:///{tmp_path / 'warehouse.db'}")
+    database = Database(config)
+    Base.metadata.create_all(database.engine)
+    with SqlAlchemyUnitOfWork(database.session_factory) as uow:
+        service = WarehouseService(uow.products, uow.orders, uow.customers)
+        service.create_customer("Bradley", "bradley@gmail.com")
+        for i in range(4):
+            service.create_product(f"P{i}", 5, 10.0)
+        uow.commit()
+    database.dispose()
+    return config
+
+
+def test_results_are_returned_in_command_order(config):
+    processor = ParallelOrderProcessor(config, workers=2, batch_size=2)
+
+    created = processor.process(
+        [OrderCommand.create(1, {pid: 1}) for pid in (1, 2, 3, 4, 1, 2)]
+    )
+    assert all(r.ok and r.status == OrderStatus.PENDING for r in created)
+    order_ids = [r.order_id for r in created]
+    assert len(set(order_ids)) == 6
+
+    results = processor.process(
+        [OrderCommand.confirm(order_id) for order_id in order_ids]
+        + [OrderCommand.ship(order_ids[0]), OrderCommand.cancel(order_ids[1])]
+        + [OrderCommand.ship(order_ids[1])]
+    )
+
+    assert [r.status for r in results[:6]] == [OrderStatus.CONFIRMED] * 6
+    assert results[6].status == OrderStatus.SHIPPED
+    assert results[7].status == OrderStatus.CANCELLED
+    assert not results[8].ok
+    assert "подтверждения" in results[8].error
+
+
+def test_failed_command_does_not_roll_back_batch(config):
+    processor = ParallelOrderProcessor(config, workers=2)
+
+    # создания шардируются по позиции: конкурирующие за продукт 1
+    # команды (0 и 2) попадают в один шард и выполняются по порядку
+    results = processor.process(
+        [
+            OrderCommand.create(1, {1: 5}),
+            OrderCommand.create(1, {2: 2}),
+            OrderCommand.create(1, {1: 1}),
+            OrderCommand.confirm(999),
+        ]
+    )
+
+    assert [r.ok for r in results] == [True, True, False, False]
+    assert results[3].error == "Заказ не найден"
+
+    database = Database(config)
+    with SqlAlchemyUnitOfWork(database.session_factory) as uow:
+        assert uow.products.get(1).quantity == 0
+        assert uow.products.get(2).quantity == 3
+        assert len(uow.orders.list()) == 2
+    database.dispose()
+
+
+def test_database_error_is_reported_per_command(config):
+    database = Database(config)
+    with SqlAlchemyUnitOfWork(database.session_factory) as uow:
+        WarehouseService(uow.products, uow.orders, uow.customers).create_customer(
+            "Angelina", "angelina@gmail.com"
+        )
+        uow.session.execute(
+            text(
+                "CREATE TRIGGER reject_angelina BEFORE INSERT ON orders "
+                "WHEN NEW.customer_id = 2 BEGIN SELECT RAISE(ABORT, 'rejected'); END"
+            )
+        )
+        uow.commit()
+    database.dispose()
+    processor = ParallelOrderProcessor(config, workers=2)
+
+    results = processor.process(
+        [OrderCommand.create(customer_id, {1: 1}) for customer_id in (1, 2, 1, 2)]
+    )
+
+    assert [r.ok for r in results] == [True, False, True, False]
+    assert "rejected" in results[1].error
+
+
+def test_memory_database_is_rejected():
+    with pytest.raises(ValueError):
+        ParallelOrderProcessor(EngineConfig(url="sqlite://"))
+
+
+def hold_write_lock(config):
+    connection = sqlite3.connect(
+        make_url(config.url).database, isolation_level=None, check_same_thread=False
+    )
+    connection.execute("BEGIN IMMEDIATE")
+    return connection
+
+
+def test_busy_batch_is_retried(config):
+    config = replace(config, busy_timeout=0.05)
+    commands = [OrderCommand.create(1, {1: 1}), OrderCommand.create(1, {2: 1})]
+
+    lock = hold_write_lock(config)
+    no_retry = ParallelOrderProcessor(
+        config, workers=1, busy_retry=RetryPolicy(attempts=1)
+    )
+    failed = no_retry.process(commands)
+    assert [r.ok for r in failed] == [False, False]
+    assert "locked" in failed[0].error
+
+    # блокировка снимается, пока обработчик повторяет порцию
+    threading.Timer(1.0, lock.rollback).start()
+    patient = ParallelOrderProcessor(
+        config,
+        workers=1,
+        busy_retry=RetryPolicy(attempts=100, backoff=0.05, max_backoff=0.2),
+    )
+    results = patient.process(commands)
+    lock.close()
+
+    assert all(r.ok for r in results)
@@ -0,0 +1,378 @@
+"""Тестовый модуль для SQLAlchemy-репозиториев"""
+
+import dataclasses
+
+import pytest
+from sqlalchemy import event
+
+from my_hm.domain.exceptions import ConcurrencyConflictError
+from my_hm.domain.models import (
+    CatalogQuery,
+    Customer,
+    OrderLine,
+    OrderStatus,
+    Product,
+    ProductSort,
+    TransitionOutcome,
+)
+from my_hm.domain.services import WarehouseService
+from my_hm.infrastructure.orm import OrderLineORM, ProductORM
+from my_hm.infrastructure.repositories import (
+    SqlAlchemyCustomerRepository,
+    SqlAlchemyOrderRepository,
+    SqlAlchemyProductRepository,
+)
+
+
+def make_service(session):
+    return WarehouseService(
+        SqlAlchemyProductRepository(session),
+        SqlAlchemyOrderRepository(session),
+        SqlAlchemyCustomerRepository(session),
+    )
+
+
+def count_statements(engine):
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    return statements
+
+
+def test_product_get_many(session):
+    repo = SqlAlchemyProductRepository(session)
+    table = repo.add(Product(name="Table", quantity=10, price=1000.0))
+    chair = repo.add(Product(name="Chair", quantity=50, price=20.0))
+
+    products = repo.get_many([table.id, chair.id, 999])
+
+    assert set(products) == {table.id, chair.id}
+    assert products[chair.id].name == "Chair"
+
+
+def test_customer_get_many(session):
+    repo = SqlAlchemyCustomerRepository(session)
+    customer = repo.add(Customer(name="Bradley", email="bradley@gmail.com"))
+
+    assert repo.get_many([customer.id, 999]) == {customer.id: customer}
+
+
+def test_service_returns_entities_with_ids(session):
+    service = make_service(session)
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    product = service.create_product("Table", 10, 1000.0)
+
+    order = service.create_order(customer.id, {product.id: 2})
+
+    assert None not in (customer.id, product.id, order.id)
+    assert SqlAlchemyOrderRepository(session).get(order.id).quantities() == {
+        product.id: 2
+    }
+
+
+def test_create_orders_uses_constant_number_of_queries(engine, session):
+    service = make_service(session)
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    products = [service.create_product(f"P{i}", 100, 10.0) for i in range(20)]
+    batch = [(customer.id, [p.id for p in products]) for _ in range(5)]
+
+    statements = count_statements(engine)
+    orders = service.create_orders(batch)
+
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    assert len(selects) == 2
+    assert all(order.id is not None for order in orders)
+    assert orders[0].total_price == 200.0
+
+    stored = SqlAlchemyOrderRepository(session).get(orders[-1].id)
+    assert len(stored.products) == 20
+    assert stored.quantities() == {p.id: 1 for p in products}
+
+
+def test_iter_orders_filters_and_batches_queries(engine, session):
+    service = make_service(session)
+    bradley = service.create_customer("Bradley", "bradley@gmail.com")
+    angelina = service.create_customer("Angelina", "angelina@gmail.com")
+    chair = service.create_product("Chair", 100, 20.0)
+    service.create_orders([(bradley.id, [chair.id])] * 7 + [(angelina.id, [chair.id])])
+    session.commit()
+    session.expire_all()
+
+    statements = count_statements(engine)
+    orders = list(
+        SqlAlchemyOrderRepository(session).iter_orders(
+            batch_size=3, status=OrderStatus.PENDING, customer_id=bradley.id
+        )
+    )
+
+    assert len(orders) == 7
+    assert [o.id for o in orders] == sorted(o.id for o in orders)
+    # 3 порции: на каждую один запрос за строками, продукты не загружаются
+    assert len(statements) == 4
+    assert sum("FROM order_product_associations" in s for s in statements) == 3
+    assert not any("JOIN products" in s for s in statements)
+
+    assert [p.name for p in orders[0].products] == ["Chair"]
+    assert len(statements) == 5
+    assert orders[0].products_loaded and not orders[1].products_loaded
+
+
+def test_cancel_order_does_not_load_products(engine, session):
+    service = make_service(session)
+    bradley = service.create_customer("Bradley", "bradley@gmail.com")
+    chair = service.create_product("Chair", 10, 20.0)
+    order = service.create_order(bradley.id, [chair.id, chair.id])
+    session.commit()
+    session.expire_all()
+
+    statements = count_statements(engine)
+    cancelled = service.cancel_order(order.id)
+
+    assert cancelled.status == OrderStatus.CANCELLED
+    assert not cancelled.products_loaded
+    assert not any(s.startswith("SELECT") and "FROM products" in s for s in statements)
+    assert SqlAlchemyProductRepository(session).get(chair.id).quantity == 10
+
+
+def test_reserve_stock_is_all_or_nothing(session):
+    repo = SqlAlchemyProductRepository(session)
+    table = repo.add(Product(name="Table", quantity=1, price=1000.0))
+    chair = repo.add(Product(name="Chair", quantity=5, price=20.0))
+
+    assert repo.reserve_stock({table.id: 2, chair.id: 3}) == [table.id]
+    assert repo.get(chair.id).quantity == 5
+
+    assert repo.reserve_stock({table.id: 1, chair.id: 3}) == []
+    assert repo.get(table.id).quantity == 0
+    assert repo.get(chair.id).quantity == 2
+
+
+def test_release_stock(session):
+    repo = SqlAlchemyProductRepository(session)
+    table = repo.add(Product(name="Table", quantity=1, price=1000.0))
+    chair = repo.add(Product(name="Chair", quantity=5, price=20.0))
+
+    repo.release_stock({table.id: 2, chair.id: 1})
+
+    assert repo.get(table.id).quantity == 3
+    assert repo.get(chair.id).quantity == 6
+
+
+def test_order_lifecycle_persists_stock(session):
+    service = make_service(session)
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    chair = service.create_product("Chair", 5, 20.0)
+    table = service.create_product("Table", 1, 1000.0)
+
+    order = service.create_order(customer.id, [chair.id, table.id])
+    assert service.product_repo.get(chair.id).quantity == 4
+    assert service.product_repo.get(table.id).quantity == 0
+
+    service.confirm_order(order.id)
+    assert service.product_repo.get(chair.id).quantity == 4
+
+    service.cancel_order(order.id)
+    assert service.product_repo.get(chair.id).quantity == 5
+    assert service.product_repo.get(table.id).quantity == 1
+
+
+def test_order_line_quantity_is_stored_in_one_row(session):
+    service = make_service(session)
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    chair = service.create_product("Chair", 600, 20.0)
+
+    order = service.create_order(customer.id, {chair.id: 500})
+    stored = SqlAlchemyOrderRepository(session).get(order.id)
+
+    assert session.query(OrderLineORM).count() == 1
+    assert stored.lines == [OrderLine(chair.id, 500, 20.0)]
+    assert stored.total_price == 10000.0
+    assert service.product_repo.get(chair.id).quantity == 100
+
+    service.cancel_order(order.id)
+    assert service.product_repo.get(chair.id).quantity == 600
+
+
+def seed_catalog(session):
+    repo = SqlAlchemyProductRepository(session)
+    for name, quantity, price in [
+        ("Chair", 5, 20.0),
+        ("Chest", 0, 150.0),
+        ("Table", 3, 1000.0),
+        ("Chandelier", 2, 300.0),
+        ("Cabinet", 1, 300.0),
+        ("Sofa", 7, 800.0),
+    ]:
+        repo.add(Product(name=name, quantity=quantity, price=price))
+    return repo
+
+
+def test_find_filters_in_sql(session):
+    repo = seed_catalog(session)
+
+    page = repo.find(CatalogQuery(name_prefix="Ch", max_price=500.0, limit=None))
+
+    assert [p.name for p in page.items] == ["Chair", "Chandelier"]
+    assert page.next_cursor is None
+
+
+def test_find_keyset_pagination_by_price(session):
+    repo = seed_catalog(session)
+    query = CatalogQuery(sort=ProductSort.PRICE, descending=True, limit=2)
+
+    names = []
+    while True:
+        page = repo.find(query)
+        names.extend(p.name for p in page.items)
+        if page.next_cursor is None:
+            break
+        query.after = page.next_cursor
+
+    assert names == ["Table", "Sofa", "Cabinet", "Chandelier", "Chair"]
+
+
+def test_catalog_columns_are_indexed(engine):
+    indexed = {
+        column.name
+        for index in ProductORM.__table__.indexes
+        for column in index.columns
+    }
+    assert {"quantity", "name", "price"} <= indexed
+
+
+def test_update_increments_version(session):
+    service = make_service(session)
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    product = service.create_product("Table", 10, 100.0)
+    order = service.create_order(customer.id, [product.id])
+
+    confirmed = service.confirm_order(order.id)
+
+    assert confirmed.version == 2
+    assert service.order_repo.get(order.id).version == 2
+    assert service.product_repo.get(product.id).version == 2
+
+
+def test_stale_update_raises_conflict(session):
+    repo = SqlAlchemyCustomerRepository(session)
+    customer = repo.add(Customer(name="Bradley", email="bradley@gmail.com"))
+    stale = dataclasses.replace(repo.get(customer.id))
+
+    customer.name = "Brad"
+    repo.update(customer)
+    stale.email = "pitt@gmail.com"
+
+    with pytest.raises(ConcurrencyConflictError):
+        repo.update(stale)
+    assert repo.get(customer.id) == Customer(
+        id=customer.id, name="Brad", email="bradley@gmail.com", version=2
+    )
+
+
+def test_customer_lookup_by_email(session):
+    service = make_service(session)
+    bradley = service.create_customer("Bradley", "bradley@gmail.com")
+    service.create_customer("Angelina", "angelina@gmail.com")
+    repo = service.customer_repo
+
+    assert repo.get_by_email("bradley@gmail.com").id == bradley.id
+    assert repo.get_by_email("nobody@gmail.com") is None
+    assert set(repo.get_many_by_email(["angelina@gmail.com", "x@gmail.com"])) == {
+        "angelina@gmail.com"
+    }
+    with pytest.raises(ValueError, match="уже существует"):
+        service.create_customer("Brad", "bradley@gmail.com")
+
+
+def test_upsert_customers_inserts_and_updates(engine, session):
+    service = make_service(session)
+    bradley = service.create_customer("Bradley", "bradley@gmail.com")
+    angelina = service.create_customer("Angelina", "angelina@gmail.com")
+    session.commit()
+
+    statements = count_statements(engine)
+    stored = service.upsert_customers(
+        [
+            ("Brad", "bradley@gmail.com"),
+            ("Angelina", "angelina@gmail.com"),
+            ("Jennifer", "jennifer@gmail.com"),
+            ("Jen", "jennifer@gmail.com"),
+        ]
+    )
+
+    assert [(c.name, c.email) for c in stored] == [
+        ("Brad", "bradley@gmail.com"),
+        ("Angelina", "angelina@gmail.com"),
+        ("Jen", "jennifer@gmail.com"),
+    ]
+    assert [c.id for c in stored[:2]] == [bradley.id, angelina.id]
+    # изменилось только имя Bradley: неизмененные клиенты версию не меняют
+    assert [c.version for c in stored] == [2, 1, 1]
+    assert sum(s.startswith("INSERT INTO customers") for s in statements) == 1
+    assert len(service.customer_repo.list()) == 3
+    assert service.customer_repo.get(bradley.id).name == "Brad"
+
+
+def test_stale_order_transition_is_rejected(session):
+    service = make_service(session)
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    product = service.create_product("Table", 10, 100.0)
+    order = service.create_order(customer.id, [product.id])
+    stale = service.order_repo.get(order.id)
+    service.cancel_order(order.id)
+
+    stale.confirm()
+    with pytest.raises(ConcurrencyConflictError):
+        service.order_repo.update(stale)
+    assert service.order_repo.get(order.id).status == OrderStatus.CANCELLED
+
+
+def seed_orders(session, count):
+    service = make_service(session)
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    table = service.create_product("Table", 100, 100.0)
+    chair = service.create_product("Chair", 100, 20.0)
+    orders = service.create_orders(
+        [(customer.id, {table.id: 1, chair.id: 2}) for _ in range(count)]
+    )
+    return service, [order.id for order in orders], table, chair
+
+
+def test_bulk_transitions_report_outcome_per_id(session):
+    service, order_ids, _, _ = seed_orders(session, 4)
+    service.confirm_order(order_ids[1])
+
+    report = service.confirm_orders(order_ids + [999])
+
+    assert report.outcomes == {
+        order_ids[0]: TransitionOutcome.APPLIED,
+        order_ids[1]: TransitionOutcome.INVALID_STATUS,
+        order_ids[2]: TransitionOutcome.APPLIED,
+        order_ids[3]: TransitionOutcome.APPLIED,
+        999: TransitionOutcome.NOT_FOUND,
+    }
+    assert report.current_statuses == {order_ids[1]: OrderStatus.CONFIRMED}
+    shipped = service.ship_orders(order_ids[:2])
+    assert shipped.applied == order_ids[:2]
+    assert service.order_repo.get(order_ids[0]).status == OrderStatus.SHIPPED
+
+
+def test_cancel_orders_restocks_in_aggregated_statements(engine, session):
+    service, order_ids, table, chair = seed_orders(session, 5)
+    service.confirm_orders(order_ids[:2])
+    service.ship_orders(order_ids[:1])
+
+    statements = count_statements(engine)
+    report = service.cancel_orders(order_ids)
+
+    assert report.applied == order_ids[1:]
+    assert report.outcomes[order_ids[0]] == TransitionOutcome.INVALID_STATUS
+    # UPDATE из pending, UPDATE из confirmed, SELECT статуса отклоненных,
+    # SELECT суммы строк, UPDATE остатков.
+    assert len(statements) == 5
+    assert service.product_repo.get(table.id).quantity == 99
+    assert service.product_repo.get(chair.id).quantity == 98
+    assert service.order_repo.get(order_ids[4]).version == 2
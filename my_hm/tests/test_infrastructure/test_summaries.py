@@ -0,0 +1,195 @@
+"""Тесты проекции сводок заказов для чтения"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from my_hm.bootstrap import ensure_schema
+from my_hm.domain.models import OrderStatus, OrderSummary, OrderSummaryQuery
+from my_hm.domain.services import WarehouseService
+from my_hm.infrastructure.bulk_io import BulkImporter
+from my_hm.infrastructure.orm import OrderSummaryORM
+from my_hm.infrastructure.repositories import (
+    SqlAlchemyCustomerRepository,
+    SqlAlchemyOrderRepository,
+    SqlAlchemyProductRepository,
+)
+from my_hm.infrastructure.summaries import SqlAlchemyOrderSummaries
+from my_hm.tests.test_infrastructure.test_repositories import count_statements
+
+START = datetime(2024, 5, 1, 12, 0)
+
+
+@pytest.fixture
+def summaries(session):
+    return SqlAlchemyOrderSummaries(session, clock=lambda: START + timedelta(hours=1))
+
+
+@pytest.fixture
+def service(session, summaries):
+    service = WarehouseService(
+        SqlAlchemyProductRepository(session),
+        SqlAlchemyOrderRepository(session),
+        SqlAlchemyCustomerRepository(session),
+        listeners=[summaries],
+    )
+    service.clock = lambda: START
+    return service
+
+
+def all_summaries(summaries):
+    return summaries.find(OrderSummaryQuery(descending=False, limit=None)).items
+
+
+def test_write_paths_keep_summaries_current(service, summaries):
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    table = service.create_product("Table", 10, 100.0)
+    chair = service.create_product("Chair", 50, 20.0)
+
+    first = service.create_order(customer.id, {table.id: 2, chair.id: 4})
+    others = service.create_orders([(customer.id, [chair.id])] * 3)
+    service.confirm_order(first.id)
+    service.ship_order(first.id)
+    service.confirm_orders([others[0].id])
+    service.cancel_orders([others[0].id, others[1].id])
+    service.expire_pending_orders(START + timedelta(minutes=1))
+
+    assert summaries.get(first.id) == OrderSummary(
+        order_id=first.id,
+        customer_id=customer.id,
+        status=OrderStatus.SHIPPED,
+        line_count=2,
+        item_count=6,
+        total_price=280.0,
+        created_at=START,
+        updated_at=START + timedelta(hours=1),
+    )
+    assert [s.status for s in all_summaries(summaries)] == [
+        OrderStatus.SHIPPED,
+        OrderStatus.CANCELLED,
+        OrderStatus.CANCELLED,
+        OrderStatus.CANCELLED,
+    ]
+    assert summaries.get(12345) is None
+
+
+def test_incremental_summaries_match_rebuild(service, summaries):
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    products = [service.create_product(f"P{i}", 20, 10.0 + i) for i in range(3)]
+    product_ids = [p.id for p in products]
+    orders = service.create_orders(
+        [
+            (customer.id, {product_ids[0]: 3, product_ids[1]: 1}),
+            (customer.id, product_ids),
+        ]
+    )
+    service.confirm_order(orders[0].id)
+    service.cancel_order(orders[1].id)
+
+    incremental = all_summaries(summaries)
+    summaries.rebuild()
+
+    assert all_summaries(summaries) == incremental
+
+
+def test_rebuild_picks_up_bulk_imported_orders(session, service, summaries):
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    product = service.create_product("Table", 10, 100.0)
+    BulkImporter(session).import_orders(
+        [
+            {
+                "customer_id": customer.id,
+                "status": "confirmed",
+                "lines": [
+                    {"product_id": product.id, "quantity": 3, "unit_price": 100.0}
+                ],
+                "created_at": START.isoformat(),
+            }
+        ]
+    )
+    assert not all_summaries(summaries)
+
+    summaries.rebuild()
+
+    [summary] = all_summaries(summaries)
+    assert (summary.status, summary.item_count, summary.total_price) == (
+        OrderStatus.CONFIRMED,
+        3,
+        300.0,
+    )
+    assert summary.created_at == START
+
+
+def test_customer_history_pages_and_filters(service, summaries):
+    bradley = service.create_customer("Bradley", "bradley@gmail.com")
+    angelina = service.create_customer("Angelina", "angelina@gmail.com")
+    product = service.create_product("Chair", 100, 20.0)
+    orders = []
+    for minute in range(5):
+        service.clock = lambda minute=minute: START + timedelta(minutes=minute)
+        orders.extend(service.create_orders([(bradley.id, [product.id])]))
+        service.create_orders([(angelina.id, [product.id])])
+    service.cancel_order(orders[3].id)
+    ids = [order.id for order in orders]
+
+    first = summaries.customer_history(bradley.id, limit=2)
+    second = summaries.customer_history(bradley.id, limit=2, after=first.next_cursor)
+    last = summaries.customer_history(bradley.id, limit=2, after=second.next_cursor)
+    assert [s.order_id for s in first.items + second.items + last.items] == ids[::-1]
+    assert last.next_cursor is None
+
+    pending = summaries.customer_history(bradley.id, status=OrderStatus.PENDING)
+    assert [s.order_id for s in pending.items] == [ids[4], *ids[2::-1]]
+    window = summaries.find(
+        OrderSummaryQuery(
+            customer_id=bradley.id,
+            created_from=START + timedelta(minutes=1),
+            created_before=START + timedelta(minutes=3),
+            descending=False,
+        )
+    )
+    assert [s.order_id for s in window.items] == ids[1:3]
+
+
+def test_customer_history_is_single_indexed_statement(
+    engine, session, service, summaries
+):
+    customer = service.create_customer("Bradley", "bradley@gmail.com")
+    product = service.create_product("Table", 100, 10.0)
+    service.create_orders([(customer.id, [product.id])] * 30)
+
+    statements = count_statements(engine)
+    assert len(summaries.customer_history(customer.id).items) == 20
+    assert len(statements) == 1
+    assert "JOIN" not in statements[0]
+
+    plan = session.execute(
+        text(
+            "EXPLAIN QUERY PLAN SELECT * FROM order_summaries "
+            "WHERE customer_id = 1 ORDER BY order_id DESC LIMIT 21"
+        )
+    ).fetchall()
+    plan = " ".join(row[-1] for row in plan)
+    assert "ix_order_summaries_customer_order" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_summaries_are_filled_when_table_is_created(engine, session):
+    plain = WarehouseService(
+        SqlAlchemyProductRepository(session),
+        SqlAlchemyOrderRepository(session),
+        SqlAlchemyCustomerRepository(session),
+    )
+    customer = plain.create_customer("Bradley", "bradley@gmail.com")
+    chair = plain.create_product("Chair", 10, 20.0)
+    order = plain.create_order(customer.id, {chair.id: 2})
+    session.commit()
+    OrderSummaryORM.__table__.drop(engine)
+
+    assert ensure_schema(engine)
+
+    history = SqlAlchemyOrderSummaries(session).customer_history(customer.id)
+    assert [(s.order_id, s.item_count, s.total_price) for s in history.items] == [
+        (order.id, 2, 40.0)
+    ]
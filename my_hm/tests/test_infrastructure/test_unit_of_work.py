@@ -0,0 +1,73 @@
+"""Тестовый модуль для SqlAlchemyUnitOfWork"""
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from my_hm.domain.models import Order, OrderLine, Product
+from my_hm.infrastructure.unit_of_work import SqlAlchemyUnitOfWork
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine)
+
+
+def product_names(session_factory):
+    with SqlAlchemyUnitOfWork(session_factory) as uow:
+        return sorted(p.name for p in uow.products.list())
+
+
+def test_commit_persists_changes(session_factory):
+    with SqlAlchemyUnitOfWork(session_factory) as uow:
+        product = uow.products.add(Product(name="Table", quantity=10, price=1000.0))
+        uow.commit()
+
+    assert product.id is not None
+    assert product_names(session_factory) == ["Table"]
+
+
+def test_exit_without_commit_rolls_back(session_factory):
+    with SqlAlchemyUnitOfWork(session_factory) as uow:
+        uow.products.add(Product(name="Table", quantity=10, price=1000.0))
+
+    assert product_names(session_factory) == []
+
+
+def test_exception_rolls_back(session_factory):
+    with pytest.raises(RuntimeError):
+        with SqlAlchemyUnitOfWork(session_factory) as uow:
+            uow.products.add(Product(name="Table", quantity=10, price=1000.0))
+            uow.flush()
+            raise RuntimeError
+
+    assert product_names(session_factory) == []
+
+
+def test_savepoint_rolls_back_only_nested_changes(session_factory):
+    with SqlAlchemyUnitOfWork(session_factory) as uow:
+        uow.products.add(Product(name="Table", quantity=10, price=1000.0))
+        with pytest.raises(ValueError):
+            with uow.savepoint():
+                uow.products.add(Product(name="Chair", quantity=5, price=20.0))
+                uow.flush()
+                raise ValueError
+        uow.commit()
+
+    assert product_names(session_factory) == ["Table"]
+
+
+def test_order_batch_is_flushed_once(session_factory):
+    with SqlAlchemyUnitOfWork(session_factory) as uow:
+        product = uow.products.add(Product(name="Table", quantity=10, price=1.0))
+        orders = uow.orders.add_many(
+            [Order(customer_id=1, lines=[OrderLine(product.id)]) for _ in range(10)]
+        )
+        assert all(order.id is not None for order in orders)
+        uow.commit()
+
+    stats = uow.history[-1]
+    assert stats.committed
+    # один flush для продукта и один для всего пакета заказов
+    assert stats.flushes == 2
+    assert stats.statements >= 1
+    assert stats.wall_time > 0